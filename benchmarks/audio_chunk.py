@@ -0,0 +1,98 @@
+"""统计缓存回放经过整条管线时音频数据的内存分配
+
+对比两种块表示：AudioChunk按memoryview切片共享缓存缓冲；旧实现每个块都是新的bytes切片。
+播放器保留收到的全部块（类似先录制再写文件的场景），因此块的数据副本都会计入tracemalloc。
+
+运行: python -m benchmarks.audio_chunk --sentences 50
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import AsyncIterator
+
+from benchmarks.fakes import NullPlayer
+from tts_module.audio_chunk import AudioChunk, is_end
+from tts_module.engine.base_engine import TTSEngine
+from tts_module.engine.cache_engine import CacheConfig, CachedEngine
+from tts_module.tts import TTS
+
+
+class SentenceEngine(TTSEngine):
+    """每句一次性返回一整块音频的引擎"""
+    def __init__(self, size: int):
+        self.size = size
+
+    def cache_params(self) -> dict:
+        return {"engine": "sentence", "size": self.size}
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        yield AudioChunk(bytes(self.size), "wav", 24000, 1)
+
+
+class BytesReplay(TTSEngine):
+    """旧实现：缓存回放时每个块都是bytes切片"""
+    def __init__(self, engine: TTSEngine):
+        self.engine = engine
+
+    async def synthesize(self, text: str) -> AsyncIterator[bytes]:
+        async for chunk in self.engine.synthesize(text):
+            yield bytes(chunk.data)
+
+
+class HoldingPlayer(NullPlayer):
+    def __init__(self):
+        self.chunks = []
+
+    def add_chunk(self, chunk):
+        if not is_end(chunk):
+            self.chunks.append(chunk)
+
+
+async def run(legacy: bool, sentences: int, size: int) -> dict:
+    cached = CachedEngine(SentenceEngine(size), CacheConfig(memory_bytes=sentences * size * 2))
+    engine = BytesReplay(cached) if legacy else cached
+    texts = [f"第{i}句测试文本。" for i in range(sentences)]
+
+    async def text():
+        for sentence in texts:
+            yield sentence
+
+    # 预热缓存
+    tts = TTS(max_workers=8, engine=engine, player=NullPlayer(), scheduler="asyncio")
+    await tts.start()
+    await tts.process_stream(text())
+    await tts.stop()
+
+    player = HoldingPlayer()
+    tts = TTS(max_workers=8, engine=engine, player=player, scheduler="asyncio")
+    await tts.start()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    begin = time.perf_counter()
+    await tts.process_stream(text())
+    await tts.stop()
+    elapsed = time.perf_counter() - begin
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    return {
+        "chunks": "bytes" if legacy else "AudioChunk",
+        "audio_bytes": sum(len(chunk) for chunk in player.chunks),
+        "retained_kb": round(sum(stat.size_diff for stat in diff) / 1024, 1),
+        "retained_blocks": sum(stat.count_diff for stat in diff),
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=50)
+    parser.add_argument("--size", type=int, default=96000, help="每句音频字节数")
+    args = parser.parse_args()
+    for legacy in (True, False):
+        print(asyncio.run(run(legacy, args.sentences, args.size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""连续快速打断的压力测试
+
+不断以随机间隔开始新回复，每个新回复打断上一个。统计：
+- 旧回复的任务（文本读取、合成、等待中的句子）全部结束所需时间
+- 打断之后仍送入播放器的旧回复音频块数，应为0
+- 打断结束后残留的任务数和进行中的合成数，应为0
+- 最后一个回复是否完整、按序播放
+
+运行: python -m benchmarks.bargein_stress --utterances 200
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List, Tuple
+
+from benchmarks.fakes import FakeEngine, FakeLLM, NullPlayer
+from tts_module.audio_chunk import is_end
+from tts_module.tts import TTS
+
+TEXT = "好的，我来帮你看一下。首先，这个问题有几个方面需要考虑。一是时间安排，二是预算，三是人员配置。"
+
+
+class SequencePlayer(NullPlayer):
+    """记录每个音频块的到达时间和序号"""
+    def __init__(self):
+        self.events: List[Tuple[float, int, bool]] = []
+        self.flushes = 0
+
+    def add_chunk(self, chunk):
+        self.events.append((time.perf_counter(), chunk.sequence, is_end(chunk)))
+
+    def flush(self):
+        self.flushes += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(scheduler: str, args) -> dict:
+    rng = random.Random(args.seed)
+    engine = FakeEngine(chunks=args.chunks, delay=args.chunk_delay, first_chunk_latency=args.first_chunk_latency)
+    player = SequencePlayer()
+    tts = TTS(max_workers=4, engine=engine, player=player, scheduler=scheduler)
+    await tts.start()
+
+    drains: List[float] = []
+    cuts: List[Tuple[float, int]] = []  # (打断时间, 打断时的队首序号)
+    watchers = []
+    streams = []
+
+    async def watch(utterance):
+        while utterance.active:
+            await asyncio.sleep(0.0005)
+        drains.append(time.perf_counter() - utterance.cancelled_at)
+
+    for _ in range(args.utterances):
+        previous = tts.utterance
+        llm = FakeLLM(TEXT, args.tokens_per_second, first_token_latency=0.0)
+        streams.append(asyncio.create_task(tts.process_stream(llm.aresponse([]))))
+        await asyncio.sleep(0)  # 让新回复开始并打断上一个
+        if previous is not None:
+            cuts.append((previous.cancelled_at, tts.sequence_manager.head))
+            watchers.append(asyncio.create_task(watch(previous)))
+        await asyncio.sleep(rng.uniform(args.min_interval, args.max_interval))
+
+    last = tts.utterance
+    last_head = cuts[-1][1] if cuts else 1
+    await asyncio.gather(*streams)
+    await asyncio.gather(*watchers)
+    await tts.stop()
+
+    # 打断之后送入播放器的旧回复音频
+    stale = 0
+    for at, sequence, end in player.events:
+        if end:
+            continue
+        stale += sum(1 for cut_at, head in cuts if at > cut_at and sequence < head)
+    # 最后一个回复按序完整播放
+    final = [(sequence, end) for at, sequence, end in player.events if sequence >= last_head]
+    sequences = [sequence for sequence, end in final if end]
+    in_order = sequences == sorted(sequences) and len(sequences) == len(set(sequences))
+    return {
+        "scheduler": scheduler,
+        "barge_ins": len(cuts),
+        "drain_p50_ms": round(percentile(drains, 0.5) * 1000, 2),
+        "drain_p99_ms": round(percentile(drains, 0.99) * 1000, 2),
+        "drain_max_ms": round(max(drains) * 1000, 2),
+        "stale_chunks": stale,
+        "leaked_tasks": last.active,
+        "engine_active": engine.active,
+        "final_sentences": len(sequences),
+        "final_in_order": in_order,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--utterances", type=int, default=200)
+    parser.add_argument("--schedulers", nargs="+", default=["asyncio", "thread"])
+    parser.add_argument("--min-interval", type=float, default=0.005)
+    parser.add_argument("--max-interval", type=float, default=0.15)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.03)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for scheduler in args.schedulers:
+        print(asyncio.run(run(scheduler, args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""请求合并对自建OpenAI兼容服务的效果
+
+假服务端同一时间只处理server_slots个请求，每个请求有固定开销（模型调度、首包），
+合成耗时另按音频时长乘以实时率计算。对比合并开启前后每个回复的请求数、
+服务端忙碌时间、吞吐（每秒服务端时间合成的字数）以及首音延迟和卡顿。
+
+运行: python -m benchmarks.coalesce
+"""
+import argparse
+import asyncio
+import time
+from typing import AsyncIterator, Dict
+
+from benchmarks.e2e import REPLY
+from benchmarks.fakes import FakeEngine, FakeLLM, TimelinePlayer
+from tts_module.audio_chunk import AudioChunk
+from tts_module.engine.base_engine import TTSEngine
+from tts_module.sentence_processor import CoalesceConfig
+from tts_module.tts import TTS
+
+
+class ServerEngine(TTSEngine):
+    """并发受限、单次请求有固定开销的假服务端"""
+    def __init__(self, engine: FakeEngine, slots: int):
+        self.engine = engine
+        self.slots = slots
+        self.busy = 0.0
+        self.chars = 0
+        self._semaphore = None
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.slots)
+        async with self._semaphore:
+            begin = time.perf_counter()
+            try:
+                async for chunk in self.engine.synthesize(text):
+                    yield chunk
+            finally:
+                self.busy += time.perf_counter() - begin
+                self.chars += len(text)
+
+
+async def run(coalesce, args) -> Dict:
+    llm = FakeLLM(REPLY * args.paragraphs, args.tokens_per_second, first_token_latency=0.2)
+    server = ServerEngine(FakeEngine(chunks=8, first_chunk_latency=args.request_overhead, rtf=args.rtf),
+                          args.server_slots)
+    player = TimelinePlayer()
+    tts = TTS(max_workers=3, engine=server, player=player, scheduler="asyncio", coalesce=coalesce)
+    await tts.start()
+    start = time.perf_counter()
+    await tts.process_stream(llm.aresponse([]))
+    await tts.stop()
+    elapsed = time.perf_counter() - start
+    report = player.report(start)
+    return {
+        "coalesce": coalesce is not None,
+        "requests": server.engine.requests,
+        "server_busy_s": round(server.busy, 2),
+        "chars_per_server_s": round(server.chars / server.busy, 1),
+        "elapsed_s": round(elapsed, 2),
+        "ttfa_s": round(report["ttfa_s"], 3),
+        "gap_total_s": round(report["gap_total_s"], 3),
+        "stall_s": round(report["stall_s"], 3),
+        "playback_end_s": round(report["playback_end_s"], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=2, help="回复文本重复的次数")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--request-overhead", type=float, default=0.6, help="每个请求的固定开销（秒）")
+    parser.add_argument("--rtf", type=float, default=0.15)
+    parser.add_argument("--server-slots", type=int, default=1)
+    parser.add_argument("--max-chars", type=int, default=150)
+    parser.add_argument("--min-buffer", type=float, default=3.0)
+    args = parser.parse_args()
+    for coalesce in (None, CoalesceConfig(max_chars=args.max_chars, min_buffer=args.min_buffer)):
+        print(asyncio.run(run(coalesce, args)))
+
+
+if __name__ == "__main__":
+    main()
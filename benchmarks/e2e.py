@@ -0,0 +1,143 @@
+"""端到端延迟基准：假LLM、假引擎和模拟实时播放的假播放器
+
+在分句策略、max_workers和调度方式的组合上运行同一段回复，统计首音延迟、句间空白、
+句中卡顿、CPU时间和峰值线程数，结果以JSON输出，便于回归对比。
+
+运行: python -m benchmarks.e2e --output e2e.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.fakes import FakeEngine, FakeLLM, TimelinePlayer
+from tts_module.segment_policy import AdaptivePolicy, FixedPolicy
+from tts_module.tts import TTS
+
+REPLY = (
+    "好的，我来帮你看一下。首先，这个问题有几个方面需要考虑，"
+    "一是时间安排，二是预算，三是人员配置。"
+    "关于时间安排，我建议先把需求整理清楚，然后分阶段推进，每个阶段结束后做一次回顾，"
+    "这样可以及时发现问题，也方便调整计划。"
+    "关于预算，最好预留一部分机动资金，用来应对突发情况，同时定期核对支出，避免超支。"
+    "如果你还有其他问题，随时告诉我。"
+)
+
+POLICIES = {
+    "default": None,
+    "fixed-2-50": FixedPolicy(2, 50),
+    "fixed-20-150": FixedPolicy(20, 150),
+    "adaptive": AdaptivePolicy(),
+}
+
+
+async def run_once(args, policy_name: str, max_workers: int, scheduler: str, seed: int) -> Dict:
+    llm = FakeLLM(REPLY, args.tokens_per_second, first_token_latency=args.first_token_latency)
+    engine = FakeEngine(chunks=args.chunks, first_chunk_latency=args.first_chunk_latency,
+                        rtf=args.rtf, failure_rate=args.failure_rate, seed=seed)
+    player = TimelinePlayer()
+    tts = TTS(max_workers=max_workers, engine=engine, player=player, scheduler=scheduler,
+              segment_policy=POLICIES[policy_name])
+
+    peak_threads = threading.active_count()
+    sampling = True
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while sampling:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.005)
+
+    sampler = asyncio.create_task(sample_threads())
+    await tts.start()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    await tts.process_stream(llm.aresponse([]))
+    await tts.stop()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    sampling = False
+    await sampler
+
+    report = player.report(start)
+    report.update({
+        "elapsed_s": elapsed,
+        "cpu_s": cpu,
+        "peak_threads": peak_threads,
+        "requests": engine.requests,
+        "failures": engine.failures,
+    })
+    return report
+
+
+def summarize(runs: List[Dict]) -> Dict:
+    """多次运行取中位数"""
+    summary = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs if run[key] is not None]
+        if not values:
+            summary[key] = None
+        elif isinstance(values[0], float):
+            summary[key] = round(statistics.median(values), 4)
+        else:
+            summary[key] = statistics.median_high(values)
+    return summary
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--policies", nargs="+", default=list(POLICIES), choices=list(POLICIES))
+    parser.add_argument("--max-workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--schedulers", nargs="+", default=["asyncio", "thread"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.4)
+    parser.add_argument("--rtf", type=float, default=0.3, help="合成耗时与音频时长之比")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--chunks", type=int, default=8, help="每句音频的块数")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    results = []
+    for scheduler in args.schedulers:
+        for policy_name in args.policies:
+            for max_workers in args.max_workers:
+                runs = [asyncio.run(run_once(args, policy_name, max_workers, scheduler, seed))
+                        for seed in range(args.repeat)]
+                result = {"scheduler": scheduler, "policy": policy_name, "max_workers": max_workers}
+                result.update(summarize(runs))
+                results.append(result)
+
+    document = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    output = json.dumps(document, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
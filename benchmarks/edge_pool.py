@@ -0,0 +1,73 @@
+"""对比Edge连接池开启前后的每句首包延迟和首个音频的到达时间
+
+使用本地替身服务，握手耗时由 --handshake-delay 模拟。
+
+运行: python -m benchmarks.edge_pool --handshake-delay 0.3
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.edge_standin import EdgeStandIn
+from benchmarks.fakes import RecordingPlayer, fake_tokens
+from tts_module.engine.edge_engine import EdgeEngine
+from tts_module.engine.edge_pool import EdgePoolConfig
+from tts_module.tts import TTS
+
+TEXT = "你好，很高兴见到你。今天想聊点什么？我们可以从天气开始，也可以说说最近读的书。"
+
+
+async def run(pool_size: int, args) -> dict:
+    standin = EdgeStandIn(handshake_delay=args.handshake_delay, first_chunk_latency=args.first_chunk_latency)
+    await standin.start()
+    engine = EdgeEngine(pool=EdgePoolConfig(url=standin.url, size=pool_size))
+    try:
+        # 逐句合成的首包延迟，第一句之前先预热
+        await engine.prewarm()
+        first_chunks = []
+        for i in range(args.sentences):
+            begin = time.perf_counter()
+            first = None
+            async for _ in engine.synthesize(f"第{i}句测试文本。"):
+                if first is None:
+                    first = time.perf_counter() - begin
+            first_chunks.append(first)
+
+        # 整条管线：文本流开始到首个音频送入播放器
+        player = RecordingPlayer()
+        tts = TTS(max_workers=3, engine=engine, player=player, scheduler="asyncio")
+        await engine.aclose()
+        await tts.start()
+        begin = time.perf_counter()
+        await tts.process_stream(fake_tokens(TEXT, args.tokens_per_second))
+        await tts.stop()
+        ttfa = player.first_chunk_at() - begin
+        stats = engine.pool.stats()
+        await engine.aclose()
+    finally:
+        await standin.stop()
+    first_chunks.sort()
+    return {
+        "pool_size": pool_size,
+        "first_chunk_p50_ms": round(first_chunks[len(first_chunks) // 2] * 1000, 1),
+        "first_chunk_max_ms": round(first_chunks[-1] * 1000, 1),
+        "pipeline_ttfa_ms": round(ttfa * 1000, 1),
+        "connections": standin.connections,
+        "turns": standin.turns,
+        "reuses": stats["reuses"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=20)
+    parser.add_argument("--handshake-delay", type=float, default=0.3)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.1)
+    parser.add_argument("--tokens-per-second", type=float, default=30.0)
+    args = parser.parse_args()
+    for pool_size in (0, 4):
+        print(asyncio.run(run(pool_size, args)))
+
+
+if __name__ == "__main__":
+    main()
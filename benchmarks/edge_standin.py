@@ -0,0 +1,72 @@
+"""模拟Edge朗读服务WebSocket协议的本地替身
+
+收到speech.config后等待ssml，每轮依次返回turn.start、若干二进制音频帧和turn.end。
+handshake_delay 模拟DNS、TCP和TLS握手的耗时，idle_close 模拟服务端关闭空闲连接。
+"""
+import asyncio
+from typing import Optional
+
+from aiohttp import WSMsgType, web
+
+
+def audio_frame(data: bytes) -> bytes:
+    headers = b"X-RequestId:0\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n"
+    return len(headers).to_bytes(2, "big") + headers + data
+
+
+def text_frame(path: str) -> str:
+    return f"X-RequestId:0\r\nContent-Type:application/json; charset=utf-8\r\nPath:{path}\r\n\r\n{{}}"
+
+
+class EdgeStandIn:
+    def __init__(self, handshake_delay: float = 0.3, first_chunk_latency: float = 0.1,
+                 chunks: int = 5, chunk_delay: float = 0.01, idle_close: Optional[float] = None):
+        self.handshake_delay = handshake_delay
+        self.first_chunk_latency = first_chunk_latency
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.idle_close = idle_close
+        self.connections = 0
+        self.turns = 0
+        self.port = None
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/edge/v1"
+
+    async def start(self):
+        app = web.Application()
+        app.add_routes([web.get("/edge/v1", self._handle)])
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.WebSocketResponse:
+        await asyncio.sleep(self.handshake_delay)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        while True:
+            try:
+                message = await asyncio.wait_for(ws.receive(), self.idle_close)
+            except asyncio.TimeoutError:
+                await ws.close()
+                break
+            if message.type != WSMsgType.TEXT:
+                break
+            if "Path:ssml" not in message.data:
+                continue
+            self.turns += 1
+            await ws.send_str(text_frame("turn.start"))
+            await asyncio.sleep(self.first_chunk_latency)
+            for _ in range(self.chunks):
+                await ws.send_bytes(audio_frame(b"\xff" * 1440))
+                await asyncio.sleep(self.chunk_delay)
+            await ws.send_str(text_frame("turn.end"))
+        return ws
@@ -0,0 +1,183 @@
+"""基准测试使用的假LLM、假引擎和假播放器"""
+import asyncio
+import random
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from tts_module.audio_chunk import AudioChunk, is_end
+from tts_module.engine.base_engine import TTSEngine
+
+FAKE_BYTES_PER_SECOND = 6000  # 与Edge的48kbps mp3相同
+
+
+class FakeEngine(TTSEngine):
+    """不发起网络请求的引擎，只产出空数据块
+
+    默认每句产出chunks个固定大小的块。设置rtf后按文本长度估算音频时长，
+    合成耗时为音频时长乘以实时率，音频平均分成chunks块。
+    """
+    def __init__(self, chunks: int = 4, delay: float = 0.0, first_chunk_latency: float = 0.0,
+                 rtf: Optional[float] = None, failure_rate: float = 0.0, chars_per_second: float = 4.5,
+                 seed: int = 0, tail_rate: float = 0.0, tail_latency: float = 0.0):
+        """
+        Args:
+            chunks: 每句产出的块数
+            delay: 每块之间的间隔（秒），设置rtf时不使用
+            first_chunk_latency: 首块前的等待（秒）
+            rtf: 实时率，合成耗时与音频时长之比
+            failure_rate: 合成失败的概率，失败时在首块之前抛出异常
+            chars_per_second: 估算音频时长使用的语速
+            seed: 失败抽样的随机种子
+            tail_rate: 首块额外等待tail_latency的概率，模拟长尾延迟
+            tail_latency: 长尾请求首块前额外的等待（秒）
+        """
+        self.chunks = chunks
+        self.delay = delay
+        self.first_chunk_latency = first_chunk_latency
+        self.rtf = rtf
+        self.failure_rate = failure_rate
+        self.chars_per_second = chars_per_second
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.requests = 0
+        self.failures = 0
+        self.active = 0  # 进行中的合成数
+        self._random = random.Random(seed)
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        self.requests += 1
+        self.active += 1
+        try:
+            async for chunk in self._synthesize(text):
+                yield chunk
+        finally:
+            self.active -= 1
+
+    async def _synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        latency = self.first_chunk_latency
+        if self.tail_rate and self._random.random() < self.tail_rate:
+            latency += self.tail_latency
+        if latency:
+            await asyncio.sleep(latency)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.failures += 1
+            raise RuntimeError("模拟合成失败")
+        if self.rtf is None:
+            size, delay = 720, self.delay
+        else:
+            duration = len(text) / self.chars_per_second
+            size = max(1, int(duration * FAKE_BYTES_PER_SECOND / self.chunks))
+            delay = duration * self.rtf / self.chunks
+        for _ in range(self.chunks):
+            if delay:
+                await asyncio.sleep(delay)
+            yield AudioChunk(b"\x00" * size, "mp3", 24000, 1)
+
+
+async def fake_tokens(text: str, tokens_per_second: float = 30.0, token_chars: int = 2) -> AsyncIterator[str]:
+    """按固定速率输出token的假LLM流"""
+    for start in range(0, len(text), token_chars):
+        await asyncio.sleep(1 / tokens_per_second)
+        yield text[start:start + token_chars]
+
+
+class FakeLLM:
+    """与OpenAILLM.fake_response用法相同的假LLM，token速率和首token延迟可配置"""
+    def __init__(self, text: str = "星光洒满夜空，思绪随风飘散，我心支离破碎。", tokens_per_second: float = 30.0,
+                 token_chars: int = 2, first_token_latency: float = 0.5):
+        self.text = text
+        self.tokens_per_second = tokens_per_second
+        self.token_chars = token_chars
+        self.first_token_latency = first_token_latency
+
+    def fake_response(self, dialogue: list) -> Iterator[str]:
+        time.sleep(self.first_token_latency)
+        for start in range(0, len(self.text), self.token_chars):
+            time.sleep(1 / self.tokens_per_second)
+            yield self.text[start:start + self.token_chars]
+
+    async def aresponse(self, dialogue: list) -> AsyncIterator[str]:
+        await asyncio.sleep(self.first_token_latency)
+        async for token in fake_tokens(self.text, self.tokens_per_second, self.token_chars):
+            yield token
+
+
+class NullPlayer:
+    """丢弃所有数据块的播放器"""
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def add_chunk(self, chunk):
+        pass
+
+
+class RecordingPlayer(NullPlayer):
+    """记录每个数据块到达时间的播放器，结束标记记为None"""
+    def __init__(self):
+        self.events: List[Tuple[float, Optional[int]]] = []
+
+    def first_chunk_at(self) -> Optional[float]:
+        return next((at for at, size in self.events if size is not None), None)
+
+    def add_chunk(self, chunk):
+        self.events.append((time.perf_counter(), None if is_end(chunk) else len(chunk)))
+
+    def gaps(self) -> List[float]:
+        """相邻句子之间，上一句结束到下一句首个数据块的间隔（秒）"""
+        gaps = []
+        ended_at = None
+        for at, size in self.events:
+            if size is None:
+                ended_at = at
+            elif ended_at is not None:
+                gaps.append(at - ended_at)
+                ended_at = None
+        return gaps
+
+
+class TimelinePlayer(RecordingPlayer):
+    """按实时播放模拟时间线的播放器，统计首音延迟、句间空白和句中卡顿"""
+    def __init__(self, bytes_per_second: float = FAKE_BYTES_PER_SECOND):
+        super().__init__()
+        self.bytes_per_second = bytes_per_second
+
+    def report(self, start: float) -> Dict[str, float]:
+        """
+        Args:
+            start: 文本流开始的时间（time.perf_counter）
+        """
+        clock = None  # 已送入音频的预计播完时间
+        boundary = False
+        ttfa = None
+        gaps: List[float] = []
+        stall = 0.0
+        underruns = 0
+        for at, size in self.events:
+            if size is None:
+                boundary = True
+                continue
+            if clock is None:
+                ttfa = at - start
+                clock = at
+            elif at > clock:
+                if boundary:
+                    gaps.append(at - clock)
+                else:
+                    stall += at - clock
+                    underruns += 1
+                clock = at
+            elif boundary:
+                gaps.append(0.0)
+            boundary = False
+            clock += size / self.bytes_per_second
+        return {
+            "ttfa_s": ttfa,
+            "gap_total_s": sum(gaps),
+            "gap_max_s": max(gaps, default=0.0),
+            "stall_s": stall,
+            "underruns": underruns,
+            "playback_end_s": clock - start if clock is not None else None,
+        }
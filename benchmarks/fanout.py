@@ -0,0 +1,124 @@
+"""一次合成分发给多个输出端
+
+主输出端按实时播放模拟时间线，另有一个录音文件、一个读取正常的TCP客户端和两个读取很慢的TCP客户端，
+慢客户端一个落后时被移除，一个落后时丢弃当前句剩余的音频。
+对比只有主输出端和分发给全部输出端时主输出端的首音延迟、句间空白和卡顿，
+以及每个输出端收到、丢弃的字节数和是否被移除。引擎请求数不随输出端数量增加。
+
+运行: python -m benchmarks.fanout
+"""
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.e2e import REPLY
+from benchmarks.fakes import FAKE_BYTES_PER_SECOND, FakeEngine, FakeLLM, NullPlayer, TimelinePlayer
+from tts_module.audio_chunk import is_end
+from tts_module.player.fanout import FanOutPlayer
+from tts_module.player.sinks import FileSink, SocketSink
+from tts_module.tts import TTS
+
+
+class BufferSink(NullPlayer):
+    """记录收到的音频块所引用的底层缓冲"""
+    def __init__(self):
+        self.buffers: List[object] = []
+
+    def add_chunk(self, chunk):
+        if not is_end(chunk):
+            self.buffers.append(chunk.data.obj)
+
+
+def reader(bytes_per_second: float) -> tuple:
+    """本地TCP服务端，按给定速率读取，0表示尽快读取；返回(地址, 已读字节数的列表)"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    received = [0]
+
+    def run():
+        conn, _ = server.accept()
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        with conn:
+            while data := conn.recv(4096):
+                received[0] += len(data)
+                if bytes_per_second:
+                    time.sleep(len(data) / bytes_per_second)
+        server.close()
+
+    threading.Thread(target=run, daemon=True).start()
+    return server.getsockname(), received
+
+
+def connect(address, name: str, queue_bytes: int) -> SocketSink:
+    sock = socket.create_connection(address)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    return SocketSink(sock, queue_items=0, queue_bytes=queue_bytes, name=name)
+
+
+async def run(fan_out: bool, args) -> Dict:
+    llm = FakeLLM(REPLY * args.paragraphs, args.tokens_per_second, first_token_latency=0.2)
+    engine = FakeEngine(chunks=8, first_chunk_latency=0.1, rtf=args.rtf)
+    primary = TimelinePlayer()
+    result: Dict = {"fan_out": fan_out}
+    if fan_out:
+        path = os.path.join(tempfile.mkdtemp(), "reply.mp3")
+        fast_address, fast_received = reader(0)
+        slow_address, slow_received = reader(FAKE_BYTES_PER_SECOND * args.slow_rate)
+        first, second = BufferSink(), BufferSink()
+        player = FanOutPlayer({"primary": primary})
+        player.add_sink("file", FileSink(path), "drop")
+        player.add_sink("fast_client", connect(fast_address, "fast_client", args.client_bytes), "detach")
+        player.add_sink("slow_client", connect(slow_address, "slow_client", args.client_bytes), "detach")
+        # 同样读得很慢，但落后时只丢弃当前句剩余的音频
+        lossy_address, lossy_received = reader(FAKE_BYTES_PER_SECOND * args.slow_rate)
+        player.add_sink("lossy_client", connect(lossy_address, "lossy_client", args.client_bytes), "drop")
+        player.add_sink("buffers", first, "drop")
+        player.add_sink("buffers2", second, "drop")
+    else:
+        player = primary
+    tts = TTS(max_workers=3, engine=engine, player=player, scheduler="asyncio")
+    await tts.start()
+    start = time.perf_counter()
+    await tts.process_stream(llm.aresponse([]))
+    await tts.stop()
+    report = primary.report(start)
+    result.update({
+        "requests": engine.requests,
+        "ttfa_s": round(report["ttfa_s"], 3),
+        "gap_total_s": round(report["gap_total_s"], 3),
+        "stall_s": round(report["stall_s"], 3),
+        "primary_bytes": sum(size for _, size in primary.events if size),
+    })
+    if fan_out:
+        shared = sum(a is b for a, b in zip(first.buffers, second.buffers))
+        result["shared_buffers"] = f"{shared}/{len(first.buffers)}"
+        result["file_bytes"] = os.path.getsize(path)
+        result["fast_client_received"] = fast_received[0]
+        result["slow_client_received"] = slow_received[0]
+        result["lossy_client_received"] = lossy_received[0]
+        for stats in player.sink_stats():
+            result[stats["name"]] = {key: stats[key] for key in
+                                     ("delivered", "dropped_bytes", "dropped_sentences", "detached")}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=2, help="回复文本重复的次数")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--rtf", type=float, default=0.1)
+    parser.add_argument("--slow-rate", type=float, default=0.5, help="慢客户端的读取速度相对实时的倍数")
+    parser.add_argument("--client-bytes", type=int, default=64 * 1024, help="客户端输出端的队列字节上限")
+    args = parser.parse_args()
+    for fan_out in (False, True):
+        print(asyncio.run(run(fan_out, args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""测量句间交接延迟：前一句done到下一句恢复执行的时间
+
+运行: python -m benchmarks.handoff --sentences 30
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.fakes import FakeEngine, NullPlayer
+from tts_module.tts import TTS
+
+
+async def run(scheduler: str, sentences: int, max_workers: int) -> dict:
+    tts = TTS(max_workers=max_workers, engine=FakeEngine(chunks=4, delay=0.005),
+              player=NullPlayer(), scheduler=scheduler)
+
+    async def text():
+        for i in range(sentences):
+            yield f"第{i}句测试文本。"
+
+    await tts.start()
+    begin = time.perf_counter()
+    await tts.process_stream(text())
+    await tts.stop()
+    elapsed = time.perf_counter() - begin
+    stats = tts.sequence_manager.handoff_stats()
+    return {
+        "scheduler": scheduler,
+        "elapsed_s": round(elapsed, 3),
+        "handoffs": stats["count"],
+        "handoff_mean_ms": round(stats["mean_ms"], 3),
+        "handoff_max_ms": round(stats["max_ms"], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=30)
+    parser.add_argument("--max-workers", type=int, default=5)
+    args = parser.parse_args()
+    for scheduler in ("thread", "asyncio"):
+        print(asyncio.run(run(scheduler, args.sentences, args.max_workers)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""对比单一后端与对冲组合引擎的首包延迟分布
+
+主后端大部分请求很快，但有一部分长尾请求和失败；备用后端稳定但较慢。
+第二部分让主后端完全不可用，观察熔断后主后端收到的请求数。
+
+运行: python -m benchmarks.hedged_engine --sentences 400
+"""
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+
+from benchmarks.fakes import FakeEngine
+from tts_module.engine.base_engine import TTSEngine
+from tts_module.engine.hedged_engine import HedgeConfig, HedgedEngine
+
+
+async def first_chunk(engine: TTSEngine, text: str) -> Optional[float]:
+    """首块延迟（秒），没有音频时为None"""
+    begin = time.perf_counter()
+    latency = None
+    async for _ in engine.synthesize(text):
+        if latency is None:
+            latency = time.perf_counter() - begin
+    return latency
+
+
+async def measure(engine: TTSEngine, sentences: int, concurrency: int) -> List[Optional[float]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            try:
+                return await first_chunk(engine, f"第{i}句测试文本。")
+            except Exception:
+                return None
+
+    return await asyncio.gather(*(one(i) for i in range(sentences)))
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(name: str, latencies: List[Optional[float]]):
+    ok = [latency for latency in latencies if latency is not None]
+    print(f"{name:<8} p50 {percentile(ok, 0.5) * 1000:7.1f}ms  p95 {percentile(ok, 0.95) * 1000:7.1f}ms  "
+          f"p99 {percentile(ok, 0.99) * 1000:7.1f}ms  max {max(ok) * 1000:7.1f}ms  "
+          f"无音频 {len(latencies) - len(ok)}/{len(latencies)}")
+
+
+def primary(args, seed: int, failure_rate: Optional[float] = None) -> FakeEngine:
+    return FakeEngine(chunks=4, first_chunk_latency=args.primary_latency, tail_rate=args.tail_rate,
+                      tail_latency=args.tail_latency,
+                      failure_rate=args.failure_rate if failure_rate is None else failure_rate, seed=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--primary-latency", type=float, default=0.05)
+    parser.add_argument("--tail-rate", type=float, default=0.1)
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--secondary-latency", type=float, default=0.15)
+    parser.add_argument("--hedge-after", type=float, default=0.2)
+    args = parser.parse_args()
+
+    config = HedgeConfig(hedge_after=args.hedge_after, failure_threshold=5)
+    report("单一后端", asyncio.run(measure(primary(args, seed=1), args.sentences, args.concurrency)))
+    hedged = HedgedEngine([primary(args, seed=1), FakeEngine(chunks=4, first_chunk_latency=args.secondary_latency)],
+                          config)
+    report("对冲", asyncio.run(measure(hedged, args.sentences, args.concurrency)))
+    for backend in hedged.stats():
+        print(f"  {backend}")
+
+    # 主后端完全不可用：熔断后不再等待它
+    down = primary(args, seed=2, failure_rate=1.0)
+    hedged = HedgedEngine([down, FakeEngine(chunks=4, first_chunk_latency=args.secondary_latency)], config)
+    report("主后端宕机", asyncio.run(measure(hedged, args.sentences, 1)))
+    print(f"  主后端收到 {down.requests} 个请求，状态 {hedged.breakers[0].state}")
+
+
+if __name__ == "__main__":
+    main()
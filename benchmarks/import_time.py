@@ -0,0 +1,59 @@
+"""模块导入耗时
+
+在新的解释器进程中导入各入口模块并计时（不含解释器启动），取多次运行的中位数，
+同时列出导入后已加载的重量级第三方库。导入失败（如缺少PortAudio时导入sounddevice）时给出错误。
+短生命周期的工作进程（ProcessEngine以spawn方式启动）每次都要付出这部分开销。
+
+运行: python -m benchmarks.import_time --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+TARGETS = {
+    "tts_module.tts": "import tts_module.tts",
+    "tts_module.server": "import tts_module.server",
+    "工作进程": "import tts_module.engine.process_engine, tts_module.engine.tone_engine",
+    "按名称加载edge": "from tts_module.registry import engines; engines.load('edge')",
+}
+HEAVY = ("edge_tts", "openai", "httpx", "aiohttp", "sounddevice", "soundfile", "numpy")
+
+PROBE = """
+import json, sys, time
+begin = time.perf_counter()
+try:
+    exec({code!r})
+    error = None
+except BaseException as e:
+    error = f"{{type(e).__name__}}: {{str(e).splitlines()[0] if str(e) else ''}}"
+elapsed = time.perf_counter() - begin
+print(json.dumps({{"elapsed": elapsed, "error": error, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(code: str, runs: int) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.environ.get("PYTHONPATH"), root])))
+    samples = []
+    result = {}
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", PROBE.format(code=code, heavy=HEAVY)],
+                                capture_output=True, text=True, env=env, cwd=root)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        samples.append(result["elapsed"])
+    return {"ms": round(statistics.median(samples) * 1000, 1), "error": result["error"], "loaded": result["loaded"]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    for name, code in TARGETS.items():
+        print(name, measure(code, args.runs))
+
+
+if __name__ == "__main__":
+    main()
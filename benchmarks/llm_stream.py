@@ -0,0 +1,95 @@
+"""token缓慢到达时事件循环的响应性
+
+替身服务器以SSE每隔 --interval 秒发送一个token。消费token的同时运行一个
+每10ms唤醒一次的计时任务，统计其唤醒延迟：延迟越大说明事件循环被阻塞越久。
+运行: python -m benchmarks.llm_stream
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import openai
+
+from benchmarks.standin import StandInServer
+from llm import OpenAILLM
+from tts_module.sentence_processor import SentenceProcessor
+
+
+def slow_completion(tokens: int, interval: float):
+    async def handler(method, path, body):
+        async def stream():
+            for i in range(tokens):
+                await asyncio.sleep(interval)
+                chunk = {
+                    "id": "chatcmpl-standin", "object": "chat.completion.chunk", "created": 0,
+                    "model": "standin",
+                    "choices": [{"index": 0, "delta": {"content": f"字{i}"}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+        return "text/event-stream", stream()
+    return handler
+
+
+async def blocking_wrapper(gen):
+    """改造前SentenceProcessor._to_async_generator的做法"""
+    for item in gen:
+        yield item
+
+
+async def measure(name: str, stream) -> dict:
+    lags = []
+    running = True
+
+    async def ticker():
+        while running:
+            expected = time.perf_counter() + 0.01
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - expected)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    tokens = 0
+    async for _ in stream:
+        tokens += 1
+    elapsed = time.perf_counter() - start
+    running = False
+    await task
+    return {
+        "mode": name,
+        "tokens": tokens,
+        "elapsed_s": round(elapsed, 3),
+        "ticks": len(lags),
+        "tick_lag_mean_ms": round(sum(lags) / len(lags) * 1000, 2) if lags else 0.0,
+        "tick_lag_max_ms": round(max(lags) * 1000, 2) if lags else 0.0,
+    }
+
+
+async def run(tokens: int, interval: float):
+    server = StandInServer(slow_completion(tokens, interval))
+    server.start_in_thread()
+    llm = OpenAILLM()
+    llm.base_url = server.base_url
+    llm.client = openai.OpenAI(api_key=llm.api_key, base_url=llm.base_url)
+    dialogue = [{"role": "user", "content": "你好"}]
+    try:
+        print(await measure("sync", blocking_wrapper(llm.response(dialogue))))
+        threaded = SentenceProcessor(None)._to_async_generator(llm.response(dialogue))
+        print(await measure("sync-threaded", threaded))
+        print(await measure("async", llm.aresponse(dialogue)))
+    finally:
+        await llm.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args.tokens, args.interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""对比不同预合成窗口下的句间空白和总耗时
+
+运行: python -m benchmarks.lookahead --first-chunk-latency 0.8
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.fakes import FakeEngine, RecordingPlayer
+from tts_module.tts import TTS
+
+
+async def run(lookahead: int, sentences: int, first_chunk_latency: float) -> dict:
+    player = RecordingPlayer()
+    engine = FakeEngine(chunks=10, delay=0.02, first_chunk_latency=first_chunk_latency)
+    tts = TTS(max_workers=8, engine=engine, player=player, scheduler="asyncio", lookahead=lookahead)
+
+    async def text():
+        for i in range(sentences):
+            yield f"第{i}句测试文本。"
+
+    await tts.start()
+    begin = time.perf_counter()
+    await tts.process_stream(text())
+    await tts.stop()
+    elapsed = time.perf_counter() - begin
+    gaps = player.gaps()
+    return {
+        "lookahead": lookahead,
+        "elapsed_s": round(elapsed, 3),
+        "gap_mean_ms": round(sum(gaps) / len(gaps) * 1000, 1) if gaps else 0.0,
+        "gap_max_ms": round(max(gaps) * 1000, 1) if gaps else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=10)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.8)
+    args = parser.parse_args()
+    for lookahead in (1, 2, 3, 5):
+        print(asyncio.run(run(lookahead, args.sentences, args.first_chunk_latency)))
+
+
+if __name__ == "__main__":
+    main()
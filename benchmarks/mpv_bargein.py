@@ -0,0 +1,138 @@
+"""测量MPVPlayer打断到静音的延迟
+
+用一个模拟mpv的脚本代替真实mpv：按固定码率从stdin读取音频模拟播放，
+在IPC收到stop或进程被终止时记录静音时刻。不打断时，静音要等排队的音频全部播完。
+flush本身只丢弃队列并在后台切换进程，resume为切换完成、可以写入新回复的延迟。
+
+运行: python -m benchmarks.mpv_bargein --rounds 20
+"""
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import time
+
+from tts_module.audio_chunk import AudioChunk
+from tts_module.player.mpv_player import MPVPlayer
+
+STANDIN = r'''#!{python}
+import json, os, signal, socket, sys, threading, time
+
+log_path = os.environ["MPV_STANDIN_LOG"]
+rate = int(os.environ.get("MPV_STANDIN_RATE", "32000"))
+ipc_path = None
+for arg in sys.argv[1:]:
+    if arg.startswith("--input-ipc-server="):
+        ipc_path = arg.split("=", 1)[1]
+silenced = threading.Event()
+
+def silence(reason):
+    if not silenced.is_set():
+        silenced.set()
+        with open(log_path, "a") as f:
+            f.write(f"{{os.getpid()}} {{time.time()}} {{reason}}\n")
+
+def on_term(signum, frame):
+    silence("term")
+    os._exit(0)
+
+signal.signal(signal.SIGTERM, on_term)
+
+def serve():
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(ipc_path)
+    server.listen(1)
+    conn, _ = server.accept()
+    for line in conn.makefile("rb"):
+        request = json.loads(line)
+        if request["command"][0] == "stop":
+            silence("stop")
+        reply = {{"error": "success", "request_id": request.get("request_id")}}
+        conn.sendall((json.dumps(reply) + "\n").encode())
+
+if ipc_path:
+    threading.Thread(target=serve, daemon=True).start()
+while not silenced.is_set():
+    data = sys.stdin.buffer.read1(4096)
+    if not data:
+        break
+    time.sleep(len(data) / rate)  # 模拟按实时速度播放
+silence("drained")
+while True:
+    time.sleep(1)
+'''
+
+
+def silence_time(log_path: str, pid: int, timeout: float = 5.0) -> float:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open(log_path) as f:
+            for line in f:
+                line_pid, at, _reason = line.split()
+                if int(line_pid) == pid:
+                    return float(at)
+        time.sleep(0.001)
+    raise TimeoutError(f"进程{pid}未静音")
+
+
+def run(mpv_path: str, log_path: str, ipc: bool, warm_standby: bool, rounds: int, chunks: int) -> dict:
+    player = MPVPlayer(ipc=ipc, warm_standby=warm_standby, mpv_path=mpv_path)
+    player.start()
+    latencies = []
+    calls = []
+    resume = []
+    try:
+        for _ in range(rounds):
+            for _ in range(chunks):
+                player.add_chunk(AudioChunk(b"\0" * 4096))
+            player.add_chunk(AudioChunk.end_of())
+            time.sleep(0.2)
+            if warm_standby and player._standby_thread:
+                player._standby_thread.join()
+            pid = player._current.process.pid
+            begin = time.time()
+            calls.append(player.flush())
+            player.wait_switched()
+            resume.append(time.time() - begin)  # 切换到新进程、可以写入新回复的时刻
+            latencies.append(silence_time(log_path, pid) - begin)
+    finally:
+        player.stop()
+    latencies.sort()
+    calls.sort()
+    resume.sort()
+    return {
+        "ipc": ipc,
+        "warm_standby": warm_standby,
+        "silence_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "silence_max_ms": round(latencies[-1] * 1000, 2),
+        "flush_call_max_ms": round(calls[-1] * 1000, 2),
+        "resume_p50_ms": round(resume[len(resume) // 2] * 1000, 2),
+        "resume_max_ms": round(resume[-1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=64, help="每轮排队的4KB音频块数")
+    parser.add_argument("--rate", type=int, default=32000, help="模拟播放的码率（字节/秒）")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    mpv_path = os.path.join(workdir, "mpv")
+    with open(mpv_path, "w") as f:
+        f.write(STANDIN.format(python=sys.executable))
+    os.chmod(mpv_path, os.stat(mpv_path).st_mode | stat.S_IEXEC)
+    log_path = os.path.join(workdir, "silence.log")
+    open(log_path, "w").close()
+    os.environ["MPV_STANDIN_LOG"] = log_path
+    os.environ["MPV_STANDIN_RATE"] = str(args.rate)
+
+    print({"no_flush_queued_audio_s": round(args.chunks * 4096 / args.rate, 2)})
+    for ipc, warm_standby in ((False, False), (True, False), (True, True)):
+        print(run(mpv_path, log_path, ipc, warm_standby, args.rounds, args.chunks))
+
+
+if __name__ == "__main__":
+    main()
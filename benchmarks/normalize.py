@@ -0,0 +1,129 @@
+"""文本规范化对合成量的影响
+
+用一组典型的LLM回复（Markdown列表、代码块、表格、链接、emoji、数字和日期）对比规范化前后：
+每个回复送入合成的字数、请求数、合成耗时和音频时长，以及规范化本身的耗时和展开缓存命中率。
+
+运行: python -m benchmarks.normalize
+"""
+import argparse
+import asyncio
+import time
+from typing import AsyncIterator, Dict
+
+from benchmarks.fakes import FakeEngine, FakeLLM, NullPlayer
+from tts_module.audio_chunk import AudioChunk
+from tts_module.engine.base_engine import TTSEngine
+from tts_module.normalize import NormalizeConfig, TextNormalizer, expand_token, read_integer
+from tts_module.tts import TTS
+
+CORPUS = {
+    "code": (
+        "## 实现思路\n\n可以用**双指针**来解决，时间复杂度是O(n)，空间复杂度是O(1)。\n\n"
+        "```python\ndef two_sum(nums, target):\n    left, right = 0, len(nums) - 1\n"
+        "    while left < right:\n        total = nums[left] + nums[right]\n"
+        "        if total == target:\n            return left, right\n"
+        "        if total < target:\n            left += 1\n        else:\n            right -= 1\n"
+        "    return None\n```\n\n"
+        "调用`two_sum([1, 3, 5, 7], 8)`会返回`(0, 3)`。详细说明见[官方文档](https://docs.python.org/3/tutorial/)。\n"
+    ),
+    "table": (
+        "下面是三款手机的对比：\n\n| 型号 | 价格 | 电池 | 重量 |\n| --- | ---: | ---: | ---: |\n"
+        "| A1 | ¥3,999 | 5000mAh | 198g |\n| B2 | ¥4,599 | 4800mAh | 187g |\n"
+        "| C3 | ¥2,799 | 5500mAh | 205g |\n\n**推荐**：预算有限选C3，注重轻薄选B2。🎉\n"
+    ),
+    "list": (
+        "### 出行建议 ✈️\n\n1. **提前出发**：建议在07:30之前出门，早高峰路程约25km，需要40-50min。\n"
+        "2. **查看天气**：明天2024-06-18最高温度32°C，降水概率60%。🌧️\n"
+        "3. **准备证件**：身份证、护照，详见 https://www.example.gov.cn/travel/notice?id=20240618 。\n"
+        "4. **预算**：往返车费约$45.50，餐饮¥150左右。\n\n---\n\n祝你旅途愉快！😊👍\n"
+    ),
+    "chat": (
+        "哈哈，这个问题问得好！😂 其实很简单~ 你只要记住三点：第一，别熬夜🌙；第二，多喝水💧，"
+        "每天大约1.5-2L；第三，保持运动🏃，每周至少150分钟。坚持3个月，你会发现变化的！💪✨\n"
+    ),
+    "report": (
+        "# 季度总结\n\n> 数据截至2024/03/31。\n\n- 营收：1,250,000元，同比增长18.5%\n"
+        "- 新增用户：32,400人，其中付费用户占12%\n- 客服满意度：4.8分（满分5分）\n\n"
+        "**下季度目标**：营收突破1,500,000元，详情见[季度计划](https://wiki.example.com/q2-plan)。\n"
+    ),
+}
+
+
+class CountingEngine(TTSEngine):
+    """统计送入合成的字数和合成耗时"""
+    def __init__(self, engine: TTSEngine):
+        self.engine = engine
+        self.chars = 0
+        self.requests = 0
+        self.busy = 0.0
+        self.audio_bytes = 0
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        self.chars += len(text)
+        self.requests += 1
+        begin = time.perf_counter()
+        try:
+            async for chunk in self.engine.synthesize(text):
+                self.audio_bytes += len(chunk)
+                yield chunk
+        finally:
+            self.busy += time.perf_counter() - begin
+
+
+async def synthesize(text: str, normalize, args) -> Dict:
+    engine = CountingEngine(FakeEngine(chunks=4, first_chunk_latency=args.request_overhead, rtf=args.rtf))
+    tts = TTS(max_workers=1, engine=engine, player=NullPlayer(), scheduler="asyncio", normalize=normalize)
+    await tts.start()
+    await tts.process_stream(FakeLLM(text, tokens_per_second=2000, first_token_latency=0.0).aresponse([]))
+    await tts.stop()
+    return {"chars": engine.chars, "requests": engine.requests, "synth_s": engine.busy,
+            "audio_s": engine.audio_bytes / 6000}
+
+
+def overhead(text: str, rounds: int) -> float:
+    """规范化每个2字文本块的平均耗时（微秒）"""
+    chunks = [text[i:i + 2] for i in range(0, len(text), 2)]
+    normalizer = TextNormalizer()
+    begin = time.perf_counter()
+    for _ in range(rounds):
+        normalizer.reset()
+        for chunk in chunks:
+            normalizer.feed(chunk)
+        normalizer.flush()
+    return (time.perf_counter() - begin) / rounds / len(chunks) * 1e6
+
+
+async def main_async(args):
+    totals = {"raw": {}, "normalized": {}}
+    for name, text in CORPUS.items():
+        raw = await synthesize(text, None, args)
+        normalized = await synthesize(text, NormalizeConfig(), args)
+        for key, result in (("raw", raw), ("normalized", normalized)):
+            for field, value in result.items():
+                totals[key][field] = totals[key].get(field, 0) + value
+        print(f"{name:<7} 字数 {raw['chars']:4d} -> {normalized['chars']:4d}  "
+              f"请求 {raw['requests']:2d} -> {normalized['requests']:2d}  "
+              f"合成 {raw['synth_s']:5.2f}s -> {normalized['synth_s']:5.2f}s  "
+              f"音频 {raw['audio_s']:5.1f}s -> {normalized['audio_s']:5.1f}s  "
+              f"规范化 {overhead(text, args.rounds):5.1f}µs/块")
+    raw, normalized = totals["raw"], totals["normalized"]
+    print(f"合计    字数 {raw['chars']} -> {normalized['chars']} "
+          f"({(1 - normalized['chars'] / raw['chars']) * 100:.1f}%)，"
+          f"合成耗时节省 {raw['synth_s'] - normalized['synth_s']:.2f}s "
+          f"({(1 - normalized['synth_s'] / raw['synth_s']) * 100:.1f}%)，"
+          f"音频缩短 {raw['audio_s'] - normalized['audio_s']:.1f}s")
+    for cache in (expand_token, read_integer):
+        info = cache.cache_info()
+        print(f"{cache.__name__} 缓存命中 {info.hits}/{info.hits + info.misses}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rtf", type=float, default=0.2)
+    parser.add_argument("--request-overhead", type=float, default=0.05, help="每个请求的固定开销（秒）")
+    parser.add_argument("--rounds", type=int, default=200, help="测量规范化耗时的重复次数")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
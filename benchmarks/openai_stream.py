@@ -0,0 +1,60 @@
+"""OpenAIEngine流式合成：首个chunk延迟与总耗时，以及连接复用情况
+
+替身服务器每隔 --interval 秒发送一个音频块，共 --chunks 个。
+运行: python -m benchmarks.openai_stream
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.standin import StandInServer
+from tts_module.engine.openai_engine import OpenAIConfig, OpenAIEngine
+
+
+def slow_speech(chunks: int, interval: float):
+    async def handler(method, path, body):
+        async def stream():
+            for _ in range(chunks):
+                await asyncio.sleep(interval)
+                yield b"\x00" * 4800
+        return "audio/wav", stream()
+    return handler
+
+
+async def run(sentences: int, chunks: int, interval: float):
+    server = StandInServer(slow_speech(chunks, interval))
+    await server.start()
+    engine = OpenAIEngine(OpenAIConfig(base_url=server.base_url, api_key="sk-test"))
+    try:
+        for i in range(sentences):
+            start = time.perf_counter()
+            first = None
+            size = 0
+            async for chunk in engine.synthesize(f"第{i}句测试文本。"):
+                if first is None:
+                    first = time.perf_counter() - start
+                size += len(chunk)
+            total = time.perf_counter() - start
+            print({
+                "sentence": i,
+                "first_chunk_s": round(first, 3),
+                "total_s": round(total, 3),
+                "bytes": size,
+            })
+        print({"requests": server.requests, "connections": server.connections})
+    finally:
+        await engine.aclose()
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=3)
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(run(args.sentences, args.chunks, args.interval))
+
+
+if __name__ == "__main__":
+    main()
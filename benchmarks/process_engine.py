@@ -0,0 +1,165 @@
+"""本地CPU密集引擎的多进程合成
+
+用确定性的ToneEngine合成一组句子，对比两种并发方式在不同并发数下的吞吐：
+    thread   每句一个线程和事件循环，引擎在主进程中合成（与thread调度相同），受GIL限制
+    process  ProcessEngine的工作进程池，音频经共享内存传回
+统计总耗时、每秒合成的音频时长、相对单线程的加速比和平均首块延迟，
+并检查多进程合成的音频与主进程合成的逐字节一致。最后用TTS管线跑一遍，确认与调度方式无关。
+加速比受机器核数限制，核数不少于并发数时process的吞吐随并发数线性增长。
+
+运行: python -m benchmarks.process_engine --workers 1,2,4
+"""
+import argparse
+import asyncio
+import functools
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.fakes import NullPlayer
+from tts_module.engine.process_engine import ProcessEngine, ProcessPoolConfig, available_cores
+from tts_module.engine.tone_engine import ToneConfig, ToneEngine
+from tts_module.tts import TTS
+
+SENTENCES = [
+    "今天的天气非常好，适合出门散步。",
+    "我们可以先去公园，再去附近的咖啡馆坐一坐。",
+    "这本书讲的是一个关于勇气和友谊的故事。",
+    "下午三点有一个会议，请提前准备好材料。",
+    "如果遇到问题，可以随时联系客服。",
+    "这道菜的关键在于火候，不能太大也不能太小。",
+    "明天早上七点出发，路上大约需要两个小时。",
+    "学习一门新语言最重要的是坚持每天练习。",
+]
+
+
+async def collect(engine, text: str) -> Dict:
+    begin = time.perf_counter()
+    first = None
+    data = []
+    async for chunk in engine.synthesize(text):
+        if first is None:
+            first = time.perf_counter() - begin
+        data.append(bytes(chunk))
+    return {"audio": b"".join(data), "first_s": first}
+
+
+def run_threads(engine: ToneEngine, texts: List[str], concurrency: int) -> List[Dict]:
+    """concurrency个线程各自运行事件循环，轮流取句子合成"""
+    results: List[Dict] = [{} for _ in texts]
+    lock = threading.Lock()
+    remaining = list(enumerate(texts))
+
+    def worker():
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                with lock:
+                    if not remaining:
+                        return
+                    index, text = remaining.pop(0)
+                results[index] = loop.run_until_complete(collect(engine, text))
+        finally:
+            loop.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+async def run_processes(engine: ProcessEngine, texts: List[str], concurrency: int) -> List[Dict]:
+    """同时最多请求concurrency句，首块延迟不含排队时间，与thread方式可比"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(text: str) -> Dict:
+        async with semaphore:
+            return await collect(engine, text)
+    return await asyncio.gather(*(limited(text) for text in texts))
+
+
+def summarize(mode: str, concurrency: int, results: List[Dict], elapsed: float, reference: List[bytes],
+              sample_rate: int) -> Dict:
+    audio = sum(len(result["audio"]) for result in results) / 2 / sample_rate
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "audio_per_s": round(audio / elapsed, 2),
+        "first_chunk_ms_mean": round(statistics.mean(result["first_s"] for result in results) * 1000, 1),
+        "identical": [result["audio"] for result in results] == reference,
+    }
+
+
+async def pipeline(engine, texts: List[str], scheduler: str) -> int:
+    """经TTS管线合成，返回送入播放器的字节数，管线会按标点重新分句"""
+    player = NullPlayer()
+    received = [0]
+    add_chunk = player.add_chunk
+
+    def counting_add_chunk(chunk):
+        received[0] += len(chunk)
+        add_chunk(chunk)
+    player.add_chunk = counting_add_chunk
+
+    async def text():
+        for sentence in texts:
+            yield sentence
+
+    tts = TTS(max_workers=4, engine=engine, player=player, scheduler=scheduler)
+    await tts.start()
+    await tts.process_stream(text())
+    await tts.stop()
+    return received[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的并发数")
+    parser.add_argument("--repeat", type=int, default=2, help="句子列表重复的次数")
+    parser.add_argument("--oversample", type=int, default=8, help="ToneEngine的计算量")
+    args = parser.parse_args()
+    config = ToneConfig(oversample=args.oversample)
+    texts = SENTENCES * args.repeat
+    engine = ToneEngine(config)
+    reference = [result["audio"] for result in run_threads(engine, texts, 1)]
+    print(f"可用CPU核数 {available_cores()}，{len(texts)}句")
+
+    baseline = None
+    for concurrency in (int(value) for value in args.workers.split(",")):
+        begin = time.perf_counter()
+        results = run_threads(engine, texts, concurrency)
+        thread_row = summarize("thread", concurrency, results, time.perf_counter() - begin, reference,
+                               config.sample_rate)
+        baseline = baseline or thread_row["audio_per_s"]
+
+        pool = ProcessEngine(functools.partial(ToneEngine, config), ProcessPoolConfig(workers=concurrency))
+        begin = time.perf_counter()
+        pool.start()
+        pool.wait_ready()
+        startup = time.perf_counter() - begin
+        begin = time.perf_counter()
+        results = asyncio.run(run_processes(pool, texts, concurrency))
+        process_row = summarize("process", concurrency, results, time.perf_counter() - begin, reference,
+                                config.sample_rate)
+        process_row["startup_s"] = round(startup, 3)
+        process_row["chunks"] = pool.stats()["chunks"]
+        pool.close()
+        for row in (thread_row, process_row):
+            row["speedup"] = round(row["audio_per_s"] / baseline, 2)
+            print(row)
+
+    pool = ProcessEngine(functools.partial(ToneEngine, config), ProcessPoolConfig(workers=2))
+    expected = asyncio.run(pipeline(engine, SENTENCES, "thread"))
+    for scheduler in ("asyncio", "thread"):
+        received = asyncio.run(pipeline(pool, SENTENCES, scheduler))
+        print(f"TTS管线({scheduler}) 送入播放器 {received} 字节，与主进程合成一致 {received == expected}")
+    print(pool.stats())
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""轨迹录制与虚拟时钟回放
+
+用假LLM（token成批到达）和假引擎（首块有长尾延迟）实时跑一个回复，经TraceRecorder录下轨迹，
+再在虚拟时钟上回放两次，检查：
+    两次回放结果完全一致（与机器负载无关）
+    回放的首音延迟、句间空白与实时运行接近
+    回放耗时远小于轨迹时长
+最后用同一轨迹对比不同预合成窗口，演示把慢轨迹当作性能回归测试的固定输入。
+
+运行: python -m benchmarks.replay --lookahead 1,2,4
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import AsyncIterator, Dict
+
+from benchmarks.e2e import REPLY
+from benchmarks.fakes import FakeEngine, TimelinePlayer
+from tts_module.replay import Trace, TraceRecorder, replay
+from tts_module.tts import TTS
+
+FIELDS = ("ttfa_s", "gap_total_s", "gap_max_s", "stall_s", "playback_end_s")
+
+
+class BurstyLLM:
+    """每隔pause秒一次性到达burst个token的假LLM，模拟服务端批量推送"""
+    def __init__(self, text: str, burst: int = 8, pause: float = 0.4, token_chars: int = 2,
+                 first_token_latency: float = 0.6):
+        self.text = text
+        self.burst = burst
+        self.pause = pause
+        self.token_chars = token_chars
+        self.first_token_latency = first_token_latency
+
+    async def aresponse(self, dialogue: list) -> AsyncIterator[str]:
+        await asyncio.sleep(self.first_token_latency)
+        tokens = [self.text[start:start + self.token_chars] for start in range(0, len(self.text), self.token_chars)]
+        for index, token in enumerate(tokens):
+            if index and index % self.burst == 0:
+                await asyncio.sleep(self.pause)
+            yield token
+
+
+async def record(path: str, options: Dict) -> Dict:
+    recorder = TraceRecorder(path)
+    llm = recorder.llm(BurstyLLM(REPLY))
+    engine = recorder.engine(FakeEngine(chunks=4, first_chunk_latency=0.3, rtf=0.3, seed=1,
+                                        tail_rate=0.3, tail_latency=5.0))
+    player = TimelinePlayer()
+    tts = TTS(engine=engine, player=player, scheduler="asyncio", **options)
+    await tts.start()
+    begin = time.perf_counter()
+    await tts.process_stream(llm.aresponse([]))
+    await tts.stop()
+    elapsed = time.perf_counter() - begin
+    recorder.close()
+    report = player.report(begin)
+    report["real_s"] = elapsed
+    return report
+
+
+def rounded(report: Dict) -> Dict:
+    return {field: round(report[field], 3) if report.get(field) is not None else None for field in FIELDS}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--lookahead", default="1,2,4", help="对比的预合成窗口，逗号分隔")
+    args = parser.parse_args()
+    options = {"max_workers": args.workers, "lookahead": 2}
+
+    path = os.path.join(tempfile.mkdtemp(), "trace.jsonl.gz")
+    live = asyncio.run(record(path, options))
+    trace = Trace.load(path)
+    print(f"轨迹 {os.path.getsize(path)} 字节，{len(trace.llm)}个回复，{len(trace.synth)}次合成，"
+          f"时长 {trace.duration():.2f}s，录制耗时 {live['real_s']:.2f}s")
+    print("实时运行", rounded(live))
+
+    first = replay(trace, **options)
+    second = replay(trace, **options)
+    print("回放", rounded(first), f"虚拟 {first['virtual_s']}s，实际 {first['real_s']}s，"
+          f"加速 {first['virtual_s'] / first['real_s']:.0f}x，未命中 {first['engine_misses']}")
+    print("两次回放一致", rounded(first) == rounded(second) and first["statuses"] == second["statuses"])
+    print("与实时运行的差异", {field: round(first[field] - live[field], 3) for field in FIELDS})
+
+    for lookahead in (int(value) for value in args.lookahead.split(",")):
+        report = replay(trace, **dict(options, lookahead=lookahead))
+        print(f"lookahead={lookahead}", rounded(report), report["stage_mean_s"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""对比thread与asyncio两种调度方式的单句开销和线程数
+
+运行: python -m benchmarks.scheduler --sentences 50
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+from benchmarks.fakes import FakeEngine, NullPlayer
+from tts_module.tts import TTS
+
+
+async def run(scheduler: str, sentences: int, max_workers: int) -> dict:
+    tts = TTS(max_workers=max_workers, engine=FakeEngine(), player=NullPlayer(), scheduler=scheduler)
+    dispatched = {}
+    started = {}
+    peak_threads = threading.active_count()
+
+    get_next = tts.sequence_manager.get_next
+    def traced_get_next():
+        seq = get_next()
+        dispatched[seq] = time.perf_counter()
+        return seq
+    tts.sequence_manager.get_next = traced_get_next
+
+    process_audio = tts._process_audio2
+    async def traced_process_audio(sentence, sequence, *rest):
+        nonlocal peak_threads
+        started[sequence] = time.perf_counter()
+        peak_threads = max(peak_threads, threading.active_count())
+        await process_audio(sentence, sequence, *rest)
+    tts._process_audio2 = traced_process_audio
+
+    async def text():
+        for i in range(sentences):
+            yield f"第{i}句测试文本。"
+
+    await tts.start()
+    begin = time.perf_counter()
+    await tts.process_stream(text())
+    await tts.stop()
+    elapsed = time.perf_counter() - begin
+
+    overheads = [(started[s] - dispatched[s]) * 1000 for s in started]
+    return {
+        "scheduler": scheduler,
+        "sentences": len(started),
+        "elapsed_s": round(elapsed, 3),
+        "dispatch_to_start_ms_mean": round(statistics.mean(overheads), 3),
+        "dispatch_to_start_ms_max": round(max(overheads), 3),
+        "peak_threads": peak_threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=50)
+    parser.add_argument("--max-workers", type=int, default=None, help="默认与句子数相同，排除排队等待的影响")
+    args = parser.parse_args()
+    max_workers = args.max_workers or args.sentences
+    for scheduler in ("thread", "asyncio"):
+        result = asyncio.run(run(scheduler, args.sentences, max_workers))
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""固定分句与自适应分句的首音延迟和合成请求数对比
+
+运行: python -m benchmarks.segment_policy
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.fakes import FakeEngine, RecordingPlayer, fake_tokens
+from tts_module.segment_policy import AdaptivePolicy, FixedPolicy
+from tts_module.tts import TTS
+
+REPLY = (
+    "好的，我来帮你看一下。首先，这个问题有几个方面需要考虑，"
+    "一是时间安排，二是预算，三是人员配置。"
+    "关于时间安排，我建议先把需求整理清楚，然后分阶段推进，每个阶段结束后做一次回顾，"
+    "这样可以及时发现问题，也方便调整计划。"
+    "关于预算，最好预留一部分机动资金，用来应对突发情况，"
+    "同时定期核对支出，避免超支。"
+    "至于人员配置，可以根据各阶段的工作量灵活调整，"
+    "关键岗位要有备份，以免因为个别人员变动影响整体进度。"
+    "如果你还有其他问题，随时告诉我。"
+)
+
+
+async def run(name: str, policy, tokens_per_second: float, first_chunk_latency: float) -> dict:
+    player = RecordingPlayer()
+    engine = FakeEngine(chunks=5, delay=0.02, first_chunk_latency=first_chunk_latency)
+    tts = TTS(max_workers=8, engine=engine, player=player, scheduler="asyncio", segment_policy=policy)
+    await tts.start()
+    start = time.perf_counter()
+    await tts.process_stream(fake_tokens(REPLY, tokens_per_second))
+    await tts.stop()
+    return {
+        "policy": name,
+        "time_to_first_audio_s": round(player.first_chunk_at() - start, 3),
+        "requests": engine.requests,
+        "chars_per_request": round(len(REPLY) / engine.requests, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    policies = (
+        ("fixed", None),
+        ("fixed-explicit", FixedPolicy(5, 100)),
+        ("adaptive", AdaptivePolicy()),
+    )
+    for name, policy in policies:
+        print(asyncio.run(run(name, policy, args.tokens_per_second, args.first_chunk_latency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""分句器微基准：逐字符实现与整块扫描实现的耗时对比，并校验两者输出一致
+
+运行: python -m benchmarks.segmenter --sizes 10000 50000 200000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from tts_module.sentences import sentences_generator
+
+
+async def legacy_sentences_generator(text_generator, min_chars=5, max_chars=10, quick_first=False):
+    """改造前的逐字符实现，作为对照"""
+    punctuations = set(",.?，。？！!;；:：")
+    hard_break = set(".。!！?？")
+    buffer = []
+    is_first = True
+
+    async def yield_sentence(text):
+        nonlocal is_first
+        if not text:
+            return None
+        if is_first and quick_first:
+            is_first = False
+            return text
+        return text if len(text) >= min_chars else None
+
+    async for text_chunk in text_generator:
+        for char in text_chunk:
+            buffer.append(char)
+            if char in punctuations:
+                current_text = ''.join(buffer).strip()
+                if len(current_text) > max_chars and char not in hard_break:
+                    continue
+                if current_text and (result := await yield_sentence(current_text)):
+                    yield result
+                buffer.clear()
+
+    final_text = ''.join(buffer).strip()
+    if final_text and (result := await yield_sentence(final_text)):
+        yield result
+
+
+def chinese_corpus(size: int, rng: random.Random) -> str:
+    """每段以一个超过max_chars的无标点长句开头，后面是大量逗号短句、很少句号，
+    逐字符实现在每个逗号处都要重新拼接整个缓冲区"""
+    clauses = ["星光洒满夜空", "思绪随风飘散", "我们沿着河岸慢慢走着", "远处传来钟声", "风吹过树梢"]
+    parts = []
+    total = 0
+    while total < size:
+        opening = "".join(rng.choice(clauses) for _ in range(20))
+        parts.append(opening)
+        total += len(opening)
+        while total < size:
+            clause = rng.choice(clauses)
+            if rng.random() < 0.002:
+                parts.append(clause + "。")
+                total += len(clause) + 1
+                break
+            parts.append(clause + "，")
+            total += len(clause) + 1
+    return "".join(parts)
+
+
+def english_corpus(size: int, rng: random.Random) -> str:
+    words = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "while", "streaming"]
+    parts = []
+    total = 0
+    while total < size:
+        opening = " ".join(rng.choice(words) for _ in range(30)) + " "
+        parts.append(opening)
+        total += len(opening)
+        while total < size:
+            clause = " ".join(rng.choice(words) for _ in range(rng.randint(3, 8)))
+            if rng.random() < 0.002:
+                parts.append(clause + ". ")
+                total += len(clause) + 2
+                break
+            parts.append(clause + ", ")
+            total += len(clause) + 2
+    return "".join(parts)
+
+
+def typical_corpus(size: int, rng: random.Random) -> str:
+    """短句、标点密集的常见输出，用于确认一般情况没有明显退化"""
+    clauses = ["很高兴见到你", "有什么我可以帮忙的吗", "今天天气不错", "我们出去走走吧"]
+    parts = []
+    total = 0
+    while total < size:
+        clause = rng.choice(clauses) + rng.choice("，，。！？")
+        parts.append(clause)
+        total += len(clause)
+    return "".join(parts)
+
+
+def chunked(text: str, rng: random.Random, max_chunk: int):
+    pos = 0
+    chunks = []
+    while pos < len(text):
+        step = rng.randint(1, max_chunk)
+        chunks.append(text[pos:pos + step])
+        pos += step
+    return chunks
+
+
+async def collect(generator, chunks, **kwargs):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+    return [sentence async for sentence in generator(source(), **kwargs)]
+
+
+async def run(sizes, max_chunk: int):
+    rng = random.Random(42)
+    kwargs = {"min_chars": 5, "max_chars": 100, "quick_first": False}
+    for name, corpus in (("zh", chinese_corpus), ("en", english_corpus), ("zh-typical", typical_corpus)):
+        for size in sizes:
+            chunks = chunked(corpus(size, rng), rng, max_chunk)
+            timings = {}
+            outputs = {}
+            for label, generator in (("legacy", legacy_sentences_generator), ("chunked", sentences_generator)):
+                start = time.perf_counter()
+                outputs[label] = await collect(generator, chunks, **kwargs)
+                timings[label] = time.perf_counter() - start
+            assert outputs["legacy"] == outputs["chunked"], f"{name}/{size} 输出不一致"
+            print({
+                "corpus": name,
+                "chars": size,
+                "sentences": len(outputs["chunked"]),
+                "legacy_ms": round(timings["legacy"] * 1000, 1),
+                "chunked_ms": round(timings["chunked"] * 1000, 1),
+                "speedup": round(timings["legacy"] / timings["chunked"], 1),
+            })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--max-chunk", type=int, default=8, help="模拟LLM输出的每个文本块最大字符数")
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.max_chunk))
+
+
+if __name__ == "__main__":
+    main()
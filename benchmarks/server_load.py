@@ -0,0 +1,78 @@
+"""多会话服务的负载测试：N个并发会话各自流式提交文本，统计首个音频字节的延迟
+
+使用FakeEngine，不发起真实合成请求。
+
+运行: python -m benchmarks.server_load --sessions 1 10 50 100
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from benchmarks.fakes import FakeEngine, fake_tokens
+from tts_module.server import ServerConfig, TTSServer
+
+TEXT = "你好，很高兴见到你。今天想聊点什么？我们可以从天气开始，也可以说说最近读的书。"
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def client(http: aiohttp.ClientSession, base_url: str, session_id: str,
+                 tokens_per_second: float) -> dict:
+    begin = time.perf_counter()
+    first_audio = None
+    received = 0
+    async with http.post(f"{base_url}/sessions/{session_id}/speak",
+                         data=(token.encode("utf-8") async for token in fake_tokens(TEXT, tokens_per_second))) as response:
+        async for data in response.content.iter_any():
+            if first_audio is None:
+                first_audio = time.perf_counter() - begin
+            received += len(data)
+    return {"ttfa": first_audio, "total": time.perf_counter() - begin, "bytes": received}
+
+
+async def run(sessions: int, args) -> dict:
+    engine = FakeEngine(chunks=args.chunks, delay=args.chunk_delay, first_chunk_latency=args.first_chunk_latency)
+    server = TTSServer(engine, ServerConfig(port=0, max_sessions=sessions, session_workers=args.session_workers))
+    port = await server.start()
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        connector = aiohttp.TCPConnector(limit=sessions)
+        async with aiohttp.ClientSession(connector=connector) as http:
+            results = await asyncio.gather(*(
+                client(http, base_url, f"s{i}", args.tokens_per_second) for i in range(sessions)
+            ))
+    finally:
+        await server.stop()
+    ttfa = [r["ttfa"] for r in results if r["ttfa"] is not None]
+    totals = [r["total"] for r in results]
+    return {
+        "sessions": sessions,
+        "ttfa_p50_ms": round(percentile(ttfa, 0.5) * 1000, 1),
+        "ttfa_p99_ms": round(percentile(ttfa, 0.99) * 1000, 1),
+        "total_p50_s": round(percentile(totals, 0.5), 3),
+        "total_p99_s": round(percentile(totals, 0.99), 3),
+        "failed": sessions - len(ttfa),
+        "requests": engine.requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--session-workers", type=int, default=3)
+    parser.add_argument("--tokens-per-second", type=float, default=30.0)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.3)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--chunks", type=int, default=10)
+    args = parser.parse_args()
+    for sessions in args.sessions:
+        print(asyncio.run(run(sessions, args)))
+
+
+if __name__ == "__main__":
+    main()
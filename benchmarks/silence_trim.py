@@ -0,0 +1,108 @@
+"""句首句尾静音裁剪
+
+合成引擎返回的每句音频首尾各带一段静音，连续播放时句间多出几百毫秒空白。
+用合成的WAV句子（首尾静音时长与Edge、OpenAI相近，句中有停顿）按FFPlayer流式模式的路径
+解码、重采样、裁剪，统计每个回复去掉的空白时长、句中停顿是否保留、衔接处的最大跳变，
+以及逐块裁剪与整句裁剪结果是否一致、处理速度。
+
+运行: python -m benchmarks.silence_trim
+"""
+import argparse
+import io
+import time
+import wave
+from typing import List, Tuple
+
+import numpy as np
+
+from tts_module.player.pcm_stream import LinearResampler, SilenceTrimmer, TrimConfig, WavStreamDecoder
+
+
+def sentence_wav(rng: np.random.Generator, samplerate: int) -> Tuple[bytes, float]:
+    """一句合成语音的WAV数据及其首尾静音总时长"""
+    def noise(seconds: float) -> np.ndarray:
+        return rng.standard_normal(int(samplerate * seconds)) * 10 ** (-70 / 20)
+
+    parts = [noise(rng.uniform(0.12, 0.25))]
+    lead = len(parts[0])
+    for word in range(rng.integers(3, 7)):
+        duration = rng.uniform(0.2, 0.45)
+        t = np.arange(int(samplerate * duration)) / samplerate
+        pitch = rng.uniform(120, 260)
+        voice = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 5))
+        envelope = np.sin(np.pi * t / duration) ** 0.5
+        parts.append(0.25 * voice * envelope)
+        parts.append(noise(0.12 if word % 2 else 0.04))  # 词间停顿，应当保留
+    tail = noise(rng.uniform(0.3, 0.45))
+    parts.append(tail)
+    samples = np.concatenate(parts)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(samplerate)
+        wav.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue(), (lead + len(tail)) / samplerate
+
+
+def play(sentences: List[bytes], trim, chunk_bytes: Tuple[int, int], rng: np.random.Generator,
+         samplerate: int) -> Tuple[np.ndarray, List[float]]:
+    """按FFPlayer流式模式的路径处理一个回复，返回输出帧和每句裁掉的时长"""
+    trimmer = SilenceTrimmer(samplerate, 1, trim) if trim is not None else None
+    out = []
+    removed = []
+    for data in sentences:
+        decoder = WavStreamDecoder()
+        resampler = None
+        pos = 0
+        while pos < len(data):
+            size = int(rng.integers(*chunk_bytes))
+            frames = decoder.feed(data[pos:pos + size])
+            pos += size
+            if frames is None:
+                continue
+            resampler = resampler or LinearResampler(decoder.samplerate, samplerate, decoder.channels, 1)
+            frames = resampler.process(frames)
+            out.append(trimmer.process(frames) if trimmer else frames)
+        if trimmer:
+            out.append(trimmer.end())
+            removed.append(trimmer.last_removed)
+    return np.concatenate(out), removed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--utterances", type=int, default=5)
+    parser.add_argument("--sentences", type=int, default=8, help="每个回复的句数")
+    parser.add_argument("--source-rate", type=int, default=24000)
+    parser.add_argument("--device-rate", type=int, default=48000)
+    parser.add_argument("--threshold-db", type=float, default=-45.0)
+    args = parser.parse_args()
+    trim = TrimConfig(threshold_db=args.threshold_db)
+    rng = np.random.default_rng(0)
+    total_removed = 0.0
+    total_elapsed = 0.0
+    total_audio = 0.0
+    for index in range(args.utterances):
+        generated = [sentence_wav(rng, args.source_rate) for _ in range(args.sentences)]
+        sentences = [data for data, _ in generated]
+        edge_silence = sum(silence for _, silence in generated)
+        raw, _ = play(sentences, None, (512, 513), np.random.default_rng(index), args.device_rate)
+        begin = time.perf_counter()
+        trimmed, removed = play(sentences, trim, (64, 4096), np.random.default_rng(index), args.device_rate)
+        total_elapsed += time.perf_counter() - begin
+        whole, _ = play(sentences, trim, (1 << 30, 1 << 30 + 1), np.random.default_rng(index), args.device_rate)
+        total_audio += len(raw) / args.device_rate
+        total_removed += sum(removed)
+        jump = np.abs(np.diff(trimmed[:, 0])).max()
+        raw_jump = np.abs(np.diff(raw[:, 0])).max()
+        print(f"回复{index + 1}: 音频 {len(raw) / args.device_rate:5.2f}s -> {len(trimmed) / args.device_rate:5.2f}s，"
+              f"去掉空白 {sum(removed) * 1000:6.0f}ms（首尾静音共{edge_silence * 1000:.0f}ms），"
+              f"每个句间 {sum(removed) / len(removed) * 1000:4.0f}ms，"
+              f"相邻采样最大差 {jump:.3f}（原始{raw_jump:.3f}），"
+              f"逐块与整句一致 {whole.shape == trimmed.shape and np.allclose(whole, trimmed)}")
+    print(f"合计去掉 {total_removed:.2f}s，裁剪处理速度为实时的 {total_audio / total_elapsed:.0f} 倍（含解码和重采样）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""长时间运行下的内存与队列深度
+
+LLM和引擎都比播放快得多，播放器按实时速率的speedup倍消费音频，模拟约一小时的连续回复。
+对比开启与关闭额度（所有额度为0）时进程RSS随时间的变化、各阶段队列峰值和生产者阻塞时间。
+开启额度时RSS应保持平稳；关闭时文本很快读完，未播放的音频全部堆积在播放器队列中，
+RSS在读取文本期间持续增长。
+
+运行: python -m benchmarks.soak --minutes 60 --speedup 60
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.e2e import REPLY
+from benchmarks.fakes import FAKE_BYTES_PER_SECOND, FakeEngine, FakeLLM
+from tts_module.audio_chunk import is_end
+from tts_module.backpressure import BackpressureConfig, BoundedQueue, StageStats
+from tts_module.tts import TTS
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE / 1024 / 1024
+
+
+class ThrottledPlayer:
+    """按固定字节速率消费音频的播放器，队列与MPVPlayer一样按条数和字节限额"""
+    def __init__(self, bytes_per_second: float, queue_items: int = 0, queue_bytes: int = 0):
+        self.bytes_per_second = bytes_per_second
+        self.chunk_queue = BoundedQueue(queue_items, queue_bytes, lambda chunk: len(chunk) if chunk else 0,
+                                        StageStats("player"))
+        self.played = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._drain)
+        self._thread.start()
+
+    def _drain(self):
+        while (chunk := self.chunk_queue.get()) is not None:
+            if not is_end(chunk):
+                time.sleep(len(chunk) / self.bytes_per_second)
+                self.played += len(chunk)
+
+    def stop(self):
+        self.chunk_queue.put(None)
+        self._thread.join()
+
+    def add_chunk(self, chunk):
+        self.chunk_queue.put(chunk)
+
+    async def wait_writable(self, size: int = 0):
+        await self.chunk_queue.wait_space(size)
+
+    def queue_stats(self) -> Dict[str, float]:
+        return self.chunk_queue.stats()
+
+
+async def run(backpressure: BackpressureConfig, args) -> Dict:
+    target = args.minutes * 60 * FAKE_BYTES_PER_SECOND  # 模拟的音频总字节数
+    player = ThrottledPlayer(FAKE_BYTES_PER_SECOND * args.speedup, backpressure.player_items,
+                             backpressure.player_bytes)
+    engine = FakeEngine(chunks=8, rtf=args.rtf)
+    tts = TTS(max_workers=3, engine=engine, player=player, scheduler="asyncio", backpressure=backpressure)
+    samples: List[Tuple[float, float]] = []
+    start = time.perf_counter()
+
+    async def sample():
+        while True:
+            samples.append((time.perf_counter() - start, rss_mb()))
+            await asyncio.sleep(args.sample_interval)
+
+    sampler = asyncio.create_task(sample())
+    await tts.start()
+    produced = 0
+    replies = 0
+    while produced < target:
+        llm = FakeLLM(REPLY, args.tokens_per_second, first_token_latency=0.0)
+        await tts.process_stream(llm.aresponse([]), preempt=False)
+        produced += len(REPLY) / engine.chars_per_second * FAKE_BYTES_PER_SECOND
+        replies += 1
+    text_done = time.perf_counter() - start
+    await tts.sentence_processor.join()
+    while player.chunk_queue.qsize():  # 等待播放完，期间继续采样
+        await asyncio.sleep(args.sample_interval)
+    await tts.stop()
+    sampler.cancel()
+    samples.append((time.perf_counter() - start, rss_mb()))
+    elapsed = time.perf_counter() - start
+
+    # 读取文本期间RSS的增长速度，换算为每模拟小时
+    producing = [rss for at, rss in samples if at <= text_done]
+    simulated_hours = text_done * args.speedup / 3600
+    growth = (producing[-1] - producing[0]) / simulated_hours if simulated_hours else 0.0
+    stats = tts.backpressure_stats()
+    return {
+        "backpressure": bool(backpressure.player_bytes),
+        "replies": replies,
+        "simulated_minutes": round(player.played / FAKE_BYTES_PER_SECOND / 60, 1),
+        "elapsed_s": round(elapsed, 1),
+        "text_done_s": round(text_done, 1),
+        "rss_start_mb": round(samples[0][1], 1),
+        "rss_peak_mb": round(max(rss for _, rss in samples), 1),
+        "rss_growth_mb_per_hour": round(growth, 1),
+        **{f"{stage}_peak_items": values["peak_items"] for stage, values in stats.items()},
+        **{f"{stage}_peak_kb": round(values["peak_bytes"] / 1024, 1) for stage, values in stats.items()},
+        **{f"{stage}_blocked_s": values["blocked_seconds"] for stage, values in stats.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=60.0, help="模拟的音频时长（分钟）")
+    parser.add_argument("--speedup", type=float, default=60.0, help="播放速度相对实时的倍数")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--rtf", type=float, default=0.002)
+    parser.add_argument("--sample-interval", type=float, default=0.5)
+    args = parser.parse_args()
+    unlimited = BackpressureConfig(pending_sentences=0, sentence_items=0, sentence_bytes=0,
+                                   player_items=0, player_bytes=0)
+    # 关闭额度的一轮放在后面，避免它留下的堆内存影响开启额度时的读数
+    for backpressure in (BackpressureConfig(), unlimited):
+        print(asyncio.run(run(backpressure, args)))
+
+
+if __name__ == "__main__":
+    main()
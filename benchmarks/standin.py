@@ -0,0 +1,78 @@
+"""基准测试使用的本地HTTP替身服务器
+
+只实现keep-alive和chunked响应，足够驱动openai客户端。
+handler 接收 (method, path, body) 并返回 (content_type, 异步迭代器)，
+迭代器产出的每个bytes作为一个chunk立即发送。
+"""
+import asyncio
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Tuple
+
+Handler = Callable[[str, str, bytes], Awaitable[Tuple[str, AsyncIterator[bytes]]]]
+
+
+class StandInServer:
+    def __init__(self, handler: Handler, host: str = "127.0.0.1"):
+        self.handler = handler
+        self.host = host
+        self.port = None
+        self.connections = 0
+        self.open = 0  # 当前未关闭的连接数
+        self.requests = 0
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def start_in_thread(self):
+        """在独立线程的事件循环中运行，用于驱动会阻塞调用方事件循环的同步客户端"""
+        ready = threading.Event()
+
+        def serve():
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        ready.wait()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self.open += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                content_type, chunks = await self.handler(method, path, body)
+                writer.write(
+                    f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                    "Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n".encode()
+                )
+                async for chunk in chunks:
+                    writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    await writer.drain()
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.open -= 1
+            writer.close()
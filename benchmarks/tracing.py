@@ -0,0 +1,76 @@
+"""逐句追踪的开销与输出示例
+
+先单独测量每句span的记录和汇总耗时，再用假引擎跑同一段回复，
+对比开启和关闭追踪的总耗时，并打印JSON行和Prometheus指标。
+
+运行: python -m benchmarks.tracing --jsonl /tmp/trace.jsonl
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.e2e import REPLY
+from benchmarks.fakes import FakeEngine, FakeLLM, TimelinePlayer
+from tts_module.tracing import Tracer
+from tts_module.tts import TTS
+
+POINTS = ("dispatch", "synth_start", "first_chunk", "handoff_start", "handoff_end", "playback_start", "playback_end")
+
+
+def span_overhead(tracer: Tracer, spans: int) -> float:
+    """每句span从创建到结束的平均耗时（微秒）"""
+    begin = time.perf_counter()
+    for sequence in range(spans):
+        span = tracer.span("bench", sequence, 20)
+        for point in POINTS:
+            span.mark(point)
+        span.bytes += 4096
+        tracer.finish(span, "handed_off")
+    return (time.perf_counter() - begin) / spans * 1e6
+
+
+async def pipeline(tracer, args) -> float:
+    llm = FakeLLM(REPLY, args.tokens_per_second, first_token_latency=0.0)
+    engine = FakeEngine(chunks=8, first_chunk_latency=args.first_chunk_latency)
+    tts = TTS(max_workers=4, engine=engine, player=TimelinePlayer(), scheduler="asyncio",
+              tracer=tracer, session_id="bench")
+    await tts.start()
+    begin = time.perf_counter()
+    await tts.process_stream(llm.aresponse([]))
+    await tts.stop()
+    return time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spans", type=int, default=100000)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.05)
+    parser.add_argument("--jsonl", help="追踪记录的JSON行文件，默认写到临时文件")
+    args = parser.parse_args()
+
+    print(f"span开销（仅直方图）: {span_overhead(Tracer(), args.spans):.2f} us/句")
+    with tempfile.TemporaryDirectory() as directory:
+        tracer = Tracer(os.path.join(directory, "spans.jsonl"))
+        print(f"span开销（含JSON行）: {span_overhead(tracer, args.spans):.2f} us/句")
+        tracer.close()
+
+    path = args.jsonl or os.path.join(tempfile.gettempdir(), "tts_trace.jsonl")
+    if os.path.exists(path):
+        os.remove(path)
+    tracer = Tracer(path)
+    off = asyncio.run(pipeline(None, args))
+    on = asyncio.run(pipeline(tracer, args))
+    tracer.close()
+    print(f"整条管线耗时: 关闭追踪 {off:.3f}s, 开启追踪 {on:.3f}s")
+
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    print(f"\n{path} 共{len(lines)}行，第一行:\n{lines[0].strip()}\n")
+    print(tracer.render())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
-from typing import Dict, Generator, Optional, Any, Tuple
+from typing import Dict, Generator, AsyncGenerator, Optional, Any, Tuple, Callable
+import asyncio
+import weakref
+import httpx
 import openai
 from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCall
 from log import log
@@ -7,15 +10,47 @@ import time
 
 class OpenAILLM:
     """OpenAI LLM客户端封装类"""
-    def __init__(self):
+    def __init__(self, token_buffer: int = 64, max_connections: int = 10):
         """
         初始化OpenAI LLM客户端
+
+        Args:
+            token_buffer: 异步接口中已接收但未被消费的token数上限
+            max_connections: 异步客户端连接池上限
         """
 
         self.model_name = "deepseek-chat"
         self.api_key = "sk-123"
         self.base_url = "https://api.deepseek.com"
         self.client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.token_buffer = token_buffer
+        self.max_connections = max_connections
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        """当前事件循环对应的异步客户端，同一事件循环上的请求共享连接池"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    ),
+                ),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """关闭当前事件循环的异步客户端"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
 
     def response(self, dialogue: list) -> Generator[str, None, None]:
         """
@@ -54,6 +89,72 @@ class OpenAILLM:
         except Exception as e:
             log.error(f"Function call response error: {str(e)}")
             yield f"Error: {str(e)}", None
+    async def aresponse(self, dialogue: list) -> AsyncGenerator[str, None]:
+        """
+        异步生成对话响应，网络读取不阻塞事件循环
+        """
+        try:
+            async for content in self._abuffered(
+                lambda chunk: chunk.choices[0].delta.content or None,
+                messages=dialogue,
+            ):
+                yield content
+        except Exception as e:
+            log.error(f"Response generation error: {str(e)}")
+            yield f"Error: {str(e)}"
+
+    async def aresponse_call(
+        self, dialogue: list, functions_call: list
+    ) -> AsyncGenerator[Tuple[Optional[str], Optional[ChoiceDeltaToolCall]], None]:
+        """
+        异步生成带函数调用的对话响应
+        """
+        try:
+            async for item in self._abuffered(
+                lambda chunk: (chunk.choices[0].delta.content, chunk.choices[0].delta.tool_calls),
+                messages=dialogue,
+                tools=functions_call,
+            ):
+                yield item
+        except Exception as e:
+            log.error(f"Function call response error: {str(e)}")
+            yield f"Error: {str(e)}", None
+
+    async def _abuffered(self, extract: Callable[[Any], Any], **kwargs) -> AsyncGenerator[Any, None]:
+        """
+        后台任务读取流式响应并放入有界队列，消费者过慢时读取暂停
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.token_buffer)
+        end = object()
+
+        async def reader():
+            try:
+                responses = await self.async_client.chat.completions.create(
+                    model=self.model_name,
+                    stream=True,
+                    **kwargs
+                )
+                async for chunk in responses:
+                    item = extract(chunk)
+                    if item is not None:
+                        await queue.put(item)
+                await queue.put(end)
+            except Exception as e:
+                await queue.put(e)
+
+        task = asyncio.create_task(reader())
+        try:
+            while True:
+                item = await queue.get()
+                if item is end:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
     def fake_response(self, dialogue: list) -> Generator[str, None, None]:
         """
         模拟对话响应生成器
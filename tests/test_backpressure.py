@@ -0,0 +1,124 @@
+"""Budget与BoundedQueue的额度限制，以及派发阶段的积压上限"""
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.fakes import FakeEngine, FakeLLM, NullPlayer
+from tts_module.backpressure import BackpressureConfig, BoundedQueue, Budget
+from tts_module.tts import TTS
+
+
+async def blocked(awaitable) -> asyncio.Task:
+    """启动等待并确认它确实挂起"""
+    task = asyncio.ensure_future(awaitable)
+    await asyncio.sleep(0.02)
+    assert not task.done()
+    return task
+
+
+def test_acquire_waits_for_release():
+    async def main():
+        budget = Budget(max_items=2)
+        await budget.acquire()
+        await budget.acquire()
+        assert not budget.has_space()
+        waiting = await blocked(budget.acquire())
+        budget.release()
+        await asyncio.wait_for(waiting, 1.0)
+        assert budget.items == 2
+        return budget.stats.snapshot()
+
+    stats = asyncio.run(main())
+    assert stats["peak_items"] == 2
+    assert stats["blocked"] == 1
+
+
+def test_first_item_always_fits():
+    async def main():
+        budget = Budget(max_bytes=100)
+        await asyncio.wait_for(budget.acquire(500), 1.0)  # 单个大块超出上限也放行，避免死锁
+        assert budget.bytes == 500
+        waiting = await blocked(budget.acquire(10))
+        budget.release(500)
+        await asyncio.wait_for(waiting, 1.0)
+        assert (budget.items, budget.bytes) == (1, 10)
+        assert budget.has_space(90) and not budget.has_space(91)
+
+    asyncio.run(main())
+
+
+def test_clear_wakes_all_waiters():
+    async def main():
+        budget = Budget(max_items=1)
+        budget.take()
+        waiters = [await blocked(budget.wait()) for _ in range(3)]
+        budget.clear()
+        await asyncio.wait_for(asyncio.gather(*waiters), 1.0)
+        assert budget.items == 0
+
+    asyncio.run(main())
+
+
+def test_release_wakes_waiter_on_another_loop():
+    budget = Budget(max_items=1)
+    budget.take()
+    started = threading.Event()
+    woken = threading.Event()
+
+    def waiter():
+        async def main():
+            started.set()
+            await budget.wait()
+            woken.set()
+
+        asyncio.run(main())
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    started.wait(1.0)
+    assert not woken.wait(0.05)
+    budget.release()
+    assert woken.wait(1.0)
+    thread.join(1.0)
+
+
+def test_bounded_queue_limits_and_stats():
+    async def main():
+        chunks = BoundedQueue(max_items=0, max_bytes=10)
+        chunks.put(b"x" * 8)
+        assert chunks.has_space(2) and not chunks.has_space(3)
+        chunks.put(b"y" * 8)  # put从不阻塞，可以超出额度
+        waiting = await blocked(chunks.wait_space(3))
+        assert chunks.get() == b"x" * 8
+        await asyncio.sleep(0.02)
+        assert not waiting.done()  # 还剩8字节，放不下3字节
+        assert chunks.clear() == 1
+        await asyncio.wait_for(waiting, 1.0)
+        assert chunks.empty()
+        return chunks.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["items"], stats["bytes"]) == (0, 0)
+    assert (stats["peak_items"], stats["peak_bytes"]) == (2, 16)
+    assert stats["blocked"] == 1
+
+
+@pytest.mark.parametrize("scheduler", ["asyncio", "thread"])
+def test_pending_sentences_bound_dispatch(scheduler):
+    async def main():
+        engine = FakeEngine(chunks=2, delay=0.02)
+        tts = TTS(max_workers=4, engine=engine, player=NullPlayer(), scheduler=scheduler,
+                  backpressure=BackpressureConfig(pending_sentences=2))
+        await tts.start()
+        text = "".join(f"第{index}句测试文本。" for index in range(8))
+        await tts.process_stream(FakeLLM(text, tokens_per_second=500.0, token_chars=4,
+                                         first_token_latency=0.0).aresponse([]))
+        await tts.stop()
+        return engine, tts.backpressure_stats()["dispatch"]
+
+    engine, dispatch = asyncio.run(main())
+    assert engine.requests == 8
+    assert dispatch["peak_items"] == 2  # 最多同时积压2句，即使max_workers为4
+    assert dispatch["blocked"] > 0
+    assert dispatch["items"] == 0
@@ -0,0 +1,108 @@
+"""合成缓存的缓存键与写入条件"""
+import asyncio
+
+from tts_module.audio_chunk import AudioChunk
+from tts_module.engine.base_engine import TTSEngine
+from tts_module.engine.cache_engine import CacheConfig, CachedEngine
+from tts_module.engine.hedged_engine import HedgedEngine
+from tts_module.engine.openai_engine import OpenAIConfig, OpenAIEngine
+
+
+class VoiceEngine(TTSEngine):
+    """按音色产出固定内容的引擎"""
+    def __init__(self, voice: str = "a", declare: bool = True):
+        self.voice = voice
+        self.declare = declare
+        self.requests = 0
+
+    def cache_params(self):
+        return {"engine": "voice", "voice": self.voice} if self.declare else None
+
+    async def synthesize(self, text):
+        self.requests += 1
+        yield AudioChunk(self.voice.encode() * 4, "wav", 24000, 1)
+
+
+async def collect(engine, text):
+    return b"".join([bytes(chunk) async for chunk in engine.synthesize(text)])
+
+
+def test_key_ignores_transport_settings():
+    base = CachedEngine(OpenAIEngine(OpenAIConfig()))
+    tuned = CachedEngine(OpenAIEngine(OpenAIConfig(max_connections=2, keepalive_expiry=5.0, timeout=10.0,
+                                                   api_key="sk-other")))
+    other_voice = CachedEngine(OpenAIEngine(OpenAIConfig(voice="alloy")))
+    assert base.cache_key("你好。") == tuned.cache_key("你好。")
+    assert base.cache_key("你好。") != other_voice.cache_key("你好。")
+
+
+def test_wrappers_delegate_voice_identity(tmp_path):
+    config = CacheConfig(disk_dir=str(tmp_path))
+    first = CachedEngine(HedgedEngine([VoiceEngine("a")]), config)
+    second = CachedEngine(HedgedEngine([VoiceEngine("b")]), config)
+    assert first.cache_key("你好。") != second.cache_key("你好。")
+
+    async def main():
+        assert await collect(first, "你好。") == b"aaaa"
+        assert await collect(second, "你好。") == b"bbbb"
+    asyncio.run(main())
+
+
+def test_undeclared_engine_is_not_cached():
+    inner = VoiceEngine(declare=False)
+    cached = CachedEngine(inner)
+
+    async def main():
+        for _ in range(2):
+            await collect(cached, "你好。")
+    asyncio.run(main())
+    assert inner.requests == 2
+    assert cached.stats()["bypassed"] == 2
+
+
+class DroppingEngine(VoiceEngine):
+    """产出两块后连接断开"""
+    async def synthesize(self, text):
+        self.requests += 1
+        yield AudioChunk(b"ab", "wav", 24000, 1)
+        yield AudioChunk(b"cd", "wav", 24000, 1)
+        raise ConnectionError("连接中途断开")
+
+
+def test_stream_dropped_mid_sentence_is_not_cached(tmp_path):
+    inner = DroppingEngine()
+    cached = CachedEngine(inner, CacheConfig(disk_dir=str(tmp_path)))
+
+    async def main():
+        for _ in range(2):
+            received = []
+            try:
+                async for chunk in cached.synthesize("你好。"):
+                    received.append(bytes(chunk))
+            except ConnectionError:
+                pass
+            else:
+                raise AssertionError("合成失败应当传给调用方")
+            assert received == [b"ab", b"cd"]
+    asyncio.run(main())
+    assert inner.requests == 2
+    assert cached.stats()["memory_entries"] == 0
+    assert not list(tmp_path.iterdir())
+
+
+def test_disk_hit_keeps_audio_format(tmp_path):
+    config = CacheConfig(disk_dir=str(tmp_path))
+    inner = VoiceEngine("a")
+    asyncio.run(collect(CachedEngine(inner, config), "你好。"))
+
+    # 新实例的内存缓存为空，只能从磁盘读出
+    cached = CachedEngine(inner, config)
+
+    async def main():
+        return [chunk async for chunk in cached.synthesize("你好。")]
+
+    chunks = asyncio.run(main())
+    assert inner.requests == 1
+    assert cached.stats()["disk_hits"] == 1
+    assert b"".join(bytes(chunk) for chunk in chunks) == b"aaaa"
+    assert {(chunk.codec, chunk.sample_rate, chunk.channels) for chunk in chunks} == {("wav", 24000, 1)}
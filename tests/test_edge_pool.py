@@ -0,0 +1,60 @@
+"""EdgeConnectionPool：用本地替身服务验证连接复用、失效重试和中途取消时丢弃连接"""
+import asyncio
+
+from benchmarks.edge_standin import EdgeStandIn
+from tts_module.engine.edge_engine import EdgeEngine
+from tts_module.engine.edge_pool import EdgePoolConfig
+
+
+async def collect(engine: EdgeEngine, text: str) -> int:
+    return sum([len(data) async for data in engine.synthesize(text)])
+
+
+async def with_standin(test, **kwargs):
+    standin = EdgeStandIn(handshake_delay=0.0, first_chunk_latency=0.0, chunk_delay=0.0, **kwargs)
+    await standin.start()
+    engine = EdgeEngine(pool=EdgePoolConfig(url=standin.url, size=2))
+    try:
+        await test(standin, engine)
+    finally:
+        await engine.aclose()
+        await standin.stop()
+
+
+def test_connection_is_reused_across_sentences():
+    async def test(standin, engine):
+        for index in range(3):
+            assert await collect(engine, f"第{index}句。") == 5 * 1440
+        stats = engine.pool.stats()
+        assert standin.connections == 1
+        assert standin.turns == 3
+        assert (stats["connects"], stats["reuses"], stats["idle"]) == (1, 2, 1)
+
+    asyncio.run(with_standin(test))
+
+
+def test_retries_once_when_server_closed_idle_connection():
+    async def test(standin, engine):
+        assert await collect(engine, "第一句。") == 5 * 1440
+        await asyncio.sleep(0.3)  # 服务端关闭空闲连接，客户端此时还不知道
+        assert await collect(engine, "第二句。") == 5 * 1440
+        stats = engine.pool.stats()
+        assert stats["retries"] == 1
+        assert standin.connections == 2
+        assert standin.turns == 2
+
+    asyncio.run(with_standin(test, idle_close=0.1))
+
+
+def test_cancelled_sentence_discards_connection():
+    async def test(standin, engine):
+        stream = engine.synthesize("被打断的句子。")
+        async for _ in stream:
+            break  # 连接上还有未读完的音频
+        await stream.aclose()
+        stats = engine.pool.stats()
+        assert (stats["discarded"], stats["idle"]) == (1, 0)
+        assert await collect(engine, "下一句。") == 5 * 1440
+        assert standin.connections == 2
+
+    asyncio.run(with_standin(test))
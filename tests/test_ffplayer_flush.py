@@ -0,0 +1,241 @@
+"""FFPlayer打断：丢弃排队和已缓冲的音频，停止当前播放；以及向追踪报告实际播放的时间点"""
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+try:
+    from tts_module.player import py_player
+except (ImportError, OSError):  # 缺少PortAudio时无法导入sounddevice
+    pytest.skip("sounddevice不可用", allow_module_level=True)
+
+from tts_module.audio_chunk import AudioChunk
+from tts_module.engine.base_engine import TTSEngine
+from tts_module.engine.tone_engine import wav_header
+from tts_module.tracing import Tracer
+from tts_module.tts import TTS
+
+MARKERS = {"一": 1, "二": 2, "三": 3}
+
+
+class FakeSD:
+    """代替sounddevice：play记录播放的句子，wait模拟播放时长，stop立即结束当前播放"""
+    def __init__(self, seconds: float = 0.3):
+        self.seconds = seconds
+        self.played = []
+        self.stops = 0
+        self._stopped = threading.Event()
+
+    def play(self, data, samplerate):
+        self._stopped.clear()
+        self.played.append(int(data[0, 0]))
+
+    def wait(self):
+        self._stopped.wait(self.seconds)
+
+    def stop(self):
+        self.stops += 1
+        self._stopped.set()
+
+    def query_devices(self, device=None, kind=None):
+        return {"default_samplerate": 8000, "max_output_channels": 1}
+
+    class OutputStream:
+        def __init__(self, **kwargs):
+            pass
+
+        def start(self):
+            pass
+
+        def stop(self):
+            pass
+
+        def close(self):
+            pass
+
+
+class MarkerEngine(TTSEngine):
+    """每句产出两块，内容为句中数字对应的标记字节"""
+    async def synthesize(self, text):
+        marker = next(value for key, value in MARKERS.items() if key in text)
+        for _ in range(2):
+            await asyncio.sleep(0.01)
+            yield AudioChunk(bytes([marker]) * 8, "mp3", 24000, 1)
+
+
+def fake_read(file, always_2d=True, dtype=None):
+    marker = file.getvalue()[0]
+    return np.full((10, 1), marker, dtype=np.float32), 24000
+
+
+def wait_until(condition, timeout: float = 3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def fake_sd(monkeypatch):
+    sd = FakeSD()
+    monkeypatch.setattr(py_player, "sd", sd)
+    monkeypatch.setattr(py_player.sf, "read", fake_read)
+    return sd
+
+
+def test_preempt_drops_queued_sentence_and_stops_playback(fake_sd):
+    fake_sd.seconds = 2.0  # 第一句播放很长，打断时第二句已在播放器队列中
+    player = py_player.FFPlayer()
+
+    async def text(value):
+        yield value
+
+    async def main():
+        tts = TTS(engine=MarkerEngine(), player=player, scheduler="asyncio")
+        await tts.start()
+        await tts.process_stream(text("第一句测试文本。第二句测试文本。"))
+        await asyncio.to_thread(wait_until, lambda: fake_sd.played and not player.chunk_queue.empty())
+        fake_sd.seconds = 0.1
+        begin = time.monotonic()
+        await tts.process_stream(text("第三句测试文本。"))
+        await tts.stop()
+        return time.monotonic() - begin
+
+    elapsed = asyncio.run(main())
+    assert fake_sd.played == [1, 3]
+    assert fake_sd.stops >= 1
+    assert elapsed < 1.5  # 第一句没有播完
+
+
+class StallingEngine(MarkerEngine):
+    """第一句产出一块后停顿，模拟打断发生在句子中途"""
+    def __init__(self):
+        self.sent = 0
+
+    async def synthesize(self, text):
+        async for chunk in super().synthesize(text):
+            yield chunk
+            self.sent += 1
+            if "一" in text:
+                await asyncio.sleep(10)
+
+
+@pytest.mark.parametrize("scheduler", ["asyncio", "thread"])
+def test_preempt_midway_drops_partial_sentence(fake_sd, scheduler):
+    fake_sd.seconds = 0.1
+    player = py_player.FFPlayer()
+    engine = StallingEngine()
+
+    async def text(value):
+        yield value
+
+    async def main():
+        tts = TTS(engine=engine, player=player, scheduler=scheduler)
+        await tts.start()
+        await tts.process_stream(text("第一句测试文本。"))
+        # 第一句的首块已被播放线程取走，结束标记尚未到达
+        await asyncio.to_thread(wait_until, lambda: engine.sent >= 1 and player.chunk_queue.empty())
+        await tts.process_stream(text("第三句测试文本。"))
+        await asyncio.to_thread(wait_until, lambda: 3 in fake_sd.played)
+        await asyncio.sleep(0.2)
+        await tts.stop()
+
+    asyncio.run(main())
+    assert fake_sd.played == [3]
+
+
+def test_finished_reply_does_not_flush_idle_player(fake_sd):
+    fake_sd.seconds = 0.1
+    player = py_player.FFPlayer()
+    flushes = []
+    flush = player.flush
+    player.flush = lambda: flushes.append(1) or flush()
+
+    async def text(value):
+        yield value
+
+    async def main():
+        tts = TTS(engine=MarkerEngine(), player=player, scheduler="asyncio")
+        await tts.start()
+        await tts.process_stream(text("第一句测试文本。"))
+        await asyncio.to_thread(wait_until, lambda: fake_sd.played and not player.playing())
+        await tts.process_stream(text("第三句测试文本。"))
+        await asyncio.to_thread(wait_until, lambda: len(fake_sd.played) == 2)
+        stops = fake_sd.stops
+        await tts.stop()
+        return stops
+
+    stops = asyncio.run(main())
+    assert fake_sd.played == [1, 3]
+    assert flushes == []
+    assert stops == 0
+
+
+def test_streaming_flush_clears_ring_and_resets_decoder(fake_sd):
+    player = py_player.FFPlayer(streaming=True, buffer_seconds=1.0)
+    player.start()
+    try:
+        frames = np.full(400, 1000, dtype="<i2").tobytes()
+        player.add_chunk(AudioChunk(wav_header(8000) + frames, "wav", 8000, 1))
+        wait_until(lambda: player.ring.fill == 400)
+
+        player.flush()
+        assert player.ring.fill == 0
+        assert player.chunk_queue.empty()
+
+        # 新句子带自己的WAV头，解码器已重置，头部不会被当作采样
+        player.add_chunk(AudioChunk(wav_header(8000) + frames[:200], "wav", 8000, 1))
+        player.add_chunk(AudioChunk.end_of())
+        wait_until(lambda: player.stats()["frames_written"] == 500)
+        assert player.ring.fill == 100
+    finally:
+        player.flush()
+        player.stop()
+
+
+def test_whole_sentence_mode_reports_playback(fake_sd, tmp_path):
+    fake_sd.seconds = 0.1
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer(str(path))
+    player = py_player.FFPlayer()
+
+    async def text(value):
+        yield value
+
+    async def main():
+        tts = TTS(engine=MarkerEngine(), player=player, scheduler="asyncio", tracer=tracer)
+        await tts.start()
+        await tts.process_stream(text("第一句测试文本。第二句测试文本。"))
+        await asyncio.to_thread(wait_until, lambda: tracer.statuses.get("played") == 2)
+        await tts.stop()
+
+    asyncio.run(main())
+    tracer.close()
+    spans = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [span["status"] for span in spans] == ["played", "played"]
+    for span in spans:
+        assert span["handoff_start"] <= span["playback_start"] < span["playback_end"]
+        assert span["playback_end"] - span["playback_start"] >= 0.09  # 包含sd.wait的播放时长
+    assert "text_to_audio" in tracer.render()
+
+
+def test_streaming_mode_reports_playback_from_ring_reads(fake_sd):
+    player = py_player.FFPlayer(streaming=True, buffer_seconds=1.0)
+    reports = []
+    player.set_playback_callback(lambda sequence, point, at: reports.append((sequence, point)))
+    player.start()
+    try:
+        frames = np.full(400, 1000, dtype="<i2").tobytes()
+        player.add_chunk(AudioChunk(wav_header(8000) + frames, "wav", 8000, 1, sequence=7))
+        player.add_chunk(AudioChunk.end_of(7))
+        wait_until(lambda: player.ring.fill == 400)
+        out = np.zeros((300, 1), dtype=np.float32)
+        player._callback(out, 300, None, None)  # 读到首帧
+        wait_until(lambda: reports == [(7, "playback_start")])
+        player._callback(out, 300, None, None)  # 读到末帧
+        wait_until(lambda: reports == [(7, "playback_start"), (7, "playback_end")])
+    finally:
+        player.stop()
@@ -0,0 +1,120 @@
+"""HedgedEngine：对冲、故障转移、失败上报与缓冲额度"""
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeEngine
+from tts_module.audio_chunk import AudioChunk
+from tts_module.engine.base_engine import TTSEngine
+from tts_module.engine.cache_engine import CachedEngine
+from tts_module.engine.hedged_engine import HedgeConfig, HedgedEngine
+
+
+async def collect(engine, text="测试"):
+    return [bytes(chunk) async for chunk in engine.synthesize(text)]
+
+
+class TruncatingEngine(TTSEngine):
+    """产出两块后连接断开"""
+    def __init__(self):
+        self.requests = 0
+
+    def cache_params(self):
+        return {"engine": "truncating"}
+
+    async def synthesize(self, text):
+        self.requests += 1
+        yield AudioChunk(b"ab", "wav", 24000, 1)
+        yield AudioChunk(b"cd", "wav", 24000, 1)
+        raise ConnectionError("连接中途断开")
+
+
+class DeclaredFakeEngine(FakeEngine):
+    def cache_params(self):
+        return {"engine": "fake"}
+
+
+def test_winner_failing_mid_stream_raises_and_is_not_cached():
+    backend = TruncatingEngine()
+    engine = HedgedEngine([backend])
+    cached = CachedEngine(engine)
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await collect(cached)
+
+    asyncio.run(main())
+    assert backend.requests == 2
+    assert cached.stats()["memory_entries"] == 0
+    assert engine.stats()[0]["failures"] == 2
+
+
+def test_all_backends_failing_raises():
+    backends = [DeclaredFakeEngine(failure_rate=1.0), DeclaredFakeEngine(failure_rate=1.0)]
+    cached = CachedEngine(HedgedEngine(backends, HedgeConfig(max_attempts=2)))
+    with pytest.raises(RuntimeError):
+        asyncio.run(collect(cached))
+    assert cached.stats()["memory_entries"] == 0
+
+
+def test_no_first_chunk_within_timeout_raises():
+    engine = HedgedEngine([FakeEngine(first_chunk_latency=5.0)],
+                          HedgeConfig(first_chunk_timeout=0.1, max_attempts=1))
+    begin = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(collect(engine))
+    assert time.monotonic() - begin < 1.0
+
+
+def test_failover_to_next_backend():
+    primary, secondary = FakeEngine(failure_rate=1.0), FakeEngine(chunks=3)
+    engine = HedgedEngine([primary, secondary])
+    assert len(asyncio.run(collect(engine))) == 3
+    stats = engine.stats()
+    assert stats[0]["failures"] == 1
+    assert stats[1]["wins"] == 1
+
+
+def test_hedge_cuts_tail_latency():
+    slow, fast = FakeEngine(first_chunk_latency=2.0), FakeEngine(first_chunk_latency=0.01)
+    engine = HedgedEngine([slow, fast], HedgeConfig(hedge_after=0.05))
+    begin = time.monotonic()
+    asyncio.run(collect(engine))
+    assert time.monotonic() - begin < 1.0
+    stats = engine.stats()
+    assert stats[1]["hedges"] == 1 and stats[1]["wins"] == 1
+    assert stats[0]["cancelled"] == 1
+    assert slow.active == 0  # 落选请求已取消
+
+
+class BurstEngine(TTSEngine):
+    """不等待地产出大量音频块，记录已产出的块数"""
+    def __init__(self, chunks: int = 200):
+        self.chunks = chunks
+        self.produced = 0
+
+    async def synthesize(self, text):
+        for _ in range(self.chunks):
+            self.produced += 1
+            yield AudioChunk(b"\0" * 100, "pcm", 8000, 1)
+            await asyncio.sleep(0)
+
+
+def test_slow_reader_bounds_winner_buffer():
+    backend = BurstEngine()
+    engine = HedgedEngine([backend], HedgeConfig(buffer_items=8))
+
+    async def main():
+        received = 0
+        ahead = 0
+        async for _ in engine.synthesize("测试"):
+            received += 1
+            await asyncio.sleep(0.001)  # 读取慢于后端产出
+            ahead = max(ahead, backend.produced - received)
+        return received, ahead
+
+    received, ahead = asyncio.run(main())
+    assert received == backend.chunks
+    assert ahead <= 8 + 2  # 队列额度加上首块和正在放入的块
@@ -0,0 +1,116 @@
+"""MPVPlayer：用模拟mpv的脚本代替真实mpv"""
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+from benchmarks.mpv_bargein import STANDIN
+from tts_module.audio_chunk import AudioChunk
+from tts_module.player.mpv_player import MPVPlayer
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="模拟脚本依赖unix socket")
+
+
+@pytest.fixture
+def mpv_path(tmp_path, monkeypatch):
+    path = tmp_path / "mpv"
+    path.write_text(STANDIN.format(python=sys.executable))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    log_path = tmp_path / "silence.log"
+    log_path.touch()
+    monkeypatch.setenv("MPV_STANDIN_LOG", str(log_path))
+    return str(path)
+
+
+def wait_until(condition, timeout: float = 3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def test_playback_reports_follow_drain_estimate(mpv_path):
+    player = MPVPlayer(ipc=False, warm_standby=False, mpv_path=mpv_path)
+    reports = []
+    player.set_playback_callback(lambda sequence, point, at: reports.append((sequence, point, at)))
+    player.start()
+    try:
+        for sequence in (1, 2):
+            # 8kHz单声道16位PCM每秒16000字节，每句0.1秒
+            player.add_chunk(AudioChunk(b"\0" * 1600, "pcm", 8000, 1, sequence=sequence))
+            player.add_chunk(AudioChunk.end_of(sequence))
+        wait_until(lambda: len(reports) == 4)
+    finally:
+        player.stop()
+    assert [(sequence, point) for sequence, point, _ in reports] == [
+        (1, "playback_start"), (1, "playback_end"), (2, "playback_start"), (2, "playback_end")]
+    at = {(sequence, point): value for sequence, point, value in reports}
+    assert at[(1, "playback_end")] - at[(1, "playback_start")] == pytest.approx(0.1, abs=0.02)
+    assert at[(2, "playback_start")] == pytest.approx(at[(1, "playback_end")], abs=0.02)
+
+
+def silence_reason(pid: int) -> str:
+    """等待模拟进程静音，返回原因：stop(IPC)、term(被终止)或drained(音频播完)"""
+    reasons = {}
+
+    def silenced():
+        with open(os.environ["MPV_STANDIN_LOG"]) as f:
+            for line in f:
+                line_pid, _at, reason = line.split()
+                reasons[int(line_pid)] = reason
+        return pid in reasons
+
+    wait_until(silenced)
+    return reasons[pid]
+
+
+def queue_long_reply(player: MPVPlayer, sequence: int):
+    # 模拟脚本每秒播放32000字节，排队约2秒的音频
+    for _ in range(16):
+        player.add_chunk(AudioChunk(b"\0" * 4096, sequence=sequence))
+    player.add_chunk(AudioChunk.end_of(sequence))
+
+
+def test_ipc_stop_silences_immediately(mpv_path):
+    player = MPVPlayer(ipc=True, warm_standby=False, mpv_path=mpv_path)
+    player.start()
+    try:
+        queue_long_reply(player, 1)
+        time.sleep(0.2)
+        old = player._current.process.pid
+        begin = time.monotonic()
+        player.flush()
+        assert player.wait_switched(3.0)
+        assert silence_reason(old) == "stop"
+        assert time.monotonic() - begin < 1.0  # 不等排队的2秒音频播完
+        assert player._current.process.pid != old
+    finally:
+        player.stop()
+
+
+def test_flush_switches_to_warm_standby(mpv_path):
+    player = MPVPlayer(ipc=True, warm_standby=True, mpv_path=mpv_path)
+    reports = []
+    player.set_playback_callback(lambda sequence, point, at: reports.append((sequence, point)))
+    player.start()
+    try:
+        player._standby_thread.join()
+        old = player._current.process.pid
+        standby = player._standby.process.pid
+        queue_long_reply(player, 1)
+        time.sleep(0.2)
+        player.flush()
+        assert player.wait_switched(3.0)
+        assert player._current.process.pid == standby
+        assert silence_reason(old) == "stop"
+        # 切换后补上新的备用进程，新回复写入切换后的进程
+        wait_until(lambda: player._standby is not None)
+        assert player._standby.process.pid not in (old, standby)
+        player.add_chunk(AudioChunk(b"\0" * 1600, "pcm", 8000, 1, sequence=2))
+        player.add_chunk(AudioChunk.end_of(2))
+        wait_until(lambda: (2, "playback_end") in reports)
+        assert (1, "playback_end") not in reports
+    finally:
+        player.stop()
@@ -0,0 +1,43 @@
+"""数字读法"""
+import pytest
+
+from tts_module.normalize import TextNormalizer, expand_token, read_number
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("100,000,000", "一亿"),
+    ("1,234,567,890", "十二亿三千四百五十六万七千八百九十"),
+    ("1,250,000", "一百二十五万"),
+    ("3,999.5", "三千九百九十九点五"),
+    ("10086", "一万零八十六"),
+    ("13800138000", "一三八零零一三八零零零"),  # 不带千分位的长数字串按编号逐位读
+    ("007", "零零七"),
+])
+def test_read_number(text, expected):
+    assert read_number(text) == expected
+
+
+def test_grouped_amounts_in_text():
+    normalizer = TextNormalizer()
+    text = normalizer.feed("预算100,000,000元，实际1,234,567,890元，") + normalizer.flush()
+    assert text == "预算一亿元，实际十二亿三千四百五十六万七千八百九十元，"
+    assert expand_token("¥100,000,000") == "一亿元"
+
+
+def test_url_stops_at_chinese_text():
+    normalizer = TextNormalizer()
+    text = normalizer.feed("访问https://www.example.com/path?q=1了解更多。") + normalizer.flush()
+    assert text == "访问example.com了解更多。"
+
+
+@pytest.mark.parametrize("source", [
+    "访问https://www.example.com/path?q=1了解更多。",
+    "详见www.example.org/a_b（第2页），价格¥1,299.5元，时间2024-05-01 09:30。",
+    "打开(https://a.example.com/x)或者[文档](https://b.example.com)，下载速度3.5MB/s。",
+])
+def test_char_by_char_feed_matches_single_feed(source):
+    whole = TextNormalizer()
+    expected = whole.feed(source) + whole.flush()
+    streamed = TextNormalizer()
+    text = "".join(streamed.feed(char) for char in source) + streamed.flush()
+    assert text == expected
@@ -0,0 +1,57 @@
+"""OpenAIEngine：每个事件循环一个连接池客户端，thread调度下随句子的事件循环关闭"""
+import asyncio
+import gc
+import time
+import warnings
+
+from benchmarks.fakes import NullPlayer
+from benchmarks.openai_stream import slow_speech
+from benchmarks.standin import StandInServer
+from tts_module.engine.openai_engine import OpenAIConfig, OpenAIEngine
+from tts_module.tts import TTS
+
+
+async def sentences(count: int):
+    for index in range(count):
+        yield f"第{index}句测试文本。"
+
+
+def run(scheduler: str):
+    server = StandInServer(slow_speech(2, 0.01))
+    server.start_in_thread()
+    engine = OpenAIEngine(OpenAIConfig(base_url=server.base_url, api_key="sk-test"))
+
+    async def main():
+        tts = TTS(max_workers=2, engine=engine, player=NullPlayer(), scheduler=scheduler)
+        await tts.start()
+        await tts.process_stream(sentences(4))
+        await tts.stop()
+        clients = len(engine._clients)
+        await engine.aclose()
+        return clients
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ResourceWarning)
+        clients = asyncio.run(main())
+        gc.collect()
+    deadline = time.monotonic() + 2.0
+    while server.open and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return server, clients, [warning for warning in caught if issubclass(warning.category, ResourceWarning)]
+
+
+def test_thread_scheduler_releases_per_loop_clients():
+    server, clients, resource_warnings = run("thread")
+    assert server.requests == 4
+    assert clients == 0  # 每句的事件循环关闭前已释放客户端
+    assert server.open == 0
+    assert resource_warnings == []
+
+
+def test_asyncio_scheduler_reuses_one_client():
+    server, clients, resource_warnings = run("asyncio")
+    assert server.requests == 4
+    assert clients == 1
+    assert server.connections <= 2  # 最多max_workers个并发连接，之后复用
+    assert server.open == 0
+    assert resource_warnings == []
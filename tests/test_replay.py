@@ -0,0 +1,32 @@
+"""在虚拟时钟上回放录制的慢轨迹，作为预合成窗口的性能回归测试
+
+轨迹由benchmarks.replay的BurstyLLM（token成批到达）和带长尾首包延迟的FakeEngine录制，
+第一句和第四句的首包都超过4秒。
+"""
+import os
+
+import pytest
+
+from tts_module.replay import Trace, replay
+
+TRACE = os.path.join(os.path.dirname(__file__), "data", "bursty_slow_first_chunk.jsonl")
+
+
+@pytest.fixture(scope="module")
+def trace():
+    return Trace.load(TRACE)
+
+
+@pytest.mark.parametrize("lookahead, gap_total_s", [
+    (1, 1.9782),  # 第四句轮到时才开始合成，首包长尾全部变成句间空白
+    (2, 1.1627),
+    (4, 0.0),  # 第四句与第三句同时合成，空白被前一句的播放掩盖
+])
+def test_replay_is_deterministic(trace, lookahead, gap_total_s):
+    report = replay(trace, max_workers=3, lookahead=lookahead)
+    assert report["ttfa_s"] == pytest.approx(4.6616, abs=1e-3)
+    assert report["gap_total_s"] == pytest.approx(gap_total_s, abs=1e-3)
+    assert report["statuses"] == {"handed_off": 5}
+    assert report["engine_misses"] == 0
+    assert report["real_s"] < report["virtual_s"] / 10  # 十几秒的轨迹不按真实时间等待
+    assert replay(trace, max_workers=3, lookahead=lookahead)["gap_total_s"] == report["gap_total_s"]
@@ -0,0 +1,27 @@
+"""音频输出端：子类必须实现_write，写出计数可在其他线程读取"""
+import io
+
+import pytest
+
+from tts_module.audio_chunk import AudioChunk
+from tts_module.player.sinks import AudioSink, FileSink
+
+
+def test_sink_without_write_cannot_be_created():
+    class Incomplete(AudioSink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_file_sink_counts_written_bytes():
+    buffer = io.BytesIO()
+    sink = FileSink(buffer)
+    sink.start()
+    for _ in range(3):
+        sink.add_chunk(AudioChunk(b"\1" * 100, "pcm", 8000, 1))
+    sink.add_chunk(AudioChunk.end_of())
+    sink.stop()
+    assert buffer.getvalue() == b"\1" * 300
+    assert sink.stats() == {"written": 300, "failed": False, "errors": 0}
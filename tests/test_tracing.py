@@ -0,0 +1,54 @@
+"""逐句追踪：播放器报告的播放时间点与span的结束"""
+from tts_module.tracing import PlaybackTracker, Tracer
+
+
+def make_span(tracer, sequence):
+    span = tracer.span("test", sequence, 4)
+    span.mark("handoff_start")
+    span.mark("handoff_end")
+    return span
+
+
+def test_span_waits_for_playback_end():
+    tracer = Tracer()
+    tracker = PlaybackTracker(tracer)
+    span = make_span(tracer, 1)
+    tracker.track(span)
+    tracker.report(1, "playback_start", span.handoff_start + 0.1)
+    tracker.finish(span, "handed_off")
+    assert tracer.statuses == {}
+    tracker.report(1, "playback_end", span.handoff_start + 0.5)
+    assert tracer.statuses == {"played": 1}
+    stages = dict(span.stages())
+    assert abs(stages["player_delay"] - 0.1) < 1e-9
+    assert abs(stages["playback"] - 0.4) < 1e-9
+
+
+def test_playback_reported_before_handoff_finishes():
+    tracer = Tracer()
+    tracker = PlaybackTracker(tracer)
+    span = make_span(tracer, 1)
+    tracker.track(span)
+    tracker.report(1, "playback_start", span.handoff_start)
+    tracker.report(1, "playback_end", span.handoff_end)
+    tracker.finish(span, "handed_off")
+    assert tracer.statuses == {"played": 1}
+
+
+def test_flush_ends_waiting_and_in_flight_spans_as_cancelled():
+    tracer = Tracer()
+    tracker = PlaybackTracker(tracer)
+    waiting, in_flight = make_span(tracer, 1), make_span(tracer, 2)
+    tracker.track(waiting)
+    tracker.track(in_flight)
+    tracker.finish(waiting, "handed_off")
+    tracker.drop("cancelled")
+    assert tracer.statuses == {"cancelled": 1}
+    # 清空播放器时正在送入的句子随后送完，也不会再有播完报告
+    tracker.finish(in_flight, "handed_off")
+    assert tracer.statuses == {"cancelled": 2}
+    later = make_span(tracer, 3)
+    tracker.track(later)
+    tracker.finish(later, "handed_off")
+    tracker.report(3, "playback_end", later.handoff_end)
+    assert tracer.statuses == {"cancelled": 2, "played": 1}
@@ -0,0 +1,112 @@
+"""回复的取消作用域：新回复打断旧回复、skip_remaining和不打断时按序排队"""
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.bargein_stress import SequencePlayer
+from benchmarks.fakes import FakeEngine, FakeLLM
+from tts_module.tts import TTS
+from tts_module.utterance import Utterance
+
+TEXT = "第一句话。第二句话。第三句话。第四句话。"
+
+
+async def wait_until(condition, timeout: float = 3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        await asyncio.sleep(0.005)
+
+
+def make_tts(scheduler: str):
+    engine = FakeEngine(chunks=4, delay=0.02)
+    player = SequencePlayer()
+    return TTS(max_workers=2, engine=engine, player=player, scheduler=scheduler), engine, player
+
+
+def reply(text: str = TEXT):
+    return FakeLLM(text, tokens_per_second=200.0, first_token_latency=0.0).aresponse([])
+
+
+def chunks_after(player: SequencePlayer, at: float, sequences) -> int:
+    return sum(1 for when, sequence, end in player.events if when > at and not end and sequence in sequences)
+
+
+@pytest.mark.parametrize("scheduler", ["asyncio", "thread"])
+def test_new_reply_preempts_previous(scheduler):
+    async def main():
+        tts, engine, player = make_tts(scheduler)
+        await tts.start()
+        first = asyncio.create_task(tts.process_stream(reply()))
+        await wait_until(lambda: player.events)
+        old = tts.utterance
+        second = asyncio.create_task(tts.process_stream(reply("新的回复。")))
+        await asyncio.sleep(0)
+        new = tts.utterance
+        assert new.epoch == old.epoch + 1
+        assert old.cancelled and not new.cancelled
+        await asyncio.gather(first, second)
+        await wait_until(lambda: old.active == 0 and engine.active == 0)
+        await tts.stop()
+        return old, new, player
+
+    old, new, player = asyncio.run(main())
+    assert player.flushes >= 1
+    assert chunks_after(player, old.cancelled_at, set(old.sequences)) == 0  # 打断后不再送入旧回复的音频
+    assert len(old.sequences) < 4  # 打断时旧回复尚未读完
+    new_chunks = [sequence for _, sequence, end in player.events if not end and sequence in new.sequences]
+    assert new_chunks == [new.sequences[0]] * 4
+
+
+@pytest.mark.parametrize("scheduler", ["asyncio", "thread"])
+def test_skip_remaining_stops_current_reply(scheduler):
+    async def main():
+        tts, engine, player = make_tts(scheduler)
+        await tts.start()
+        stream = asyncio.create_task(tts.process_stream(reply()))
+        await wait_until(lambda: player.events)
+        utterance = tts.utterance
+        tts.skip_remaining()
+        await asyncio.wait_for(stream, 3.0)
+        await wait_until(lambda: utterance.active == 0 and engine.active == 0)
+        await tts.stop()
+        return utterance, player
+
+    utterance, player = asyncio.run(main())
+    assert utterance.cancelled
+    assert player.flushes == 1
+    assert chunks_after(player, utterance.cancelled_at, set(utterance.sequences)) == 0
+
+
+def test_without_preempt_replies_play_in_order():
+    async def main():
+        tts, _engine, player = make_tts("asyncio")
+        await tts.start()
+        first = asyncio.create_task(tts.process_stream(reply("甲一。甲二。")))
+        await asyncio.sleep(0)
+        old = tts.utterance
+        second = asyncio.create_task(tts.process_stream(reply("乙一。"), preempt=False))
+        await asyncio.gather(first, second)
+        await tts.stop()
+        return old, tts.utterance, player
+
+    old, new, player = asyncio.run(main())
+    assert not old.cancelled and not new.cancelled
+    assert player.flushes == 0
+    played = [sequence for _, sequence, end in player.events if end]
+    assert played == old.sequences + new.sequences
+
+
+def test_task_added_after_cancel_is_cancelled():
+    async def main():
+        utterance = Utterance(1)
+        assert utterance.cancel() == 0
+        task = asyncio.create_task(asyncio.sleep(10))
+        assert not utterance.add_task(0, task)
+        await asyncio.sleep(0)
+        return utterance, task
+
+    utterance, task = asyncio.run(main())
+    assert task.cancelled()
+    assert utterance.active == 0
@@ -0,0 +1,56 @@
+from typing import Optional, Union
+
+
+class AudioChunk:
+    """在引擎、缓存和播放器之间传递的音频块
+
+    data为memoryview，切片和转发都不复制底层缓冲；codec、sample_rate、channels
+    记录音频格式，未知时为None。end为True的块不含数据，表示一句话结束。
+    """
+    __slots__ = ("data", "codec", "sample_rate", "channels", "end", "sequence")
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview] = b"", codec: Optional[str] = None,
+                 sample_rate: Optional[int] = None, channels: Optional[int] = None,
+                 end: bool = False, sequence: Optional[int] = None):
+        self.data = data if isinstance(data, memoryview) else memoryview(data)
+        self.codec = codec
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.end = end
+        self.sequence = sequence
+
+    @classmethod
+    def end_of(cls, sequence: Optional[int] = None) -> "AudioChunk":
+        """句子结束标记"""
+        return cls(end=True, sequence=sequence)
+
+    def slice(self, start: int, stop: int) -> "AudioChunk":
+        """共享缓冲的子块，格式信息不变"""
+        return AudioChunk(self.data[start:stop], self.codec, self.sample_rate, self.channels,
+                          sequence=self.sequence)
+
+    def __len__(self) -> int:
+        return self.data.nbytes
+
+    def __bytes__(self) -> bytes:
+        return self.data.tobytes()
+
+    def __repr__(self) -> str:
+        if self.end:
+            return f"AudioChunk(end, sequence={self.sequence})"
+        return f"AudioChunk({len(self)} bytes, codec={self.codec}, sample_rate={self.sample_rate}, channels={self.channels})"
+
+
+def is_end(chunk) -> bool:
+    """兼容旧接口：None同样视为句子结束标记"""
+    return chunk is None or (isinstance(chunk, AudioChunk) and chunk.end)
+
+
+def as_chunk(chunk) -> AudioChunk:
+    """把旧引擎产出的bytes包装成AudioChunk，不复制数据"""
+    return chunk if isinstance(chunk, AudioChunk) else AudioChunk(chunk)
+
+
+def payload(chunk) -> Union[bytes, memoryview]:
+    """取出块中的音频数据，兼容直接传入bytes的旧引擎"""
+    return chunk.data if isinstance(chunk, AudioChunk) else chunk
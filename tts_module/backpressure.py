@@ -0,0 +1,199 @@
+"""管线各阶段的条数与字节额度
+
+生产者在放入数据前await额度，额度不足时挂起而不是阻塞事件循环，
+消费者取走数据后归还额度并唤醒等待者。额度为空时总是放行一个，保证不会因单个大块而死锁。
+等待者可以属于不同线程的事件循环，唤醒通过call_soon_threadsafe完成。
+"""
+import asyncio
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+
+class BackpressureConfig(BaseModel):
+    """各阶段的额度，0表示不限"""
+    pending_sentences: int = 16  # 已派发、尚未处理完的句子数
+    sentence_items: int = 64  # 每句合成结果队列的块数
+    sentence_bytes: int = 1024 * 1024  # 每句合成结果队列的字节数
+    player_items: int = 256  # 播放器队列的块数
+    player_bytes: int = 1024 * 1024  # 播放器队列的字节数
+
+
+class StageStats:
+    """一个阶段的队列深度与阻塞统计，同一阶段的多个额度可以共享"""
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+        self.peak_items = 0
+        self.peak_bytes = 0
+        self.blocked = 0  # 生产者等待额度的次数
+        self.blocked_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items: int, size: int):
+        with self._lock:
+            self.items += items
+            self.bytes += size
+            self.peak_items = max(self.peak_items, self.items)
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+
+    def block(self, seconds: float):
+        with self._lock:
+            self.blocked += 1
+            self.blocked_seconds += seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {"items": self.items, "bytes": self.bytes, "peak_items": self.peak_items,
+                    "peak_bytes": self.peak_bytes, "blocked": self.blocked,
+                    "blocked_seconds": round(self.blocked_seconds, 6)}
+
+
+class Budget:
+    """线程安全的条数与字节额度"""
+    def __init__(self, max_items: int = 0, max_bytes: int = 0, stats: Optional[StageStats] = None):
+        """
+        Args:
+            max_items: 条数上限，0表示不限
+            max_bytes: 字节上限，0表示不限
+            stats: 记录深度和阻塞的统计对象，为空时新建
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.stats = stats or StageStats("")
+        self.items = 0
+        self.bytes = 0
+        self._waiters: List[Tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._lock = threading.Lock()
+
+    def _fits(self, size: int) -> bool:
+        if self.items == 0:
+            return True
+        if self.max_items and self.items >= self.max_items:
+            return False
+        return not self.max_bytes or self.bytes + size <= self.max_bytes
+
+    def has_space(self, size: int = 0) -> bool:
+        """当前额度能否放入size字节"""
+        with self._lock:
+            return self._fits(size)
+
+    def take(self, size: int = 0):
+        """占用额度，不等待，可能超出上限"""
+        with self._lock:
+            self.items += 1
+            self.bytes += size
+        self.stats.add(1, size)
+
+    def release(self, size: int = 0):
+        with self._lock:
+            self.items -= 1
+            self.bytes -= size
+            self._notify()
+        self.stats.add(-1, -size)
+
+    def clear(self):
+        """归还全部额度"""
+        with self._lock:
+            items, size = self.items, self.bytes
+            self.items = self.bytes = 0
+            self._notify()
+        self.stats.add(-items, -size)
+
+    async def wait(self, size: int = 0):
+        """等待额度足够放入size字节，不占用"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._fits(size):
+                return
+            waiter = (size, loop, loop.create_future())
+            self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await waiter[2]
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            self.stats.block(time.perf_counter() - start)
+
+    async def acquire(self, size: int = 0):
+        """等待额度并占用"""
+        while True:
+            await self.wait(size)
+            with self._lock:
+                if self._fits(size):
+                    self.items += 1
+                    self.bytes += size
+                    break
+        self.stats.add(1, size)
+
+    def _notify(self):
+        """唤醒额度足够的等待者，调用方需持有锁"""
+        remaining = []
+        for waiter in self._waiters:
+            size, loop, future = waiter
+            if not self._fits(size):
+                remaining.append(waiter)
+                continue
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # 等待者所在的事件循环已关闭
+        self._waiters = remaining
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class BoundedQueue(queue.Queue):
+    """按条数和字节数限额的线程安全队列
+
+    put从不阻塞，结束标记和打断不会被卡住；生产者在put之前await wait_space等待额度，
+    播放线程照常用get取数据。
+    """
+    def __init__(self, max_items: int = 0, max_bytes: int = 0, sizer: Callable[[Any], int] = len,
+                 stats: Optional[StageStats] = None):
+        """
+        Args:
+            max_items: 条数上限，0表示不限
+            max_bytes: 字节上限，0表示不限
+            sizer: 计算队列元素字节数的函数
+            stats: 记录深度和阻塞的统计对象
+        """
+        super().__init__()
+        self.budget = Budget(max_items, max_bytes, stats)
+        self.sizer = sizer
+
+    def _put(self, item):
+        super()._put(item)
+        self.budget.take(self.sizer(item))
+
+    def _get(self):
+        item = super()._get()
+        self.budget.release(self.sizer(item))
+        return item
+
+    async def wait_space(self, size: int = 0):
+        await self.budget.wait(size)
+
+    def has_space(self, size: int = 0) -> bool:
+        return self.budget.has_space(size)
+
+    def clear(self) -> int:
+        """丢弃所有元素，返回丢弃的条数"""
+        with self.mutex:
+            count = len(self.queue)
+            self.queue.clear()
+            self.budget.clear()
+            self.not_full.notify_all()
+        return count
+
+    def stats(self) -> Dict[str, float]:
+        return self.budget.stats.snapshot()
@@ -1,24 +1,45 @@
-from pydantic import BaseModel
-from typing import Optional, AsyncIterator, Tuple
-import edge_tts
-from log import log
-import time
-import asyncio
+from typing import AsyncIterator, Dict, Optional
 from abc import ABC, abstractmethod
+from ..audio_chunk import AudioChunk
 
 
 
 class TTSEngine(ABC):
     """TTS引擎的抽象基类"""
+    streaming: bool = True  # 为False时，按名称创建的TTS默认使用整句解码播放的FFPlayer
+
+    @classmethod
+    def create(cls, scheduler: str = "thread") -> "TTSEngine":
+        """TTS按名称创建引擎时调用，可按调度方式选择默认配置，默认使用无参构造
+
+        Args:
+            scheduler: TTS的调度方式，"thread"或"asyncio"
+        """
+        return cls()
+
     @abstractmethod
-    async def synthesize(self, text: str) -> AsyncIterator[bytes]:
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
         """
         将文本转换为语音
         Args:
             text: 要转换的文本
         Returns:
-            AsyncIterator[bytes]: 音频数据的异步迭代器
+            AsyncIterator[AudioChunk]: 音频块的异步迭代器，块内带有编码格式信息
         """
         pass
 
+    async def prewarm(self):
+        """一段回复开始时调用，可提前建立连接，默认不做任何事"""
+        pass
+
+    async def release_loop(self):
+        """thread调度下每句的事件循环关闭前调用，释放绑定在当前事件循环上的资源（连接池等），默认不做任何事"""
+        pass
 
+    def cache_params(self) -> Optional[Dict]:
+        """决定合成结果的参数（引擎、音色、语速、模型、音频格式等），CachedEngine按此区分不同音色的缓存
+
+        连接池、超时、密钥等不影响音频的参数不应包含在内，调整它们不会使缓存失效。
+        默认返回None，表示没有声明音色标识，CachedEngine不缓存该引擎的结果。
+        """
+        return None
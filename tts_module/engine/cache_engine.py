@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from pydantic import BaseModel
+from log import log
+from .base_engine import TTSEngine
+from ..audio_chunk import AudioChunk, as_chunk
+
+# 磁盘缓存文件的头部：标识行之后是一行JSON格式信息，其后为音频数据；没有头部的旧文件按格式未知读取
+_DISK_MAGIC = b"TTSCACHE1\n"
+
+
+class CacheConfig(BaseModel):
+    memory_bytes: int = 32 * 1024 * 1024  # 内存LRU的字节上限
+    disk_dir: Optional[str] = None  # 磁盘缓存目录，为空时只使用内存
+    disk_bytes: int = 512 * 1024 * 1024  # 磁盘缓存的字节上限
+    chunk_size: int = 4096  # 回放缓存时每个chunk的大小
+
+
+class CachedEngine(TTSEngine):
+    """按文本和音色参数缓存合成结果的引擎包装
+
+    缓存键为规范化文本加上被包装引擎cache_params()声明的音色标识的sha256，连接和超时设置不影响缓存键。
+    引擎没有声明音色标识时（cache_params()返回None）直接转发，不读写缓存，以免不同音色互相命中。
+    只有完整合成且非空的结果才会写入缓存：被包装引擎需在合成失败（如连接中途断开）时抛出异常，
+    异常原样传给调用方，已产出的部分音频不写入缓存；调用方中途停止读取时同样不写入。回放时按chunk_size切出共享缓冲的子块，不复制音频数据。
+    磁盘缓存文件带有记录编码、采样率和声道数的头部，从磁盘读出的块格式与合成时相同。
+    """
+    def __init__(self, engine: TTSEngine, config: Optional[CacheConfig] = None):
+        self.engine = engine
+        self.config = config or CacheConfig()
+        self._memory: "OrderedDict[str, AudioChunk]" = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0,
+                       "evictions": 0, "disk_evictions": 0}
+        self._disk_dir = Path(self.config.disk_dir) if self.config.disk_dir else None
+        if self._disk_dir:
+            self._disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def cache_key(self, text: str) -> Optional[str]:
+        """规范化文本与音色标识的内容哈希，引擎没有声明音色标识时为None"""
+        params = self.engine.cache_params()
+        if params is None:
+            return None
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        payload = json.dumps({"params": params, "text": normalized}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def cache_params(self) -> Optional[Dict]:
+        return self.engine.cache_params()
+
+    async def prewarm(self):
+        await self.engine.prewarm()
+
+    async def release_loop(self):
+        await self.engine.release_loop()
+
+    def stats(self) -> Dict[str, int]:
+        """命中、未命中与淘汰统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_size
+        return stats
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        key = self.cache_key(text)
+        if key is None:
+            self._count("bypassed")
+            async for chunk in self.engine.synthesize(text):
+                yield chunk
+            return
+
+        audio = self._memory_get(key)
+        if audio is not None:
+            self._count("hits", "memory_hits")
+            log.info(f"TTS缓存命中(内存): {len(audio)} 字节")
+            for chunk in self._replay(audio):
+                yield chunk
+            return
+
+        path = self._disk_path(key)
+        if path is not None and path.exists():
+            try:
+                audio = _disk_load(await asyncio.to_thread(path.read_bytes))
+            except (OSError, ValueError) as e:
+                log.error(f"读取TTS磁盘缓存失败: {str(e)}")
+            else:
+                self._count("hits", "disk_hits")
+                log.info(f"TTS缓存命中(磁盘): {path.name}")
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                self._memory_put(key, audio)
+                for chunk in self._replay(audio):
+                    yield chunk
+                return
+
+        self._count("misses")
+        parts: List[AudioChunk] = []
+        # 合成抛出异常或调用方提前停止读取时不会执行到循环之后，不完整的结果不会写入缓存
+        async for chunk in self.engine.synthesize(text):
+            chunk = as_chunk(chunk)
+            parts.append(chunk)
+            yield chunk
+        if not parts:
+            return
+        first = parts[0]
+        # 合并成一块连续缓冲保存，这是整个缓存路径上唯一的一次复制
+        audio = AudioChunk(b"".join(part.data for part in parts), first.codec, first.sample_rate, first.channels)
+        self._memory_put(key, audio)
+        if path is not None:
+            await asyncio.to_thread(self._disk_put, path, audio)
+
+    def _replay(self, audio: AudioChunk) -> Iterator[AudioChunk]:
+        size = self.config.chunk_size
+        for start in range(0, len(audio), size):
+            yield audio.slice(start, start + size)
+
+    def _count(self, *names: str):
+        with self._lock:
+            for name in names:
+                self._stats[name] += 1
+
+    def _memory_get(self, key: str) -> Optional[AudioChunk]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            return data
+
+    def _memory_put(self, key: str, data: AudioChunk):
+        if len(data) > self.config.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_size -= len(old)
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.config.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        if self._disk_dir is None:
+            return None
+        return self._disk_dir / f"{key}.audio"
+
+    def _disk_put(self, path: Path, audio: AudioChunk):
+        """原子写入磁盘缓存，并按最近访问时间淘汰超出上限的文件"""
+        header = json.dumps({"codec": audio.codec, "sample_rate": audio.sample_rate, "channels": audio.channels})
+        try:
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(_DISK_MAGIC + header.encode("utf-8") + b"\n")
+                f.write(audio.data)
+            os.replace(tmp, path)
+            files = [(p.stat().st_mtime, p.stat().st_size, p) for p in self._disk_dir.glob("*.audio")]
+            total = sum(size for _, size, _ in files)
+            for _, size, p in sorted(files):
+                if total <= self.config.disk_bytes:
+                    break
+                p.unlink(missing_ok=True)
+                total -= size
+                self._count("disk_evictions")
+        except OSError as e:
+            log.error(f"写入TTS磁盘缓存失败: {str(e)}")
+
+
+def _disk_load(data: bytes) -> AudioChunk:
+    """解析磁盘缓存文件，音频部分与读出的字节共享缓冲"""
+    if not data.startswith(_DISK_MAGIC):
+        return AudioChunk(data)
+    end = data.index(b"\n", len(_DISK_MAGIC))
+    audio_format = json.loads(data[len(_DISK_MAGIC):end])
+    return AudioChunk(memoryview(data)[end + 1:], audio_format.get("codec"), audio_format.get("sample_rate"),
+                      audio_format.get("channels"))
@@ -1,9 +1,16 @@
 from pydantic import BaseModel
-from typing import Optional, AsyncIterator
+from typing import Dict, Optional, AsyncIterator
 import edge_tts
+from edge_tts.data_classes import TTSConfig
 from log import log
 import time
+from contextlib import aclosing
 from .base_engine import TTSEngine
+from .edge_pool import EdgeConnectionPool, EdgePoolConfig
+from ..audio_chunk import AudioChunk
+
+# edge_tts.Communicate 默认输出格式 audio-24khz-48kbitrate-mono-mp3
+EDGE_SAMPLE_RATE = 24000
 
 class EdgeConfig(BaseModel):
     voice: str = "zh-CN-XiaoxiaoNeural"
@@ -12,29 +19,67 @@ class EdgeConfig(BaseModel):
     pitch: str = "+37Hz"
 
 class EdgeEngine(TTSEngine):
-    def __init__(self, config: Optional[EdgeConfig] = None):
+    def __init__(self, config: Optional[EdgeConfig] = None, pool: Optional[EdgePoolConfig] = None):
+        """
+        Args:
+            config: 音色参数
+            pool: 连接池配置，为空时每句新建edge_tts.Communicate。
+                连接绑定事件循环，连接池适用于所有句子共享一个事件循环的asyncio调度和服务模式
+        """
         self.config = config or EdgeConfig()
+        self.pool = EdgeConnectionPool(pool) if pool is not None else None
+        self._tts_config = TTSConfig(self.config.voice, self.config.rate, self.config.volume, self.config.pitch)
+
+    @classmethod
+    def create(cls, scheduler: str = "thread") -> "EdgeEngine":
+        # asyncio调度下所有句子共享事件循环，可以复用Edge连接
+        return cls(pool=EdgePoolConfig() if scheduler == "asyncio" else None)
+
+    async def prewarm(self):
+        if self.pool is not None:
+            await self.pool.prewarm()
+
+    def cache_params(self) -> Dict:
+        return {"engine": "edge", **self.config.model_dump()}
+
+    async def aclose(self):
+        """关闭当前事件循环上的空闲连接"""
+        if self.pool is not None:
+            await self.pool.aclose()
 
-    async def synthesize(self, text: str) -> AsyncIterator[bytes]:
+    async def release_loop(self):
+        await self.aclose()
+
+    def _stream(self, text: str) -> AsyncIterator[bytes]:
+        if self.pool is not None:
+            return self.pool.stream(self._tts_config, text)
+        return self._communicate(text)
+
+    async def _communicate(self, text: str) -> AsyncIterator[bytes]:
+        comm = edge_tts.Communicate(
+            text, self.config.voice,
+            rate=self.config.rate,
+            volume=self.config.volume,
+            pitch=self.config.pitch
+        )
+        async for chunk in comm.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
         """返回异步迭代器"""
         synthesis_start = time.time()
         first_chunk = True
         try:
-            comm = edge_tts.Communicate(
-                text, self.config.voice,
-                rate=self.config.rate,
-                volume=self.config.volume,
-                pitch=self.config.pitch
-            )
-            
-            async for chunk in comm.stream():
-                if chunk["type"] == "audio":
+            async with aclosing(self._stream(text)) as stream:
+                async for data in stream:
                     if first_chunk:
-                        log.info(f"接收首个音频chunk")
+                        log.info(f"接收首个音频chunk 延迟:{time.time()-synthesis_start:.3f}s")
                         first_chunk = False
-                    yield chunk["data"]
-                    
+                    yield AudioChunk(data, "mp3", EDGE_SAMPLE_RATE, 1)
+
             log.info(f"TTS合成完成 耗时:{time.time()-synthesis_start:.3f}s")
         except Exception as e:
+            # 继续抛出，调用方（缓存、对冲）据此区分中途断开与正常结束
             log.error(f"TTS合成失败: {str(e)}")
-            return
+            raise
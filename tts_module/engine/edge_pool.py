@@ -0,0 +1,269 @@
+import asyncio
+import ssl
+import time
+import weakref
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional
+from xml.sax.saxutils import escape
+
+import aiohttp
+import certifi
+from edge_tts.communicate import (
+    calc_max_mesg_size,
+    connect_id,
+    date_to_string,
+    get_headers_and_data,
+    mkssml,
+    remove_incompatible_characters,
+    split_text_by_byte_length,
+    ssml_headers_plus_data,
+)
+from edge_tts.constants import SEC_MS_GEC_VERSION, WSS_HEADERS, WSS_URL
+from edge_tts.data_classes import TTSConfig
+from edge_tts.drm import DRM
+from pydantic import BaseModel
+from log import log
+
+SPEECH_CONFIG = (
+    "Content-Type:application/json; charset=utf-8\r\n"
+    "Path:speech.config\r\n\r\n"
+    '{"context":{"synthesis":{"audio":{"metadataoptions":{'
+    '"sentenceBoundaryEnabled":"false","wordBoundaryEnabled":"false"},'
+    '"outputFormat":"audio-24khz-48kbitrate-mono-mp3"'
+    "}}}}\r\n"
+)
+
+
+class EdgePoolConfig(BaseModel):
+    size: int = 4  # 每个事件循环保留的空闲连接数上限，0表示每句新建连接、用完即关
+    max_uses: int = 200  # 单个连接最多合成的句子数
+    max_idle: float = 20.0  # 空闲超过该时长（秒）的连接不再复用，服务端会关闭长时间空闲的连接
+    max_age: float = 600.0  # 连接的最长存活时间（秒）
+    connect_timeout: float = 10.0
+    receive_timeout: float = 60.0
+    url: Optional[str] = None  # 覆盖服务地址，用于本地替身服务或测试
+    proxy: Optional[str] = None
+
+
+class EdgeConnection:
+    """一条已发送speech.config的合成WebSocket连接，可按轮次连续合成多句"""
+    def __init__(self, session: aiohttp.ClientSession, ws: aiohttp.ClientWebSocketResponse):
+        self.session = session
+        self.ws = ws
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+    def healthy(self, config: EdgePoolConfig) -> bool:
+        now = time.monotonic()
+        return (not self.ws.closed
+                and self.uses < config.max_uses
+                and now - self.last_used < config.max_idle
+                and now - self.created_at < config.max_age)
+
+    async def synthesize(self, tts_config: TTSConfig, text: str) -> AsyncIterator[bytes]:
+        """发送一轮ssml并产出音频，收到turn.end后连接可继续使用"""
+        self.uses += 1
+        await self.ws.send_str(
+            ssml_headers_plus_data(connect_id(), date_to_string(), mkssml(tts_config, text))
+        )
+        while True:
+            received = await self.ws.receive()
+            if received.type == aiohttp.WSMsgType.TEXT:
+                encoded = received.data.encode("utf-8")
+                headers, _ = get_headers_and_data(encoded, encoded.find(b"\r\n\r\n"))
+                if headers.get(b"Path") == b"turn.end":
+                    break
+            elif received.type == aiohttp.WSMsgType.BINARY:
+                if len(received.data) < 2:
+                    raise ValueError("Edge返回的二进制消息缺少头部长度")
+                header_length = int.from_bytes(received.data[:2], "big")
+                headers, data = get_headers_and_data(received.data, header_length)
+                if headers.get(b"Path") == b"audio" and data:
+                    yield data
+            else:
+                raise ConnectionError(f"Edge连接已断开: {received.type.name}")
+        self.last_used = time.monotonic()
+
+    async def close(self):
+        await self.ws.close()
+        await self.session.close()
+
+
+class _LoopPool:
+    """一个事件循环上的连接池，aiohttp连接不能跨事件循环使用"""
+    def __init__(self):
+        self.idle: Deque[EdgeConnection] = deque()
+        self.warming: Optional[asyncio.Task] = None  # 预热中的连接，先到的句子直接接手
+
+
+class EdgeConnectionPool:
+    """Edge合成连接池
+
+    连接建立（DNS、TCP、TLS、WebSocket握手）占每句首包延迟的大头，
+    连接池在句子和会话之间复用已握手的连接，连接按空闲时长、使用次数和存活时间回收。
+    句子中途被取消时连接上还有未读完的数据，这类连接直接关闭而不放回池中。
+    """
+    def __init__(self, config: Optional[EdgePoolConfig] = None):
+        self.config = config or EdgePoolConfig()
+        self._pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopPool]" = weakref.WeakKeyDictionary()
+        self._ssl = ssl.create_default_context(cafile=certifi.where())
+        self._stats = {"connects": 0, "reuses": 0, "recycled": 0, "discarded": 0, "retries": 0}
+
+    def stats(self) -> Dict[str, int]:
+        """新建、复用、回收与丢弃的连接数"""
+        stats = dict(self._stats)
+        stats["idle"] = sum(len(pool.idle) for pool in self._pools.values())
+        return stats
+
+    @property
+    def _pool(self) -> _LoopPool:
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            pool = self._pools[loop] = _LoopPool()
+        return pool
+
+    def _url(self) -> str:
+        if self.config.url:
+            return self.config.url
+        return (f"{WSS_URL}&Sec-MS-GEC={DRM.generate_sec_ms_gec()}"
+                f"&Sec-MS-GEC-Version={SEC_MS_GEC_VERSION}&ConnectionId={connect_id()}")
+
+    async def connect(self) -> EdgeConnection:
+        """新建连接并发送speech.config"""
+        session = aiohttp.ClientSession(
+            trust_env=True,
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=self.config.connect_timeout,
+                sock_read=self.config.receive_timeout,
+            ),
+        )
+        try:
+            try:
+                ws = await self._ws_connect(session)
+            except aiohttp.ClientResponseError as e:
+                if e.status != 403:
+                    raise
+                # 本机时钟偏差导致Sec-MS-GEC失效，按服务端时间校正后重试
+                DRM.handle_client_response_error(e)
+                ws = await self._ws_connect(session)
+            await ws.send_str(f"X-Timestamp:{date_to_string()}\r\n{SPEECH_CONFIG}")
+        except BaseException:
+            await session.close()
+            raise
+        self._stats["connects"] += 1
+        return EdgeConnection(session, ws)
+
+    async def _ws_connect(self, session: aiohttp.ClientSession) -> aiohttp.ClientWebSocketResponse:
+        return await session.ws_connect(
+            self._url(),
+            compress=15,
+            proxy=self.config.proxy,
+            headers=WSS_HEADERS,
+            ssl=self._ssl,  # ws://地址（本地替身服务）不使用
+        )
+
+    async def acquire(self) -> EdgeConnection:
+        """取出最近使用过的健康连接，没有时新建"""
+        pool = self._pool
+        while pool.idle:
+            connection = pool.idle.pop()
+            if connection.healthy(self.config):
+                self._stats["reuses"] += 1
+                return connection
+            self._stats["recycled"] += 1
+            await connection.close()
+        warming, pool.warming = pool.warming, None
+        if warming is not None:
+            try:
+                return await asyncio.shield(warming)
+            except asyncio.CancelledError:
+                # 句子被取消，预热的连接仍然放回池中
+                warming.add_done_callback(self._release_warmed)
+                raise
+            except Exception:
+                pass
+        return await self.connect()
+
+    def _release_warmed(self, warming: asyncio.Task):
+        if not warming.cancelled() and warming.exception() is None:
+            asyncio.ensure_future(self.release(warming.result()))
+
+    async def release(self, connection: EdgeConnection, reusable: bool = True):
+        pool = self._pool
+        if reusable and len(pool.idle) < self.config.size and connection.healthy(self.config):
+            pool.idle.append(connection)
+            await self._prune(pool)
+            return
+        if not reusable:
+            self._stats["discarded"] += 1
+        await connection.close()
+
+    async def _prune(self, pool: _LoopPool):
+        """关闭池底部已过期的空闲连接"""
+        while pool.idle and not pool.idle[0].healthy(self.config):
+            self._stats["recycled"] += 1
+            await pool.idle.popleft().close()
+
+    async def prewarm(self):
+        """池中没有空闲连接时预先建立一条，供即将开始的句子使用"""
+        if self.config.size <= 0:
+            return
+        pool = self._pool
+        await self._prune(pool)
+        if pool.idle or pool.warming is not None:
+            return
+        warming = pool.warming = asyncio.ensure_future(self.connect())
+        try:
+            connection = await asyncio.shield(warming)
+        except Exception as e:
+            log.error(f"Edge连接预热失败: {str(e)}")
+            return
+        finally:
+            if pool.warming is warming:
+                pool.warming = None
+            else:
+                warming = None  # 已被句子接手
+        if warming is not None:
+            log.info("Edge连接已预热")
+            await self.release(connection)
+
+    async def stream(self, tts_config: TTSConfig, text: str) -> AsyncIterator[bytes]:
+        """在池中的连接上合成文本
+
+        复用的连接可能已被服务端关闭，尚未产出音频时换新连接重试一次。
+        """
+        texts = split_text_by_byte_length(
+            escape(remove_incompatible_characters(text)),
+            calc_max_mesg_size(tts_config),
+        )
+        for part in texts:
+            retried = False
+            while True:
+                connection = await self.acquire()
+                reused = connection.uses > 0
+                received = False
+                completed = False
+                try:
+                    async for data in connection.synthesize(tts_config, part):
+                        received = True
+                        yield data
+                    completed = True
+                except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError):
+                    if received or not reused or retried:
+                        raise
+                    self._stats["retries"] += 1
+                    retried = True
+                    continue
+                finally:
+                    await self.release(connection, reusable=completed)
+                break
+
+    async def aclose(self):
+        """关闭当前事件循环上的空闲连接"""
+        pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            while pool.idle:
+                await pool.idle.pop().close()
@@ -0,0 +1,273 @@
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+from pydantic import BaseModel
+from log import log
+from .base_engine import TTSEngine
+from ..audio_chunk import AudioChunk, as_chunk
+from ..backpressure import Budget
+
+
+class HedgeConfig(BaseModel):
+    hedge_after: float = 0.8  # 当前后端超过该时长（秒）没有首包时，同时请求下一个后端
+    first_chunk_timeout: float = 8.0  # 所有进行中的请求都没有首包时放弃本句（秒）
+    max_attempts: int = 3  # 每句最多发起的请求数，含对冲和失败重试
+    failure_threshold: int = 3  # 连续失败多少次后熔断
+    reset_timeout: float = 30.0  # 熔断后多久放行一个试探请求（秒）
+    buffer_items: int = 64  # 胜出请求缓冲的块数，满时暂停读取后端，0表示不限
+    buffer_bytes: int = 1024 * 1024  # 胜出请求缓冲的字节数，0表示不限
+
+
+class CircuitBreaker:
+    """单个后端的熔断器
+
+    连续失败达到阈值后熔断，熔断期间不再向该后端派发请求；
+    经过reset_timeout后放行一个试探请求，成功则恢复，失败则重新计时。
+    thread调度下多个事件循环共享同一个引擎，状态用锁保护。
+    """
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """是否可以向该后端派发请求，半开状态下只放行一个试探请求"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def record_abandoned(self):
+        """请求因对冲失败被取消，不计入成败，释放试探名额"""
+        with self._lock:
+            self._probing = False
+
+
+class _Attempt:
+    """对一个后端的一次请求
+
+    合成在独立的task中进行，音频块放入队列，胜出后由调用方从队列读取；
+    HTTP客户端的超时作用域绑定task，因此不跨task迭代引擎的生成器。
+    队列受额度限制，调用方读取慢于后端产出时暂停读取后端，而不是无限缓冲。
+    """
+    def __init__(self, index: int, engine: TTSEngine, text: str, budget: Budget):
+        self.index = index
+        self.started = time.monotonic()
+        self.first: asyncio.Future = asyncio.get_running_loop().create_future()  # 首个音频块，没有音频时为None
+        self.queue: asyncio.Queue = asyncio.Queue()  # 首块之后的音频块，以None结束
+        self.budget = budget
+        self.error: Optional[BaseException] = None
+        self.task = asyncio.ensure_future(self._run(engine, text))
+
+    async def _run(self, engine: TTSEngine, text: str):
+        try:
+            async for chunk in engine.synthesize(text):
+                chunk = as_chunk(chunk)
+                if not chunk:
+                    continue
+                if self.first.done():
+                    await self.budget.acquire(len(chunk))
+                    self.queue.put_nowait(chunk)
+                else:
+                    self.first.set_result(chunk)
+        except Exception as e:
+            self.error = e
+        finally:
+            if not self.first.done():
+                self.first.set_result(None)
+            self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[AudioChunk]:
+        """读取下一个音频块并归还额度，结束时为None"""
+        chunk = await self.queue.get()
+        if chunk is not None:
+            self.budget.release(len(chunk))
+        return chunk
+
+    async def cancel(self):
+        if not self.task.done():
+            self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+class HedgedEngine(TTSEngine):
+    """在多个后端之间对冲和故障转移的组合引擎
+
+    先请求排在最前、未熔断的后端；hedge_after内没有首包时同时请求下一个后端，
+    先产出首包的请求胜出，其余请求立即取消。请求失败或没有产出音频时计一次失败并转向下一个后端。
+    胜出后音频只来自该后端，首包之后的失败不再转移，以免同一句话重复播放。
+    没有后端产出音频或胜出的后端中途失败时抛出异常，调用方（如缓存）据此区分失败与正常结束。
+
+    各后端的音频格式可以不同，每个音频块自带格式信息，播放器需能处理这些格式。
+    """
+    def __init__(self, engines: Sequence[TTSEngine], config: Optional[HedgeConfig] = None):
+        """
+        Args:
+            engines: 按优先级排列的后端引擎
+            config: 对冲与熔断配置
+        """
+        if not engines:
+            raise ValueError("至少需要一个后端引擎")
+        self.engines = list(engines)
+        self.config = config or HedgeConfig()
+        self.breakers = [CircuitBreaker(self.config.failure_threshold, self.config.reset_timeout)
+                         for _ in self.engines]
+        self._stats = [{"requests": 0, "wins": 0, "failures": 0, "hedges": 0, "cancelled": 0}
+                       for _ in self.engines]
+        self._lock = threading.Lock()
+
+    def stats(self) -> List[Dict]:
+        """各后端的请求、胜出、失败、对冲和被取消次数及熔断状态"""
+        with self._lock:
+            stats = [dict(backend) for backend in self._stats]
+        for backend, engine, breaker in zip(stats, self.engines, self.breakers):
+            backend["engine"] = type(engine).__name__
+            backend["state"] = breaker.state
+        return stats
+
+    def _count(self, index: int, name: str):
+        with self._lock:
+            self._stats[index][name] += 1
+
+    async def prewarm(self):
+        await asyncio.gather(*(engine.prewarm() for engine in self.engines), return_exceptions=True)
+
+    async def release_loop(self):
+        await asyncio.gather(*(engine.release_loop() for engine in self.engines), return_exceptions=True)
+
+    def cache_params(self) -> Optional[Dict]:
+        """音频可能来自任一后端，任一后端没有声明音色标识时不缓存"""
+        backends = [engine.cache_params() for engine in self.engines]
+        if any(params is None for params in backends):
+            return None
+        return {"engine": "hedged", "backends": backends}
+
+    def _next_backend(self, attempted: List[int], running: List[_Attempt]) -> Optional[int]:
+        """按优先级选择下一个可用后端，首轮之后允许重试已失败过的后端"""
+        busy = {attempt.index for attempt in running}
+        order = sorted(range(len(self.engines)), key=lambda i: (attempted.count(i), i))
+        for index in order:
+            if index not in busy and self.breakers[index].allow():
+                return index
+        if not attempted:
+            # 全部熔断时仍然尝试首选后端，避免整句静音
+            return 0
+        return None
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        config = self.config
+        attempted: List[int] = []
+        running: List[_Attempt] = []
+        winner: Optional[_Attempt] = None
+        error: Optional[BaseException] = None  # 最近一个失败请求的异常
+        timed_out = False
+        start = time.monotonic()
+
+        def launch(hedge: bool) -> bool:
+            if len(attempted) >= config.max_attempts:
+                return False
+            index = self._next_backend(attempted, running)
+            if index is None:
+                return False
+            attempted.append(index)
+            budget = Budget(config.buffer_items, config.buffer_bytes)
+            running.append(_Attempt(index, self.engines[index], text, budget))
+            self._count(index, "requests")
+            if hedge:
+                self._count(index, "hedges")
+                log.info(f"{type(self.engines[index]).__name__}对冲请求 - 已等待{time.monotonic()-start:.3f}s")
+            return True
+
+        try:
+            can_hedge = launch(hedge=False)
+            while running and winner is None:
+                remaining = config.first_chunk_timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                timeout = remaining
+                if can_hedge:
+                    # 最近一个请求发出hedge_after后仍没有首包时对冲
+                    latest = max(attempt.started for attempt in running)
+                    timeout = min(timeout, max(0.0, latest + config.hedge_after - time.monotonic()))
+                done, _ = await asyncio.wait([attempt.first for attempt in running], timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if can_hedge:
+                        can_hedge = launch(hedge=True)
+                    continue
+                for attempt in [attempt for attempt in running if attempt.first in done]:
+                    if attempt.first.result() is not None:
+                        winner = winner or attempt
+                        continue
+                    # 出错或没有产出音频
+                    running.remove(attempt)
+                    error = attempt.error or error
+                    self.breakers[attempt.index].record_failure()
+                    self._count(attempt.index, "failures")
+                    name = type(self.engines[attempt.index]).__name__
+                    log.error(f"{name}合成失败: {str(attempt.error) if attempt.error else '没有音频'}")
+                    if winner is None:
+                        can_hedge = launch(hedge=False)
+        finally:
+            # 落选、超时或本句被取消时，取消其余请求
+            for attempt in running:
+                if attempt is not winner:
+                    await attempt.cancel()
+                    self.breakers[attempt.index].record_abandoned()
+                    self._count(attempt.index, "cancelled")
+
+        if winner is None:
+            if timed_out:
+                raise TimeoutError(f"{config.first_chunk_timeout}s内没有任何后端返回音频")
+            raise RuntimeError(f"{len(attempted)}个请求都没有返回音频") from error
+        self._count(winner.index, "wins")
+        breaker = self.breakers[winner.index]
+        finished = False
+        try:
+            yield winner.first.result()
+            while (chunk := await winner.get()) is not None:
+                yield chunk
+            finished = True
+        finally:
+            if not finished:
+                # 调用方中途停止，不计入成败
+                await winner.cancel()
+                breaker.record_abandoned()
+        if winner.error is not None:
+            breaker.record_failure()
+            self._count(winner.index, "failures")
+            log.error(f"{type(self.engines[winner.index]).__name__}合成中断: {str(winner.error)}")
+            raise winner.error
+        else:
+            breaker.record_success()
@@ -1,11 +1,13 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
 from pydantic import BaseModel
-from typing import Optional, AsyncIterator
+from typing import Dict, Optional, AsyncIterator
 import asyncio
+import weakref
+import httpx
 from log import log
 import time
-import io
 from .base_engine import TTSEngine
+from ..audio_chunk import AudioChunk
 
 class OpenAIConfig(BaseModel):
     base_url: str = "http://xxxxxxx:3000/v1"
@@ -13,38 +15,79 @@ class OpenAIConfig(BaseModel):
     voice: str = "hoshino"
     model: str = "tts-1"
     audio_format: str = "wav"  # 新增音频格式配置
+    max_connections: int = 10  # 连接池上限
+    keepalive_expiry: float = 30.0  # 空闲连接保持时间（秒）
+    timeout: float = 60.0
 
 class OpenAIEngine(TTSEngine):
+    """OpenAI兼容接口的流式TTS引擎
+
+    使用异步客户端的流式响应，数据到达即转发，不阻塞事件循环。
+    httpx连接池绑定事件循环，因此每个事件循环维护一个客户端，
+    asyncio调度模式下所有句子共享同一个保持连接的连接池。
+    thread调度下每句有自己的短生命周期事件循环，连接无法跨句复用，客户端在该句的事件循环关闭前由release_loop关闭。
+    """
+    streaming = False
+
     def __init__(self, config: Optional[OpenAIConfig] = None):
         self.config = config or OpenAIConfig()
-        self.client = OpenAI(
-            base_url=self.config.base_url,
-            api_key=self.config.api_key
-        )
-        self.chunk_size = 720
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """当前事件循环对应的客户端"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.config.max_connections,
+                    max_keepalive_connections=self.config.max_connections,
+                    keepalive_expiry=self.config.keepalive_expiry,
+                ),
+                timeout=self.config.timeout,
+            )
+            client = AsyncOpenAI(
+                base_url=self.config.base_url,
+                api_key=self.config.api_key,
+                http_client=http_client,
+            )
+            self._clients[loop] = client
+        return client
+
+    def cache_params(self) -> Dict:
+        # 只有服务地址、音色、模型和格式决定音频，连接池和超时设置不影响缓存
+        return {"engine": "openai", **self.config.model_dump(include={"base_url", "voice", "model", "audio_format"})}
 
-    async def synthesize(self, text: str) -> AsyncIterator[bytes]:
+    async def aclose(self):
+        """关闭当前事件循环的连接池"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    async def release_loop(self):
+        await self.aclose()
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
         synthesis_start = time.time()
         first_chunk = True
-        
+
         try:
-            response = self.client.audio.speech.create(
+            async with self.client.audio.speech.with_streaming_response.create(
                 input=text,
                 voice=self.config.voice,
                 response_format=self.config.audio_format,
                 model=self.config.model,
-            )
-
-            buffer = io.BytesIO(response.content)
-            while chunk := buffer.read(self.chunk_size):
-                if first_chunk:
-                    log.info(f"接收首个音频chunk: {len(chunk)} 字节")
-                    first_chunk = False
-                yield chunk
+            ) as response:
+                async for chunk in response.iter_bytes():
+                    if first_chunk:
+                        log.info(f"接收首个音频chunk: {len(chunk)} 字节 延迟:{time.time()-synthesis_start:.3f}s")
+                        first_chunk = False
+                    yield AudioChunk(chunk, self.config.audio_format)
 
-            
             log.info(f"TTS合成完成 耗时:{time.time()-synthesis_start:.3f}s")
 
         except Exception as e:
+            # 继续抛出，调用方（缓存、对冲）据此区分中途断开与正常结束
             log.error(f"OpenAI TTS合成失败: {str(e)}")
-            return
+            raise
@@ -0,0 +1,426 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import deque
+from contextlib import aclosing
+from multiprocessing import connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from pydantic import BaseModel
+from log import log
+from .base_engine import TTSEngine
+from ..audio_chunk import AudioChunk, as_chunk
+
+
+class ProcessPoolConfig(BaseModel):
+    workers: int = 0  # 工作进程数，0表示可用的CPU核数
+    slots: int = 8  # 每个工作进程的共享内存槽数，全部被占用时工作进程等待主进程取走音频
+    slot_bytes: int = 64 * 1024  # 每个槽的字节数，更大的音频块分成多个槽传输
+    start_method: str = "spawn"  # 主进程通常已有事件循环和线程，fork不安全
+    restart: bool = True  # 工作进程意外退出时重新启动
+
+
+def available_cores() -> int:
+    """当前进程可以使用的CPU核数"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class _WorkerHost:
+    """工作进程内的主循环：一次合成一句，音频写入共享内存槽，通过管道通知主进程"""
+    def __init__(self, engine: TTSEngine, shm: SharedMemory, config: ProcessPoolConfig, conn):
+        self.engine = engine
+        self.shm = shm
+        self.slot_bytes = config.slot_bytes
+        self.conn = conn
+        self.free: Deque[int] = deque(range(config.slots))
+        self.jobs: Deque[tuple] = deque()
+        self.current: Optional[int] = None
+        self.cancelled = False
+        self.stopping = False
+
+    def poll(self, block: bool = False):
+        """处理主进程发来的消息，block为True时至少等待一条"""
+        while block or self.conn.poll():
+            block = False
+            message = self.conn.recv()
+            kind = message[0]
+            if kind == "free":
+                self.free.append(message[1])
+            elif kind == "job":
+                self.jobs.append(message[1:])
+            elif kind == "cancel":
+                self.cancelled = self.cancelled or message[1] == self.current
+            elif kind == "stop":
+                self.stopping = True
+
+    async def run(self):
+        while not self.stopping:
+            if not self.jobs:
+                self.poll(block=True)
+                continue
+            job_id, text = self.jobs.popleft()
+            self.current = job_id
+            self.cancelled = False
+            error = None
+            try:
+                await self._synthesize(job_id, text)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            self.current = None
+            self.conn.send(("end", job_id, error))
+
+    async def _synthesize(self, job_id: int, text: str):
+        async with aclosing(self.engine.synthesize(text)) as stream:
+            async for chunk in stream:
+                chunk = as_chunk(chunk)
+                data = chunk.data.cast("B")
+                for start in range(0, len(data), self.slot_bytes):
+                    self.poll()
+                    while not self.free and not self.cancelled and not self.stopping:
+                        self.poll(block=True)
+                    if self.cancelled or self.stopping:
+                        return
+                    slot = self.free.popleft()
+                    piece = data[start:start + self.slot_bytes]
+                    offset = slot * self.slot_bytes
+                    self.shm.buf[offset:offset + len(piece)] = piece
+                    self.conn.send(("chunk", job_id, slot, len(piece),
+                                    chunk.codec, chunk.sample_rate, chunk.channels))
+
+
+def _worker_main(factory: Callable[[], TTSEngine], shm_name: str, config: ProcessPoolConfig, conn):
+    """工作进程入口：加载一次引擎，之后一直复用"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C由主进程处理
+    shm = SharedMemory(name=shm_name)
+    try:
+        try:
+            engine = factory()
+        except Exception as e:
+            conn.send(("failed", f"{type(e).__name__}: {e}"))
+            return
+        conn.send(("ready", os.getpid(), engine.cache_params()))
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(_WorkerHost(engine, shm, config, conn).run())
+        finally:
+            loop.close()
+    except (EOFError, OSError, KeyboardInterrupt):
+        pass  # 主进程已退出
+    finally:
+        shm.close()
+
+
+class _Job:
+    """一句合成请求，音频块从读取线程转交到调用方的事件循环"""
+    def __init__(self, job_id: int, text: str):
+        self.id = job_id
+        self.text = text
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()  # AudioChunk，结束时放入None或错误信息
+        self.worker: Optional["_Worker"] = None
+        self.closed = False  # 调用方已不再读取
+        self.submitted = time.monotonic()
+
+    def deliver(self, item):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+        except RuntimeError:
+            pass  # 调用方的事件循环已关闭
+
+
+class _Worker:
+    """主进程中一个工作进程的句柄"""
+    def __init__(self, index: int, process, conn, shm: SharedMemory):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.shm = shm
+        self.ready = False
+        self.alive = True
+        self.job: Optional[_Job] = None
+        self.started_job = 0.0
+        self.jobs = 0
+        self.busy_seconds = 0.0
+        self._send_lock = threading.Lock()
+
+    def send(self, message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    def release(self):
+        self.conn.close()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ProcessEngine(TTSEngine):
+    """在工作进程池中运行CPU密集的本地引擎
+
+    每个工作进程启动时调用一次factory加载引擎（模型），之后一直复用。句子按提交顺序派发给空闲的
+    工作进程，一个进程同时只合成一句，各句分布在不同的核上并行合成，不受GIL限制。
+    音频块写入每个进程独占的共享内存槽，管道中只传递槽号和格式信息；主进程的读取线程把数据复制出来后
+    立即归还槽位，再转交给调用方的事件循环，asyncio和thread两种调度方式都可以使用。
+    调用方中途停止读取（打断、过期）时通知工作进程放弃本句。
+
+    factory需要能被pickle，例如模块级的类或functools.partial(ToneEngine, ToneConfig(...))。
+    默认以spawn方式启动工作进程，主模块的入口代码需要放在if __name__ == "__main__"之下。
+    """
+    def __init__(self, factory: Callable[[], TTSEngine], config: Optional[ProcessPoolConfig] = None):
+        """
+        Args:
+            factory: 在工作进程中创建引擎的可调用对象
+            config: 进程池配置
+        """
+        self.factory = factory
+        self.config = config or ProcessPoolConfig()
+        self.size = self.config.workers or available_cores()
+        self._context = multiprocessing.get_context(self.config.start_method)
+        self._workers: List[_Worker] = []
+        self._pending: Deque[_Job] = deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._reader: Optional[threading.Thread] = None
+        self._wakeup_recv, self._wakeup_send = None, None
+        self._closing = False
+        self._next_id = 0
+        self._stats = {"jobs": 0, "cancelled": 0, "errors": 0, "chunks": 0, "bytes": 0, "restarts": 0}
+        self._cache_params: Optional[Dict] = None
+
+    def cache_params(self) -> Optional[Dict]:
+        """工作进程中引擎声明的音色标识，与在主进程中合成共享缓存；尚无进程加载完成时为None"""
+        return self._cache_params
+
+    def start(self):
+        """启动工作进程和读取线程，已启动时不做任何事"""
+        with self._lock:
+            if self._reader is not None or self._closing:
+                return
+            self._wakeup_recv, self._wakeup_send = self._context.Pipe(duplex=False)
+            self._workers = [self._spawn(index) for index in range(self.size)]
+            self._reader = threading.Thread(target=self._read, name="process-engine-reader", daemon=True)
+            self._reader.start()
+        log.info(f"启动{self.size}个合成进程")
+
+    def _spawn(self, index: int) -> _Worker:
+        config = self.config
+        shm = SharedMemory(create=True, size=config.slots * config.slot_bytes)
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(self.factory, shm.name, config, child_conn),
+                                        name=f"tts-worker-{index}", daemon=True)
+        process.start()
+        child_conn.close()
+        return _Worker(index, process, parent_conn, shm)
+
+    async def prewarm(self):
+        """启动进程池并等待所有工作进程加载完引擎"""
+        self.start()
+        await asyncio.to_thread(self.wait_ready)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待所有存活的工作进程加载完引擎"""
+        with self._ready:
+            return self._ready.wait_for(
+                lambda: self._closing or all(worker.ready for worker in self._workers if worker.alive), timeout)
+
+    def close(self):
+        """停止工作进程并释放共享内存，进行中的句子以错误结束"""
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+            workers = self._workers
+            jobs = list(self._pending) + [worker.job for worker in workers if worker.job is not None]
+            self._pending.clear()
+            self._ready.notify_all()
+        for job in jobs:
+            job.deliver("引擎已关闭")
+        for worker in workers:
+            try:
+                worker.send(("stop",))
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        if self._reader is not None:
+            self._wakeup_send.send_bytes(b"")
+            self._reader.join()
+            self._wakeup_send.close()
+            self._wakeup_recv.close()
+        for worker in workers:
+            worker.release()
+        log.info("合成进程已停止")
+
+    async def aclose(self):
+        await asyncio.to_thread(self.close)
+
+    def stats(self) -> Dict:
+        """请求、取消、失败、音频块和重启次数，以及各工作进程的句数和忙碌时长"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+            stats["workers"] = [{"index": worker.index, "pid": worker.process.pid, "ready": worker.ready,
+                                 "busy": worker.job is not None, "jobs": worker.jobs,
+                                 "busy_seconds": round(worker.busy_seconds, 3)}
+                                for worker in self._workers]
+        return stats
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        self.start()
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("引擎已关闭")
+            if not any(worker.alive for worker in self._workers):
+                raise RuntimeError("没有可用的合成进程")
+            self._next_id += 1
+            job = _Job(self._next_id, text)
+            self._pending.append(job)
+            self._stats["jobs"] += 1
+            self._dispatch()
+        finished = False
+        try:
+            while True:
+                item = await job.queue.get()
+                if isinstance(item, AudioChunk):
+                    yield item
+                    continue
+                finished = True
+                if item is not None:
+                    raise RuntimeError(f"工作进程合成失败: {item}")
+                return
+        finally:
+            if not finished:
+                self._cancel(job)
+
+    def _cancel(self, job: _Job):
+        with self._lock:
+            job.closed = True
+            self._stats["cancelled"] += 1
+            worker = job.worker
+            if worker is None:
+                try:
+                    self._pending.remove(job)
+                except ValueError:
+                    pass
+                return
+        if worker.job is job:
+            try:
+                worker.send(("cancel", job.id))
+            except OSError:
+                pass
+
+    def _dispatch(self):
+        """把待合成的句子按顺序派发给空闲的工作进程，调用方持有锁"""
+        while self._pending:
+            worker = next((worker for worker in self._workers
+                           if worker.alive and worker.ready and worker.job is None), None)
+            if worker is None:
+                return
+            job = self._pending.popleft()
+            job.worker = worker
+            worker.job = job
+            worker.started_job = time.monotonic()
+            try:
+                worker.send(("job", job.id, job.text))
+            except OSError:
+                return  # 读取线程会发现进程退出并处理这句
+
+    def _read(self):
+        """读取线程：接收各工作进程的消息"""
+        while True:
+            with self._lock:
+                if self._closing:
+                    return
+                workers = {worker.conn: worker for worker in self._workers if worker.alive}
+            for conn in connection.wait(list(workers) + [self._wakeup_recv]):
+                if conn is self._wakeup_recv:
+                    conn.recv_bytes()
+                    continue
+                worker = workers[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    self._lost(worker)
+                    continue
+                self._handle(worker, message)
+
+    def _handle(self, worker: _Worker, message: tuple):
+        kind = message[0]
+        if kind == "chunk":
+            _, job_id, slot, size, codec, sample_rate, channels = message
+            offset = slot * self.config.slot_bytes
+            data = bytes(worker.shm.buf[offset:offset + size])
+            try:
+                worker.send(("free", slot))
+            except OSError:
+                pass  # 工作进程已退出
+            job = worker.job
+            self._stats["chunks"] += 1
+            self._stats["bytes"] += size
+            if job is not None and job.id == job_id and not job.closed:
+                job.deliver(AudioChunk(data, codec, sample_rate, channels))
+        elif kind == "end":
+            _, job_id, error = message
+            with self._lock:
+                job = worker.job
+                worker.job = None
+                worker.jobs += 1
+                worker.busy_seconds += time.monotonic() - worker.started_job
+                if error is not None:
+                    self._stats["errors"] += 1
+                self._dispatch()
+            if error is not None:
+                log.error(f"合成进程{worker.index}合成失败: {error}")
+            if job is not None and job.id == job_id:
+                job.deliver(error)
+        elif kind == "ready":
+            with self._ready:
+                worker.ready = True
+                self._cache_params = message[2]
+                self._ready.notify_all()
+                self._dispatch()
+            log.info(f"合成进程{worker.index}(pid {message[1]})已加载引擎")
+        elif kind == "failed":
+            log.error(f"合成进程{worker.index}加载引擎失败: {message[1]}")
+            self._retire(worker, restart=False)
+
+    def _lost(self, worker: _Worker):
+        """工作进程意外退出，本句以错误结束，按配置重新启动"""
+        if self._closing:
+            return
+        worker.process.join(1)
+        log.error(f"合成进程{worker.index}意外退出，退出码{worker.process.exitcode}")
+        # 加载引擎之前就退出的进程重启后多半仍会退出，不再重启
+        self._retire(worker, restart=self.config.restart and worker.ready)
+
+    def _retire(self, worker: _Worker, restart: bool):
+        with self._ready:
+            if self._closing:
+                return
+            worker.alive = False
+            job, worker.job = worker.job, None
+            if restart:
+                self._workers[self._workers.index(worker)] = self._spawn(worker.index)
+                self._stats["restarts"] += 1
+            orphans = []
+            if not any(other.alive for other in self._workers):
+                # 没有可用的工作进程，待合成的句子全部失败
+                orphans, self._pending = list(self._pending), deque()
+            self._ready.notify_all()
+        worker.process.join(1)
+        worker.release()
+        if job is not None:
+            job.deliver("工作进程意外退出")
+        for orphan in orphans:
+            orphan.deliver("没有可用的合成进程")
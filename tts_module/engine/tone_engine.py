@@ -0,0 +1,121 @@
+import asyncio
+import math
+import struct
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+from log import log
+from .base_engine import TTSEngine
+from ..audio_chunk import AudioChunk
+
+# 每个字对应的元音共振峰（Hz），按字符编码轮流选取
+FORMANTS = ((730, 1090, 2440), (270, 2290, 3010), (300, 870, 2240), (530, 1840, 2480), (570, 840, 2410))
+PAUSES = set("，。！？；：、,.!?;:…—")
+
+
+class ToneConfig(BaseModel):
+    sample_rate: int = 24000
+    char_seconds: float = 0.16  # 每个字的时长
+    pause_seconds: float = 0.12  # 标点处的停顿
+    chunk_seconds: float = 0.2  # 每个音频块的时长
+    oversample: int = 8  # 内部过采样倍数，决定合成的计算量，默认实时率约0.2，与CPU上的本地模型相近
+    load_seconds: float = 0.0  # 模拟加载模型的耗时，每个引擎实例只加载一次
+
+
+def wav_header(sample_rate: int, channels: int = 1) -> bytes:
+    """流式WAV头，数据长度未知时按惯例写0xFFFFFFFF"""
+    byte_rate = sample_rate * channels * 2
+    return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * 2, 16)
+            + b"data" + struct.pack("<I", 0xFFFFFFFF))
+
+
+class ToneEngine(TTSEngine):
+    """确定性的本地合成器，用于离线测试和基准测试
+
+    按字符编码为每个字选择音高和共振峰，逐采样点用纯Python的共振滤波器合成，
+    同一文本总是得到相同的音频。合成全程持有GIL，与CPU密集的本地模型一样，
+    放在线程池里并发合成时只能用到一个核，需要配合ProcessEngine在多进程中运行。
+    synthesize在线程中逐块合成，不阻塞事件循环，但仍与事件循环争用GIL。
+    输出16位单声道的流式WAV，首块带WAV头。
+    """
+    def __init__(self, config: Optional[ToneConfig] = None):
+        self.config = config or ToneConfig()
+        self._load()
+
+    def _load(self):
+        """预先计算各共振峰的滤波器系数，相当于本地模型加载"""
+        begin = time.perf_counter()
+        rate = self.config.sample_rate * self.config.oversample
+        self._filters: List[Tuple[Tuple[float, float], ...]] = []
+        for formants in FORMANTS:
+            coefficients = []
+            for frequency in formants:
+                radius = math.exp(-math.pi * 80 / rate)
+                coefficients.append((2 * radius * math.cos(2 * math.pi * frequency / rate), -radius * radius))
+            self._filters.append(tuple(coefficients))
+        if self.config.load_seconds:
+            time.sleep(self.config.load_seconds)
+        log.info(f"ToneEngine加载完成 耗时:{time.perf_counter()-begin:.3f}s")
+
+    def cache_params(self) -> Dict:
+        return {"engine": "tone", **self.config.model_dump(exclude={"load_seconds"})}
+
+    def render(self, text: str) -> Iterator[bytes]:
+        """逐块产出文本的PCM数据，不含WAV头"""
+        config = self.config
+        rate = config.sample_rate
+        chunk_frames = max(1, int(rate * config.chunk_seconds))
+        buffer = bytearray()
+        for char in text:
+            if char.isspace():
+                continue
+            if char in PAUSES:
+                buffer += bytes(int(rate * config.pause_seconds) * 2)
+            else:
+                buffer += self._voice(ord(char), int(rate * config.char_seconds))
+            while len(buffer) >= chunk_frames * 2:
+                yield bytes(buffer[:chunk_frames * 2])
+                del buffer[:chunk_frames * 2]
+        if buffer:
+            yield bytes(buffer)
+
+    def _voice(self, code: int, frames: int) -> bytes:
+        """一个字的音频：脉冲串激励经过三个共振滤波器，按过采样倍数求平均降采样，首尾渐入渐出"""
+        oversample = self.config.oversample
+        period = self.config.sample_rate * oversample / (110 + code % 13 * 12)
+        filters = self._filters[code % len(self._filters)]
+        states = [[0.0, 0.0] for _ in filters]
+        ramp = max(1, frames // 8)
+        scale = 1200 / oversample ** 2  # 共振峰增益和求和都随过采样倍数增大
+        samples = []
+        phase = 0.0
+        for n in range(frames):
+            total = 0.0
+            for _ in range(oversample):
+                phase += 1.0
+                excitation = 0.0
+                if phase >= period:
+                    phase -= period
+                    excitation = 1.0
+                for (a1, a2), state in zip(filters, states):
+                    y = excitation + a1 * state[0] + a2 * state[1]
+                    state[1] = state[0]
+                    state[0] = y
+                    total += y
+            gain = min(1.0, n / ramp, (frames - n) / ramp)
+            samples.append(max(-32767, min(32767, int(total * gain * scale))))
+        return struct.pack(f"<{frames}h", *samples)
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        synthesis_start = time.time()
+        header = wav_header(self.config.sample_rate)
+        chunks = self.render(text)
+        # 每块在线程中合成，事件循环在块之间和GIL切换间隔内仍能处理交接、取消等任务
+        while (data := await asyncio.to_thread(next, chunks, None)) is not None:
+            if header:
+                data = header + data
+                header = b""
+            yield AudioChunk(data, "wav", self.config.sample_rate, 1)
+        log.info(f"TTS合成完成 耗时:{time.time()-synthesis_start:.3f}s")
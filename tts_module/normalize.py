@@ -0,0 +1,342 @@
+"""合成前的文本规范化
+
+LLM输出的Markdown标记、代码块、链接、表格和emoji不适合朗读，直接合成既浪费合成时间也拉长音频。
+TextNormalizer逐块处理文本流：去掉或压缩不可朗读的内容，把数字、日期、时间和单位展开为中文读法。
+
+跨文本块的结构不会被截断：行首标记、表格行和代码块围栏等待整行，未闭合的链接等待闭合，
+末尾的数字、单位、网址等ASCII片段等待下一个分隔字符，等待的字数以max_hold为上限。
+常见的展开结果缓存在lru_cache中。
+"""
+import re
+from functools import lru_cache
+from typing import AsyncGenerator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel
+
+from tts_module.sentences import PUNCTUATIONS
+
+
+class NormalizeConfig(BaseModel):
+    markdown: bool = True  # 去掉Markdown标记，链接只保留文字，表格行改为逗号分隔
+    code_placeholder: str = "代码略。"  # 代码块替换成的文字，为空时直接丢弃
+    urls: str = "domain"  # 裸网址的处理："domain" 只读域名；"drop" 丢弃
+    emoji: bool = True  # 去掉emoji
+    numbers: bool = True  # 数字、日期、时间和单位展开为中文读法
+    max_hold: int = 200  # 等待未闭合结构的最大字数，超过后按普通文本输出
+
+
+DIGITS = "零一二三四五六七八九"
+_SMALL_UNITS = ("", "十", "百", "千")
+_BIG_UNITS = ("", "万", "亿", "万亿")
+
+UNIT_NAMES = {
+    "km/h": "千米每小时", "m/s": "米每秒", "°C": "摄氏度", "℃": "摄氏度", "°F": "华氏度", "℉": "华氏度",
+    "km": "千米", "cm": "厘米", "mm": "毫米", "m": "米", "kg": "千克", "mg": "毫克", "g": "克",
+    "ml": "毫升", "mL": "毫升", "L": "升", "ms": "毫秒", "min": "分钟", "h": "小时", "s": "秒",
+    "mAh": "毫安时", "TB": "TB", "GB": "GB", "MB": "MB", "KB": "KB", "kB": "KB",
+    "%": "", "‰": "",
+}
+CURRENCIES = {"$": "美元", "¥": "元", "￥": "元", "€": "欧元", "£": "英镑"}
+
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+_SHORT = r"\d{1,4}(?:\.\d+)?"  # 范围两端，避免把电话号码、编号当作范围
+_UNIT = "|".join(re.escape(unit) for unit in sorted(UNIT_NAMES, key=len, reverse=True))
+_TOKEN = re.compile(
+    r"(?<![A-Za-z_\d.:/])(?:"
+    r"(?P<date>(?P<y>\d{4})[-/.](?P<mo>\d{1,2})[-/.](?P<d>\d{1,2}))"
+    r"|(?P<time>(?P<h>\d{1,2}):(?P<mi>\d{2})(?::(?P<s>\d{2}))?)"
+    rf"|(?P<cur>[$¥￥€£])\s?(?P<amount>{_NUMBER})"
+    rf"|(?P<range>(?P<low>{_SHORT})\s?[-~～]\s?(?P<high>{_SHORT}))(?:\s?(?P<range_unit>{_UNIT})(?![A-Za-z]))?"
+    rf"|(?P<num>{_NUMBER})(?:\s?(?P<unit>{_UNIT})(?![A-Za-z]))?"
+    r")(?!\d|[.:/]\d|[A-Za-z_])"
+)
+# 网址只含可打印ASCII（不含引号和括号），紧跟的中文不会被并入网址，与_TAIL按ASCII截断的流式边界一致
+_URL = re.compile(r"(?:https?://|www\.)[!#-&*-;=?-Z\\^-z|~]+")
+_LINK = re.compile(r"(!?)\[([^\]\n]*)\]\([^)\n]*\)")
+_MARKS = re.compile(r"\*+|_{2,}|~~|`+")
+_EMOJI = re.compile("[\U0001F000-\U0001FAFF☀-➿⬀-⯿️‍⃣]")
+# 可能尚未结束的ASCII片段（数字、单位、网址、英文单词），数字与单位之间可以有一个空格
+_TAIL = re.compile(r"(?:[\x21-\x7e°℃℉‰¥￥€£～]*[\d$¥￥€£~～-]\s)?[\x21-\x7e°℃℉‰¥￥€£～]+\s?$")
+_OPEN_LINK = re.compile(r"\[[^\]\n]*(?:\](?:\([^)\n]*)?)?")
+_FENCE = re.compile(r"\s{0,3}(?:```|~~~)")
+_RULE = re.compile(r"\s{0,3}([-*_])(?:\s*\1){2,}\s*")
+_TABLE_SEPARATOR = re.compile(r"\s*\|?\s*:?-{3,}:?\s*(?:\|\s*:?-{3,}:?\s*)*\|?\s*")
+_PREFIX = re.compile(r"\s{0,3}(?:(?P<heading>#{1,6}\s+)|(?P<quote>(?:>\s?)+)|(?P<item>(?:[-*+]|\d{1,3}[.)])\s+)"
+                     r"|(?P<table>\|))?")
+# 行首只有这些字符时还不能确定行的类型
+_UNDECIDED = re.compile(r"\s*(?:#{1,6}|>|[-*+]|\d{1,3}[.)]?|`{1,3}|~{1,3}|(?:[-*_]\s*)+)?")
+_ENDS_SENTENCE = frozenset(PUNCTUATIONS + "、）)」』》\"'")
+
+
+def read_digits(text: str) -> str:
+    """逐位读数字串"""
+    return "".join(DIGITS[int(char)] for char in text)
+
+
+def _read_group(group: int) -> str:
+    """读1~9999"""
+    result = ""
+    zero = False
+    for position in range(3, -1, -1):
+        digit = group // 10 ** position % 10
+        if digit == 0:
+            zero = bool(result)
+            continue
+        if zero:
+            result += "零"
+            zero = False
+        result += DIGITS[digit] + _SMALL_UNITS[position]
+    return result
+
+
+@lru_cache(maxsize=4096)
+def read_integer(text: str) -> str:
+    """整数读法，以0开头或超过8位（电话号码、编号）时逐位读"""
+    if len(text) > 8 or len(text) > 1 and text.startswith("0"):
+        return read_digits(text)
+    return read_cardinal(int(text))
+
+
+def read_cardinal(value: int) -> str:
+    """按数值读整数，不做逐位判断，超出万亿级时逐位读"""
+    if value == 0:
+        return "零"
+    if value >= 10000 ** len(_BIG_UNITS):
+        return read_digits(str(value))
+    groups = []
+    while value:
+        groups.append(value % 10000)
+        value //= 10000
+    result = ""
+    zero = False
+    for index in range(len(groups) - 1, -1, -1):
+        group = groups[index]
+        if group == 0:
+            zero = bool(result)
+            continue
+        if result and (zero or group < 1000):
+            result += "零"
+        result += _read_group(group) + _BIG_UNITS[index]
+        zero = False
+    return result[1:] if result.startswith("一十") else result
+
+
+def read_number(text: str) -> str:
+    """带千分位或小数的数字读法，带千分位的整数总是按数值读"""
+    integer, _, fraction = text.partition(".")
+    result = read_cardinal(int(integer.replace(",", ""))) if "," in integer else read_integer(integer)
+    return f"{result}点{read_digits(fraction)}" if fraction else result
+
+
+def _with_unit(number: str, unit: Optional[str]) -> str:
+    if unit == "%":
+        return "百分之" + number
+    if unit == "‰":
+        return "千分之" + number
+    return number + UNIT_NAMES[unit] if unit else number
+
+
+@lru_cache(maxsize=4096)
+def expand_token(token: str) -> str:
+    """展开一个数字片段（日期、时间、金额、范围、带单位的数字），无法识别时原样返回"""
+    match = _TOKEN.fullmatch(token)
+    if match is None:
+        return token
+    if match["date"]:
+        month, day = int(match["mo"]), int(match["d"])
+        if 1 <= month <= 12 and 1 <= day <= 31:
+            return f"{read_digits(match['y'])}年{read_integer(str(month))}月{read_integer(str(day))}日"
+        return token
+    if match["time"]:
+        hour, minute = int(match["h"]), int(match["mi"])
+        if hour > 24 or minute > 59:
+            return token
+        result = f"{read_integer(str(hour))}点"
+        if minute:
+            result += ("零" if minute < 10 else "") + f"{read_integer(str(minute))}分"
+        if match["s"] and int(match["s"]):
+            result += f"{read_integer(str(int(match['s'])))}秒"
+        return result
+    if match["cur"]:
+        return read_number(match["amount"]) + CURRENCIES[match["cur"]]
+    if match["range"]:
+        unit = match["range_unit"]
+        if unit in ("%", "‰"):
+            return f"{_with_unit(read_number(match['low']), unit)}到{_with_unit(read_number(match['high']), unit)}"
+        return _with_unit(f"{read_number(match['low'])}到{read_number(match['high'])}", unit)
+    return _with_unit(read_number(match["num"]), match["unit"])
+
+
+def _year(match: re.Match) -> str:
+    return read_digits(match.group())
+
+
+_YEAR = re.compile(r"(?<![\d.])\d{4}(?=年)")
+
+
+class TextNormalizer:
+    """逐块规范化文本流，一个实例对应一个回复"""
+    def __init__(self, config: Optional[NormalizeConfig] = None):
+        """
+        Args:
+            config: 规范化配置，为空时使用默认配置
+        """
+        self.config = config or NormalizeConfig()
+        self.reset()
+
+    def reset(self):
+        self._pending = ""  # 尚未输出的文本
+        self._in_code = False
+        self._kind: Optional[str] = None  # 当前行的类型，None表示本行还没有输出
+        self._last = ""  # 最近输出的非空白字符
+        self.chars_in = 0
+        self.chars_out = 0
+
+    async def normalize(self, text_generator: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+        """规范化文本流"""
+        self.reset()
+        async for text in text_generator:
+            if out := self.feed(text):
+                yield out
+        if out := self.flush():
+            yield out
+
+    def feed(self, text: str) -> str:
+        """输入一个文本块，返回可以确定的规范化结果，其余部分等待后续文本"""
+        self.chars_in += len(text)
+        self._pending += text
+        return self._drain(final=False)
+
+    def flush(self) -> str:
+        """文本结束，输出剩余部分"""
+        return self._drain(final=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {"chars_in": self.chars_in, "chars_out": self.chars_out}
+
+    def _drain(self, final: bool) -> str:
+        out = []
+        while (newline := self._pending.find("\n")) >= 0:
+            line, self._pending = self._pending[:newline], self._pending[newline + 1:]
+            out.append(self._line(line, True))
+        if final:
+            if self._pending:
+                out.append(self._line(self._pending, False))
+            self._pending = ""
+            self._in_code = False
+            self._kind = None
+        elif self._pending:
+            out.append(self._partial())
+        result = "".join(out)
+        self.chars_out += len(result)
+        if stripped := result.rstrip():
+            self._last = stripped[-1]
+        return result
+
+    def _line(self, line: str, newline: bool) -> str:
+        """处理完整的一行（或文本结束时剩余的部分行）"""
+        kind, self._kind = self._kind, None
+        if self._in_code:
+            if _FENCE.match(line) and not line.strip().strip("`~"):
+                self._in_code = False
+            return ""
+        text = ""
+        if kind is None:
+            if self.config.markdown:
+                if _FENCE.match(line):
+                    self._in_code = newline
+                    return self.config.code_placeholder
+                if _RULE.fullmatch(line):
+                    return "\n" if newline else ""
+                kind, line = self._classify(line)
+                if kind == "table":
+                    if _TABLE_SEPARATOR.fullmatch(line):
+                        return ""
+                    cells = [cell.strip() for cell in line.strip().strip("|").split("|")]
+                    line = "，".join(cell for cell in cells if cell)
+            else:
+                kind = "plain"
+        text = self._inline(line)
+        if kind not in ("plain", "quote") and (text.strip() or kind != "table"):
+            last = text.rstrip()[-1:] or self._last
+            if last and last not in _ENDS_SENTENCE:
+                # 标题、列表项和表格行没有结尾标点，补上句号以便分句
+                text += "。"
+        return text + "\n" if newline else text
+
+    def _classify(self, line: str) -> Tuple[str, str]:
+        """识别行首标记，返回(类型, 去掉标记后的内容)"""
+        match = _PREFIX.match(line)
+        for kind in ("heading", "quote", "item"):
+            if match[kind]:
+                return kind, line[match.end():]
+        if match["table"] and line.rstrip().endswith("|"):
+            return "table", line
+        return "plain", line
+
+    def _partial(self) -> str:
+        """处理不完整的最后一行，只输出不会被后续文本改变的部分"""
+        pending = self._pending
+        hold_limit = self.config.max_hold
+        if self._in_code:
+            return ""
+        if self._kind is None:
+            if not self.config.markdown:
+                self._kind = "plain"
+            elif len(pending) > hold_limit:
+                self._kind = "plain"  # 行首标记等待过久，按普通文本处理
+            elif _UNDECIDED.fullmatch(pending) or _FENCE.match(pending):
+                return ""
+            else:
+                kind, content = self._classify(pending)
+                if kind == "table" or pending.lstrip().startswith("|"):
+                    return ""  # 表格行等待整行
+                self._kind = kind
+                pending = content
+        cut = len(pending)
+        if tail := _TAIL.search(pending):
+            cut = tail.start()
+        if self.config.markdown:
+            for link in _LINK.finditer(pending):
+                if link.start() < cut < link.end():
+                    cut = link.start()  # 不截断已闭合的链接
+            start = pending.rfind("[")
+            if start >= 0 and _OPEN_LINK.fullmatch(pending, start) and len(pending) - start <= hold_limit:
+                cut = min(cut, start - 1 if start and pending[start - 1] == "!" else start)
+        if not cut and len(pending) > hold_limit:
+            cut = len(pending)
+        self._pending = pending[cut:]
+        return self._inline(pending[:cut])
+
+    def _inline(self, text: str) -> str:
+        """行内规范化，text不会截断链接、网址和数字片段"""
+        config = self.config
+        if not text:
+            return text
+        if config.markdown:
+            text = _LINK.sub(lambda match: "" if match[1] else match[2], text)
+            text = _MARKS.sub("", text)
+        if config.emoji:
+            text = _EMOJI.sub("", text)
+        parts = []
+        pos = 0
+        for match in _URL.finditer(text):
+            parts.append(self._speakable(text[pos:match.start()]))
+            if config.urls == "domain":
+                parts.append(_domain(match.group()))
+            pos = match.end()
+        parts.append(self._speakable(text[pos:]))
+        return "".join(parts)
+
+    def _speakable(self, text: str) -> str:
+        if not self.config.numbers or not text:
+            return text
+        text = _YEAR.sub(_year, text)
+        return _TOKEN.sub(lambda match: expand_token(match.group()), text)
+
+
+@lru_cache(maxsize=1024)
+def _domain(url: str) -> str:
+    netloc = urlsplit(url if "://" in url else "http://" + url).netloc
+    return netloc[4:] if netloc.startswith("www.") else netloc
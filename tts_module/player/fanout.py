@@ -0,0 +1,183 @@
+"""把同一份合成音频分发给多个输出端"""
+import threading
+from typing import Dict, List, Optional
+
+from log import log
+from ..audio_chunk import AudioChunk, is_end
+
+POLICIES = ("wait", "drop", "detach")
+
+
+def _close(sink):
+    """丢弃输出端排队的音频并停止"""
+    flush = getattr(sink, "flush", None)
+    if flush:
+        flush()
+    sink.stop()
+
+
+class _Branch:
+    """一个输出端及其落后时的处理方式，计数由分发线程更新、其他线程读取，用锁保护"""
+    def __init__(self, name: str, sink, policy: str):
+        self.name = name
+        self.sink = sink
+        self.policy = policy
+        self.writable = getattr(sink, "writable", None)
+        self.skipping = False  # 本句剩余部分已丢弃，下一句开始时恢复
+        self.delivered = 0
+        self.dropped_chunks = 0
+        self.dropped_bytes = 0
+        self.dropped_sentences = 0
+        self.detached = False
+        self._lock = threading.Lock()
+
+    def deliver(self, size: int):
+        with self._lock:
+            self.delivered += size
+
+    def drop(self, size: int, sentence: bool = False):
+        with self._lock:
+            self.dropped_chunks += 1
+            self.dropped_bytes += size
+            if sentence:
+                self.dropped_sentences += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = {"name": self.name, "policy": self.policy, "delivered": self.delivered,
+                     "dropped_chunks": self.dropped_chunks, "dropped_bytes": self.dropped_bytes,
+                     "dropped_sentences": self.dropped_sentences, "detached": self.detached}
+        queue_stats = getattr(self.sink, "queue_stats", None)
+        if queue_stats:
+            stats["queue"] = queue_stats()
+        return stats
+
+
+class FanOutPlayer:
+    """把音频块分发给多个输出端的播放器
+
+    所有输出端共享同一个只读的音频缓冲，不复制数据。每个输出端的落后量由它自己的队列额度限定，
+    超出时按策略处理：
+        wait    上游等待该输出端，主播放设备使用，决定整个管线的节奏
+        drop    丢弃本句剩余的音频，下一句从头恢复，适合录音、旁路设备
+        detach  移除该输出端，适合网络客户端
+    没有writable方法的输出端视为不会落后。
+    """
+    def __init__(self, sinks: Optional[Dict[str, object]] = None, policy: str = "drop"):
+        """
+        Args:
+            sinks: 名称到输出端的映射，第一个输出端使用wait策略，其余使用policy
+            policy: 其余输出端落后时的处理方式
+        """
+        self._branches: List[_Branch] = []
+        self.detached: List[_Branch] = []  # 因落后被移除的输出端
+        self._lock = threading.Lock()
+        self.is_active = False
+        for index, (name, sink) in enumerate((sinks or {}).items()):
+            self.add_sink(name, sink, "wait" if index == 0 else policy)
+
+    def add_sink(self, name: str, sink, policy: str = "drop"):
+        """添加输出端，播放器已启动时立即启动它，下一个音频块开始分发"""
+        if policy not in POLICIES:
+            raise ValueError(f"未知的落后处理方式: {policy}")
+        with self._lock:
+            if any(branch.name == name for branch in self._branches):
+                raise ValueError(f"输出端{name}已存在")
+        if self.is_active:
+            sink.start()
+        with self._lock:
+            self._branches = self._branches + [_Branch(name, sink, policy)]
+        log.info(f"添加输出端{name}，落后时{policy}")
+
+    def remove_sink(self, name: str, stop: bool = True):
+        """移除输出端，stop为True时停止它"""
+        with self._lock:
+            branch = next((branch for branch in self._branches if branch.name == name), None)
+            if branch is None:
+                return
+            self._branches = [other for other in self._branches if other is not branch]
+        if stop and self.is_active:
+            branch.sink.stop()
+
+    @property
+    def sinks(self) -> Dict[str, object]:
+        return {branch.name: branch.sink for branch in self._branches}
+
+    def start(self):
+        self.is_active = True
+        for branch in self._branches:
+            branch.sink.start()
+
+    def stop(self):
+        self.is_active = False
+        for branch in self._branches:
+            branch.sink.stop()
+
+    def add_chunk(self, chunk: AudioChunk):
+        if not chunk.data.readonly:
+            # 输出端之间共享缓冲，只读视图防止某个输出端改写其他输出端的数据
+            chunk = AudioChunk(chunk.data.toreadonly(), chunk.codec, chunk.sample_rate, chunk.channels,
+                               chunk.end, chunk.sequence)
+        end = is_end(chunk)
+        size = len(chunk)
+        for branch in self._branches:
+            if end:
+                branch.skipping = False
+            elif branch.skipping:
+                branch.drop(size)
+                continue
+            elif branch.policy != "wait" and branch.writable and not branch.writable(size):
+                self._lagging(branch, size)
+                continue
+            branch.sink.add_chunk(chunk)
+            if not end:
+                branch.deliver(size)
+
+    def _lagging(self, branch: _Branch, size: int):
+        branch.drop(size, sentence=branch.policy == "drop")
+        if branch.policy == "drop":
+            branch.skipping = True
+            log.info(f"输出端{branch.name}落后，丢弃本句剩余音频")
+            return
+        branch.detached = True
+        with self._lock:
+            self._branches = [other for other in self._branches if other is not branch]
+        self.detached.append(branch)
+        log.info(f"输出端{branch.name}落后，已移除")
+        # 停止可能要等慢输出端写完，不占用分发线程
+        threading.Thread(target=_close, args=(branch.sink,), daemon=True).start()
+
+    async def wait_writable(self, size: int = 0):
+        """等待所有wait策略的输出端有额度"""
+        for branch in self._branches:
+            if branch.policy == "wait":
+                wait_writable = getattr(branch.sink, "wait_writable", None)
+                if wait_writable:
+                    await wait_writable(size)
+
+    def playing(self) -> bool:
+        """任一输出端还有排队或正在播放的音频，输出端不提供playing时视为正在播放"""
+        for branch in self._branches:
+            playing = getattr(branch.sink, "playing", None)
+            if playing is None or playing():
+                return True
+        return False
+
+    def flush(self):
+        for branch in self._branches:
+            branch.skipping = False
+            flush = getattr(branch.sink, "flush", None)
+            if flush:
+                flush()
+
+    def queue_stats(self) -> Dict[str, float]:
+        """第一个wait策略输出端的队列统计，它决定管线的节奏"""
+        for branch in self._branches:
+            queue_stats = getattr(branch.sink, "queue_stats", None)
+            if branch.policy == "wait" and queue_stats:
+                return queue_stats()
+        return {"items": 0, "bytes": 0, "peak_items": 0, "peak_bytes": 0, "blocked": 0, "blocked_seconds": 0.0}
+
+    def sink_stats(self) -> List[Dict]:
+        """各输出端的分发、丢弃和队列统计，包括已移除的输出端"""
+        return [branch.stats() for branch in self._branches + self.detached]
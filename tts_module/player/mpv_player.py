@@ -1,36 +1,226 @@
+import json
+import os
+import socket
 import subprocess
+import sys
+import tempfile
 import threading
 import queue
+import time
+from itertools import count
+from typing import Callable, Dict, List, Optional, Tuple
 from log import log
+from ..audio_chunk import AudioChunk, is_end, payload
+from ..backpressure import BoundedQueue, StageStats
+
+_ipc_ids = count(1)
+# 估算已写入音频的播放时长：mp3的码率未知，按较低的32kbps估算，宁可多估
+_MP3_BYTES_PER_SECOND = 4000
+_IDLE_MARGIN = 0.5  # mpv的输出缓冲等带来的额外延迟（秒）
+
+
+def _entry_size(entry) -> int:
+    chunk = entry[1]
+    return len(chunk) if chunk is not None else 0
+
+
+def _byte_rate(chunk) -> Optional[float]:
+    """音频块每秒的字节数，格式未知时为None"""
+    if not isinstance(chunk, AudioChunk):
+        return None
+    if chunk.codec in ("wav", "pcm") and chunk.sample_rate:
+        return chunk.sample_rate * (chunk.channels or 1) * 2
+    if chunk.codec == "mp3":
+        return _MP3_BYTES_PER_SECOND
+    return None
+
+
+class MPVIPC:
+    """mpv的JSON IPC客户端，POSIX上为unix socket，Windows上为命名管道"""
+    def __init__(self, path: str, connect_timeout: float = 3.0, timeout: float = 1.0):
+        self.path = path
+        self.timeout = timeout
+        self._request_ids = count(1)
+        self._lock = threading.Lock()
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                self._reader, self._writer = self._connect()
+                break
+            except OSError:
+                # mpv启动后才会创建IPC端点
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.01)
+
+    def _connect(self):
+        if sys.platform == "win32":
+            pipe = open(self.path, "r+b", buffering=0)
+            return pipe, pipe
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        sock.settimeout(self.timeout)
+        self._sock = sock
+        return sock.makefile("rb"), sock.makefile("wb", buffering=0)
+
+    def command(self, *args, wait: bool = True) -> Optional[dict]:
+        """发送命令，wait为True时等待对应request_id的回复"""
+        with self._lock:
+            request_id = next(self._request_ids)
+            message = json.dumps({"command": list(args), "request_id": request_id}) + "\n"
+            self._writer.write(message.encode("utf-8"))
+            if not wait:
+                return None
+            deadline = time.monotonic() + self.timeout
+            while time.monotonic() < deadline:
+                line = self._reader.readline()
+                if not line:
+                    return None
+                reply = json.loads(line)
+                if reply.get("request_id") == request_id:
+                    return reply
+            return None
+
+    def close(self):
+        for f in (self._reader, self._writer):
+            try:
+                f.close()
+            except OSError:
+                pass
+        if getattr(self, "_sock", None):
+            self._sock.close()
+
+
+class _MPVProcess:
+    """一个从stdin读取音频的mpv进程及其IPC连接"""
+    def __init__(self, command: list, ipc_path: Optional[str]):
+        self.ipc_path = ipc_path
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.ipc: Optional[MPVIPC] = None
+        if ipc_path:
+            try:
+                self.ipc = MPVIPC(ipc_path)
+            except OSError as e:
+                log.error(f"连接mpv IPC失败: {e}")
+
+    def write(self, chunk: bytes):
+        self.process.stdin.write(chunk)
+        self.process.stdin.flush()
+
+    def close(self):
+        """通过IPC立即停止播放并结束进程"""
+        if self.ipc:
+            try:
+                self.ipc.command("stop", wait=False)
+            except OSError:
+                pass
+        # 先结束进程，阻塞在write上的写线程随之收到BrokenPipe并释放stdin
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        try:
+            if self.process.stdin:
+                self.process.stdin.close()
+        except OSError:
+            pass
+        if self.ipc:
+            self.ipc.close()
+        if self.ipc_path and sys.platform != "win32":
+            try:
+                os.unlink(self.ipc_path)
+            except OSError:
+                pass
+
 
 class MPVPlayer:
-    def __init__(self, audio_device=None):
+    def __init__(self, audio_device=None, ipc: bool = True, warm_standby: bool = True, mpv_path: str = "mpv",
+                 queue_items: int = 256, queue_bytes: int = 1024 * 1024):
+        """
+        Args:
+            audio_device: 音频输出设备
+            ipc: 是否启用mpv的IPC控制，用于即时停止和跳转
+            warm_standby: 是否预先启动一个备用mpv进程，打断后直接切换
+            mpv_path: mpv可执行文件路径
+            queue_items: 待写入mpv的块数上限，0表示不限
+            queue_bytes: 待写入mpv的字节上限，0表示不限
+        """
         self.mpv_process = None
-        self.chunk_queue = queue.Queue()
+        self.chunk_queue = BoundedQueue(queue_items, queue_bytes, _entry_size, StageStats("player"))
         self.is_active = False
         self.audio_device = audio_device
         self.play_thread = None
         self.first_chunk = True
+        self.ipc = ipc
+        self.warm_standby = warm_standby
+        self.mpv_path = mpv_path
+        self._current: Optional[_MPVProcess] = None
+        self._standby: Optional[_MPVProcess] = None
+        self._standby_thread: Optional[threading.Thread] = None
+        self._generation = 0
+        self._proc_lock = threading.Lock()
+        self._drain_at = 0.0  # 已写入mpv的音频预计播完的时间（time.monotonic）
+        self._switched = threading.Event()  # 最近一次打断的进程切换已完成
+        self._switched.set()
+        self._switch_lock = threading.Lock()
+        self._switch_thread: Optional[threading.Thread] = None
+        self._on_playback: Optional[Callable[[int, str, float], None]] = None
+        self._due: List[Tuple[float, int, str, int]] = []  # 按_drain_at估算的(时刻, 序号, 时间点, 代)，到时报告
+        self._started: Optional[int] = None  # 已安排开始播放报告的序号
 
-    def start(self):
-        if self.is_active:
-            return
-
-        mpv_command = ["mpv", "--no-cache", "--no-terminal"]
+    def _command(self, ipc_path: Optional[str]) -> list:
+        mpv_command = [self.mpv_path, "--no-cache", "--no-terminal"]
         if self.audio_device:
             mpv_command.extend([
                 "--ao=wasapi",
                 f"--audio-device=wasapi/{self.audio_device['name']}"
             ])
+        if ipc_path:
+            mpv_command.append(f"--input-ipc-server={ipc_path}")
         mpv_command.extend(["--", "fd://0"])
+        return mpv_command
 
-        self.mpv_process = subprocess.Popen(
-            mpv_command,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+    def _spawn(self) -> _MPVProcess:
+        ipc_path = None
+        if self.ipc:
+            name = f"mpv-{os.getpid()}-{next(_ipc_ids)}"
+            if sys.platform == "win32":
+                ipc_path = rf"\\.\pipe\{name}"
+            else:
+                ipc_path = os.path.join(tempfile.gettempdir(), f"{name}.sock")
+        return _MPVProcess(self._command(ipc_path), ipc_path)
+
+    def _spawn_standby(self):
+        """后台启动备用进程"""
+        if not self.warm_standby:
+            return
+
+        def spawn():
+            standby = self._spawn()
+            with self._proc_lock:
+                if self.is_active and self._standby is None:
+                    self._standby = standby
+                    return
+            standby.close()
+
+        self._standby_thread = threading.Thread(target=spawn, daemon=True)
+        self._standby_thread.start()
+
+    def start(self):
+        if self.is_active:
+            return
+
+        self._current = self._spawn()
+        self.mpv_process = self._current.process
         self.is_active = True
+        self._spawn_standby()
         self.play_thread = threading.Thread(target=self._process_chunks)
         self.play_thread.start()
         log.info("MPV播放器已启动")
@@ -39,37 +229,172 @@ class MPVPlayer:
         try:
             while self.is_active or not self.chunk_queue.empty():
                 try:
-                    chunk = self.chunk_queue.get(timeout=0.5)
-                    if chunk is None:  # 收到结束标记
+                    generation, chunk = self.chunk_queue.get(timeout=self._dispatch(0.5))
+                    if is_end(chunk):  # 收到结束标记
+                        if generation == self._generation:
+                            self._schedule(getattr(chunk, "sequence", None), "playback_end", self._drain_at, generation)
                         continue  # 改为continue,继续处理下一个音频序列
-                    if self.mpv_process and self.mpv_process.stdin:
-                        if self.first_chunk:
-                            log.info(f"播放首个音频chunk")
-                            self.first_chunk = False
-                        self.mpv_process.stdin.write(chunk)
-                        self.mpv_process.stdin.flush()
+                    current = self._current
+                    if generation != self._generation or current is None:
+                        continue  # 打断前排队的音频
+                    if not self._switched.is_set():
+                        # 打断后的进程切换尚未完成，新音频等切换到新进程后再写入
+                        self._switched.wait()
+                        current = self._current
+                        if generation != self._generation or current is None:
+                            continue
+                    if self.first_chunk:
+                        log.info("播放首个音频chunk")
+                        self.first_chunk = False
+                    try:
+                        current.write(payload(chunk))
+                    except (BrokenPipeError, ValueError, OSError):
+                        # 进程已被打断切换
+                        continue
+                    if generation == self._generation:
+                        rate = _byte_rate(chunk)
+                        begin = max(self._drain_at, time.monotonic())
+                        sequence = getattr(chunk, "sequence", None)
+                        if sequence is not None and sequence != self._started:
+                            self._started = sequence
+                            self._schedule(sequence, "playback_start", begin, generation)
+                        self._drain_at = float("inf") if rate is None else begin + len(chunk) / rate
                 except queue.Empty:
                     continue
         finally:
-            if self.mpv_process and self.mpv_process.stdin:
-                self.mpv_process.stdin.close()
+            current = self._current
+            if current and current.process.stdin:
+                try:
+                    current.process.stdin.close()
+                except OSError:
+                    pass
+
+    def set_playback_callback(self, callback: Optional[Callable[[int, str, float], None]]):
+        """设置播放报告回调 callback(序号, "playback_start"或"playback_end", time.perf_counter()时刻)
+
+        mpv不报告播放进度，时刻按_drain_at估算：本句首块预计在之前写入的音频播完时开始，
+        写完本句后_drain_at即为预计播完的时刻，到时再报告。格式未知无法估算时不报告，被打断的句子不报告播放完。
+        """
+        self._on_playback = callback
+
+    def _schedule(self, sequence: Optional[int], point: str, at: float, generation: int):
+        if self._on_playback is not None and sequence is not None and at != float("inf"):
+            self._due.append((at, sequence, point, generation))
+
+    def _dispatch(self, timeout: float) -> float:
+        """报告已到时的播放时间点，返回距下一个时间点的等待时长，不超过timeout"""
+        now = time.monotonic()
+        due = [item for item in self._due if item[0] <= now]
+        if due:
+            self._due = [item for item in self._due if item[0] > now]
+            offset = time.perf_counter() - now
+            for at, sequence, point, generation in due:
+                if generation != self._generation:
+                    continue  # 已被打断
+                try:
+                    self._on_playback(sequence, point, at + offset)
+                except Exception as e:
+                    log.error(f"播放报告回调出错: {e}")
+        if self._due:
+            timeout = min(timeout, max(0.0, min(item[0] for item in self._due) - now))
+        return timeout
 
-    def add_chunk(self, chunk: bytes):
+    def add_chunk(self, chunk: AudioChunk):
         if self.is_active:
-            self.chunk_queue.put(chunk)
+            self.chunk_queue.put((self._generation, chunk))
+
+    async def wait_writable(self, size: int = 0):
+        """等待队列有足够额度放入size字节，mpv消费跟不上时挂起生产者"""
+        await self.chunk_queue.wait_space(size)
+
+    def writable(self, size: int = 0) -> bool:
+        """队列当前能否放入size字节，不等待"""
+        return self.chunk_queue.has_space(size)
+
+    def queue_stats(self) -> Dict[str, float]:
+        return self.chunk_queue.stats()
+
+    def playing(self) -> bool:
+        """是否还有排队或尚未播完的音频，播放时长按块的格式估算，格式未知时视为仍在播放"""
+        if not self.chunk_queue.empty():
+            return True
+        return time.monotonic() < self._drain_at + _IDLE_MARGIN
+
+    def flush(self) -> float:
+        """打断：丢弃排队的音频，在后台停止当前mpv并切换到备用进程，返回调用耗时（秒）
+
+        IPC停止和进程切换在后台线程中进行，调用方可以在持有锁时调用；
+        切换完成前播放线程不会写入新的音频，wait_switched可等待切换完成。
+        """
+        if not self.is_active:
+            return 0.0
+        start = time.monotonic()
+        self._generation += 1
+        self.chunk_queue.clear()
+        self._drain_at = 0.0
+        self._due = []
+        self._started = None
+        switched = self._switched = threading.Event()
+        self._switch_thread = threading.Thread(target=self._switch, args=(switched,), daemon=True)
+        self._switch_thread.start()
+        return time.monotonic() - start
+
+    def _switch(self, switched: threading.Event):
+        try:
+            # 连续打断时依次切换
+            with self._switch_lock:
+                self.stop_stream()
+        finally:
+            switched.set()
+
+    def wait_switched(self, timeout: Optional[float] = None) -> bool:
+        """等待最近一次打断的进程切换完成"""
+        return self._switched.wait(timeout)
+
+    def stop_stream(self):
+        """立即停止当前流：通过IPC让mpv丢弃缓冲并退出，播放切到备用进程"""
+        with self._proc_lock:
+            old = self._current
+            standby, self._standby = self._standby, None
+        if old is not None and old.ipc:
+            try:
+                old.ipc.command("stop", wait=True)
+            except (OSError, ValueError):
+                pass
+        new = standby or self._spawn()
+        with self._proc_lock:
+            self._current = new
+            self.mpv_process = new.process
+        if old is not None:
+            threading.Thread(target=old.close, daemon=True).start()
+        self._spawn_standby()
+        log.info("MPV播放已打断")
+
+    def seek(self, seconds: float, mode: str = "relative") -> Optional[dict]:
+        """在当前流中跳转，mode为relative或absolute"""
+        current = self._current
+        if current is None or current.ipc is None:
+            return None
+        return current.ipc.command("seek", seconds, mode)
 
     def stop(self):
         if not self.is_active:
             return
         self.is_active = False
-        self.chunk_queue.put(None)  # 发送结束信号
+        self.chunk_queue.put((self._generation, None))  # 发送结束信号
         if self.play_thread and self.play_thread.is_alive():
             self.play_thread.join()
-        if self.mpv_process:
-            if self.mpv_process.stdin:
-                self.mpv_process.stdin.close()
-            self.mpv_process.terminate()
-            self.mpv_process.wait()
-            self.mpv_process = None
+        if self._switch_thread and self._switch_thread.is_alive():
+            self._switch_thread.join()
+        if self._standby_thread and self._standby_thread.is_alive():
+            self._standby_thread.join()
+        with self._proc_lock:
+            current, self._current = self._current, None
+            standby, self._standby = self._standby, None
+        if standby:
+            standby.close()
+        if current:
+            current.close()
+        self.mpv_process = None
         self.first_chunk = True
-        log.info("MPV播放器已停止")
\ No newline at end of file
+        log.info("MPV播放器已停止")
@@ -0,0 +1,397 @@
+import struct
+import threading
+from collections import deque
+from typing import Any, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+
+class RingBuffer:
+    """预分配的float32环形缓冲，生产线程写入，音频回调读取
+
+    写满时write阻塞等待回调消费，形成天然的背压。
+    写入时可以在帧的位置上打标记，回调读过该位置后由passed取出，用于报告每句开始和结束播放的时刻。
+    """
+    def __init__(self, capacity: int, channels: int):
+        self._data = np.zeros((capacity, channels), dtype=np.float32)
+        self.capacity = capacity
+        self.channels = channels
+        self._read = 0
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.epoch = 0  # 每次clear加一，写入中途被清空时放弃剩余的帧
+        self._written = 0  # 累计写入的帧数
+        self._consumed = 0  # 累计读出或被清空的帧数
+        self._marks: deque = deque()  # (位置, 标记)，读到该位置后取出
+
+    @property
+    def fill(self) -> int:
+        """缓冲中待播放的帧数"""
+        return self._size
+
+    def write(self, frames: np.ndarray, epoch: Optional[int] = None, mark: Any = None) -> int:
+        """写入帧，空间不足时分段等待，返回写入的帧数
+
+        Args:
+            frames: 待写入的帧
+            epoch: 调用方读取的epoch，缓冲已被清空（epoch不同）时不再写入，为空时使用当前值
+            mark: 不为空时标记在第一帧上，第一帧被读出后可由passed取出
+        """
+        written = 0
+        total = len(frames)
+        with self._cond:
+            epoch = self.epoch if epoch is None else epoch
+            while written < total:
+                while self._size == self.capacity and not self._closed and self.epoch == epoch:
+                    self._cond.wait()
+                if self._closed or self.epoch != epoch:
+                    break
+                count = min(total - written, self.capacity - self._size)
+                start = (self._read + self._size) % self.capacity
+                first = min(count, self.capacity - start)
+                self._data[start:start + first] = frames[written:written + first]
+                if count > first:
+                    self._data[:count - first] = frames[written + first:written + count]
+                if mark is not None and not written:
+                    self._marks.append((self._written + 1, mark))
+                self._size += count
+                self._written += count
+                written += count
+        return written
+
+    def read_into(self, out: np.ndarray) -> int:
+        """读取最多len(out)帧到out，不足部分填零，返回实际读取的帧数"""
+        with self._cond:
+            count = min(len(out), self._size)
+            first = min(count, self.capacity - self._read)
+            out[:first] = self._data[self._read:self._read + first]
+            if count > first:
+                out[first:count] = self._data[:count - first]
+            self._read = (self._read + count) % self.capacity
+            self._size -= count
+            self._consumed += count
+            if count:
+                self._cond.notify_all()
+        out[count:] = 0
+        return count
+
+    def mark(self, mark: Any, epoch: Optional[int] = None):
+        """在已写入的最后一帧之后打标记，之前的帧全部读出后可由passed取出"""
+        with self._cond:
+            if epoch is None or epoch == self.epoch:
+                self._marks.append((self._written, mark))
+
+    def passed(self) -> List[Any]:
+        """取出已被读过的标记，没有时返回空列表"""
+        if not self._marks:
+            return []
+        result = []
+        with self._cond:
+            while self._marks and self._marks[0][0] <= self._consumed:
+                result.append(self._marks.popleft()[1])
+        return result
+
+    def clear(self):
+        """丢弃未播放的帧和尚未读到的标记"""
+        with self._cond:
+            self._read = 0
+            self._consumed += self._size
+            self._size = 0
+            self._marks.clear()
+            self.epoch += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class WavStreamDecoder:
+    """增量解析WAV流，返回float32帧
+
+    服务端流式返回的WAV头中数据长度常为0或0xFFFFFFFF，因此data块之后的数据全部视为音频。
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._header = bytearray()
+        self._remainder = b""
+        self.samplerate: Optional[int] = None
+        self.channels: Optional[int] = None
+        self._dtype = None
+        self._frame_bytes = 0
+        self._in_data = False
+
+    @property
+    def started(self) -> bool:
+        """是否已收到当前流的数据"""
+        return self._in_data or bool(self._header)
+
+    def pending_bytes(self) -> bytes:
+        """尚未解析完头部时已收到的原始字节"""
+        return bytes(self._header)
+
+    def feed(self, chunk) -> Optional[np.ndarray]:
+        """输入一段字节，返回解码出的帧 (n, channels)，数据不足时返回None"""
+        if not self._in_data:
+            self._header += chunk
+            body = self._parse_header()
+            if body is None:
+                return None
+            chunk = body
+        data = self._remainder + chunk if self._remainder else chunk
+        usable = len(data) - len(data) % self._frame_bytes
+        self._remainder = bytes(data[usable:])
+        if not usable:
+            return None
+        samples = np.frombuffer(data, dtype=self._dtype, count=usable // self._dtype.itemsize)
+        frames = samples.reshape(-1, self.channels)
+        if self._dtype.kind == "i":
+            return frames.astype(np.float32) / float(2 ** (8 * self._dtype.itemsize - 1))
+        if self._dtype.kind == "u":
+            return (frames.astype(np.float32) - 128.0) / 128.0
+        return frames.astype(np.float32, copy=False)
+
+    def _parse_header(self) -> Optional[bytes]:
+        """头部完整时返回data块之后的字节"""
+        header = self._header
+        if len(header) < 12:
+            return None
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise ValueError("不是WAV数据")
+        pos = 12
+        while pos + 8 <= len(header):
+            chunk_id = bytes(header[pos:pos + 4])
+            size = struct.unpack_from("<I", header, pos + 4)[0]
+            if chunk_id == b"data":
+                if self.channels is None:
+                    raise ValueError("WAV缺少fmt块")
+                self._in_data = True
+                body = bytes(header[pos + 8:])
+                self._header = bytearray()
+                return body
+            if pos + 8 + size > len(header):
+                return None
+            if chunk_id == b"fmt ":
+                fmt_tag, channels, samplerate = struct.unpack_from("<HHI", header, pos + 8)
+                bits = struct.unpack_from("<H", header, pos + 22)[0]
+                if fmt_tag == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE，子格式前两字节为实际格式
+                    fmt_tag = struct.unpack_from("<H", header, pos + 32)[0]
+                self.channels = channels
+                self.samplerate = samplerate
+                self._dtype = _wav_dtype(fmt_tag, bits)
+                self._frame_bytes = channels * bits // 8
+            pos += 8 + size + (size & 1)
+        return None
+
+
+def _wav_dtype(fmt_tag: int, bits: int) -> np.dtype:
+    if fmt_tag == 1 and bits == 8:
+        return np.dtype(np.uint8)
+    if fmt_tag == 1 and bits == 16:
+        return np.dtype("<i2")
+    if fmt_tag == 1 and bits == 32:
+        return np.dtype("<i4")
+    if fmt_tag == 3 and bits == 32:
+        return np.dtype("<f4")
+    if fmt_tag == 3 and bits == 64:
+        return np.dtype("<f8")
+    raise ValueError(f"不支持的WAV格式: tag={fmt_tag} bits={bits}")
+
+
+class LinearResampler:
+    """带状态的线性插值重采样，并把声道数映射到输出设备"""
+    def __init__(self, src_rate: int, dst_rate: int, src_channels: int, dst_channels: int):
+        self.step = src_rate / dst_rate
+        self.src_channels = src_channels
+        self.dst_channels = dst_channels
+        self._last: Optional[np.ndarray] = None
+        self._pos = 0.0
+
+    def process(self, frames: np.ndarray) -> np.ndarray:
+        frames = self._map_channels(frames)
+        if self.step == 1.0 or not len(frames):
+            return frames
+        if self._last is None:
+            source = frames
+        else:
+            source = np.concatenate((self._last, frames))
+        end = len(source) - 1
+        if end <= self._pos:
+            self._last = source[-1:]
+            self._pos -= len(source) - 1
+            return frames[:0]
+        positions = np.arange(self._pos, end, self.step)
+        index = positions.astype(np.int64)
+        frac = (positions - index)[:, None].astype(np.float32)
+        out = source[index] * (1.0 - frac) + source[index + 1] * frac
+        self._pos = positions[-1] + self.step - end
+        self._last = source[-1:]
+        return out.astype(np.float32, copy=False)
+
+    def reset(self):
+        self._last = None
+        self._pos = 0.0
+
+    def _map_channels(self, frames: np.ndarray) -> np.ndarray:
+        if self.src_channels == self.dst_channels:
+            return frames
+        if self.dst_channels == 1:
+            return frames.mean(axis=1, keepdims=True)
+        if self.src_channels == 1:
+            return np.repeat(frames, self.dst_channels, axis=1)
+        out = np.zeros((len(frames), self.dst_channels), dtype=np.float32)
+        count = min(self.src_channels, self.dst_channels)
+        out[:, :count] = frames[:, :count]
+        return out
+
+
+class TrimConfig(BaseModel):
+    threshold_db: float = -45.0  # 窗口均方根能量低于该值（dBFS）视为静音
+    window_ms: float = 10.0  # 能量检测窗口
+    lead_pad_ms: float = 30.0  # 句首保留的静音
+    trail_pad_ms: float = 60.0  # 句尾保留的静音
+    fade_ms: float = 5.0  # 裁剪处的淡入淡出，避免爆音
+    max_hold_ms: float = 1500.0  # 句中静音最多暂存多久，超过后视为句中停顿直接输出
+
+
+class SilenceTrimmer:
+    """逐块裁剪一句话首尾的静音
+
+    按固定窗口计算能量。第一个非静音窗口之前只保留lead_pad，句中的静音暂存，
+    遇到非静音窗口时原样输出，句子结束时仍暂存的就是句尾静音，只保留trail_pad。
+    裁剪处做淡入/淡出，相邻两句的衔接处先淡出到静音再淡入，不会有突变。
+    """
+    def __init__(self, samplerate: int, channels: int, config: Optional[TrimConfig] = None):
+        """
+        Args:
+            samplerate: 帧的采样率
+            channels: 帧的声道数
+            config: 裁剪配置，为空时使用默认配置
+        """
+        config = config or TrimConfig()
+        self.samplerate = samplerate
+        self.channels = channels
+        frames = lambda ms: int(samplerate * ms / 1000)
+        self._window = max(1, frames(config.window_ms))
+        self._lead_pad = frames(config.lead_pad_ms)
+        self._trail_pad = frames(config.trail_pad_ms)
+        self._fade = frames(config.fade_ms)
+        self._max_hold = max(self._trail_pad, frames(config.max_hold_ms))
+        self._threshold = 10 ** (config.threshold_db / 10)  # 均方能量阈值
+        self.removed = 0  # 累计裁掉的帧数
+        self.last_removed = 0.0  # 最近一句裁掉的时长（秒）
+        self.reset()
+
+    def reset(self):
+        """丢弃当前句的状态，打断时使用"""
+        self._pending = np.zeros((0, self.channels), dtype=np.float32)  # 不足一个窗口的帧
+        self._started = False
+        self._lead: List[np.ndarray] = []
+        self._held: List[np.ndarray] = []
+        self._held_len = 0
+        self._faded = self._fade  # 尚未做淡入时为0
+        self._sentence_removed = 0
+
+    def process(self, frames: np.ndarray) -> np.ndarray:
+        """输入解码后的帧 (n, channels)，返回可以输出的帧"""
+        if len(self._pending):
+            frames = np.concatenate((self._pending, frames))
+        count = len(frames) // self._window
+        self._pending = frames[count * self._window:].copy()
+        if not count:
+            return frames[:0]
+        windows = np.ascontiguousarray(frames[:count * self._window])
+        loud = self._loud(windows, count)
+        out: List[np.ndarray] = []
+        if not self._started:
+            index = np.flatnonzero(loud)
+            if not index.size:
+                self._keep_lead(windows)
+                return frames[:0]
+            first = index[0] * self._window
+            self._keep_lead(windows[:first])
+            out.extend(self._lead)
+            self._lead = []
+            self._started = True
+            if self._sentence_removed:
+                self._faded = 0
+            windows, loud = windows[first:], loud[index[0]:]
+        index = np.flatnonzero(loud)
+        if index.size:
+            last = (index[-1] + 1) * self._window
+            out.extend(self._held)
+            out.append(windows[:last])
+            self._held, self._held_len = [], 0
+            windows = windows[last:]
+        if len(windows):
+            self._held.append(windows)
+            self._held_len += len(windows)
+        if self._held_len > self._max_hold:
+            out.extend(self._held)
+            self._held, self._held_len = [], 0
+        return self._fade_in(_join(out, self.channels))
+
+    def end(self) -> np.ndarray:
+        """一句话结束，返回剩余的帧并裁剪句尾静音"""
+        rest, self._pending = self._pending, self._pending[:0]
+        out: List[np.ndarray] = []
+        trimmed = 0
+        if not self._started:
+            # 整句都是静音
+            self._drop(sum(len(part) for part in self._lead) + len(rest))
+        elif len(rest) and self._loud(rest, 1)[0]:
+            out.extend(self._held)
+            out.append(rest)
+        else:
+            tail = _join(self._held + [rest], self.channels)
+            out.append(tail[:self._trail_pad])
+            trimmed = max(0, len(tail) - self._trail_pad)
+            self._drop(trimmed)
+        frames = self._fade_in(_join(out, self.channels))
+        if len(frames) and trimmed:
+            frames = frames.copy()
+            count = min(self._fade, len(frames))
+            frames[len(frames) - count:] *= np.linspace(1.0, 0.0, count, dtype=np.float32)[:, None]
+        self.last_removed = self._sentence_removed / self.samplerate
+        self.reset()
+        return frames
+
+    def _loud(self, frames: np.ndarray, count: int) -> np.ndarray:
+        """每个窗口是否超过能量阈值"""
+        energy = np.square(frames.reshape(count, -1), dtype=np.float32).mean(axis=1)
+        return energy > self._threshold
+
+    def _keep_lead(self, frames: np.ndarray):
+        """句首静音只保留最后lead_pad帧"""
+        if len(frames):
+            self._lead.append(frames)
+        total = sum(len(part) for part in self._lead)
+        if total > self._lead_pad:
+            lead = _join(self._lead, self.channels)
+            self._drop(total - self._lead_pad)
+            self._lead = [lead[total - self._lead_pad:].copy()] if self._lead_pad else []
+
+    def _drop(self, count: int):
+        self._sentence_removed += count
+        self.removed += count
+
+    def _fade_in(self, frames: np.ndarray) -> np.ndarray:
+        if self._faded >= self._fade or not len(frames):
+            return frames
+        count = min(self._fade - self._faded, len(frames))
+        gain = (np.arange(self._faded, self._faded + count, dtype=np.float32) / self._fade)[:, None]
+        frames = frames.copy()
+        frames[:count] *= gain
+        self._faded += count
+        return frames
+
+
+def _join(parts: List[np.ndarray], channels: int) -> np.ndarray:
+    if not parts:
+        return np.zeros((0, channels), dtype=np.float32)
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
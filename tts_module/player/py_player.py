@@ -1,18 +1,60 @@
 import io
 import queue
 import threading
+import time
+import numpy as np
 import sounddevice as sd
 import soundfile as sf
 from log import log
-from typing import Iterator
+from collections import OrderedDict, deque
+from typing import Callable, Iterable, Iterator, Dict, Optional
+from .pcm_stream import RingBuffer, WavStreamDecoder, LinearResampler, SilenceTrimmer, TrimConfig
+from ..audio_chunk import AudioChunk, is_end, payload
+from ..backpressure import BoundedQueue, StageStats
+
+
+def _entry_size(entry) -> int:
+    chunk = entry[1]
+    return len(chunk) if chunk is not None else 0
 
 class FFPlayer:
-    def __init__(self, audio_device=None):
-        self.chunk_queue = queue.Queue()
+    def __init__(self, audio_device=None, streaming: bool = False, buffer_seconds: float = 10.0,
+                 samplerate: Optional[int] = None, channels: Optional[int] = None, blocksize: int = 0,
+                 queue_items: int = 256, queue_bytes: int = 1024 * 1024, trim: Optional[TrimConfig] = None):
+        """
+        Args:
+            audio_device: 音频输出设备
+            streaming: 是否使用流式模式，增量解码并通过常驻的OutputStream回调播放，句间无需重启设备
+            buffer_seconds: 流式模式下环形缓冲的时长
+            samplerate: 流式模式的输出采样率，默认使用设备采样率
+            channels: 流式模式的输出声道数，默认使用设备声道数（最多2）
+            blocksize: OutputStream回调的块大小，0表示由PortAudio决定
+            queue_items: 待解码的块数上限，0表示不限
+            queue_bytes: 待解码的字节上限，0表示不限
+            trim: 句首句尾静音裁剪配置，为空时不裁剪
+        """
+        self.chunk_queue = BoundedQueue(queue_items, queue_bytes, _entry_size, StageStats("player"))
         self.is_active = False
         self.audio_device = audio_device
         self.play_thread = None
         self.first_chunk = True
+        self.streaming = streaming
+        self.buffer_seconds = buffer_seconds
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.ring: Optional[RingBuffer] = None
+        self.output_stream = None
+        self._utterance_active = False
+        self._counters = {"underruns": 0, "frames_written": 0, "frames_played": 0, "max_fill": 0}
+        self.trim = trim
+        self.trimmed: "OrderedDict[int, float]" = OrderedDict()  # 最近各句裁掉的静音时长（秒），按序号
+        self.trimmed_seconds = 0.0
+        self._generation = 0  # 每次打断加一，队列中属于旧代的音频不再播放
+        self._playing = False  # 整句模式正在解码或播放一句
+        self._play_lock = threading.Lock()  # 开始整句播放与打断互斥
+        self._on_playback: Optional[Callable[[int, str, float], None]] = None
+        self._events: deque = deque()  # 音频回调读到的播放标记及时刻，由解码线程派发
 
     def start(self):
         if self.is_active:
@@ -22,49 +64,291 @@ class FFPlayer:
         #     sd.default.device = self.audio_device['name']
 
         self.is_active = True
-        self.play_thread = threading.Thread(target=self._process_chunks)
+        if self.streaming:
+            self._open_stream()
+            target = self._process_stream_chunks
+        else:
+            target = self._process_chunks
+        self.play_thread = threading.Thread(target=target)
         self.play_thread.start()
         log.info("Python音频播放器已启动")
 
     def _process_chunks(self):
+        current = self._generation
         try:
             while self.is_active or not self.chunk_queue.empty():
                 chunks = []
                 # 收集直到遇到None标记
                 while True:
                     try:
-                        chunk = self.chunk_queue.get(timeout=0.5)
-                        if chunk is None:  # 收到结束标记
+                        generation, chunk = self.chunk_queue.get(timeout=0.5)
+                        if generation != self._generation:
+                            chunks = []  # 打断前排队的音频
+                            if chunk is None:
+                                break
+                            continue
+                        if generation != current:
+                            # 打断后的第一块，丢弃被打断句子已收集的音频
+                            current = generation
+                            chunks = []
+                        if is_end(chunk):  # 收到结束标记
                             if chunks:  # 如果有收集到的数据就播放
+                                self._playing = True
                                 audio_data = b"".join(chunks)
                                 if self.first_chunk:
-                                    log.info(f"播放首个音频chunk")
+                                    log.info("播放首个音频chunk")
                                     self.first_chunk = False
                                 try:
-                                    data, samplerate = sf.read(io.BytesIO(audio_data))
-                                    sd.play(data, samplerate)
+                                    data, samplerate = sf.read(io.BytesIO(audio_data), always_2d=True)
+                                    if self.trim is not None:
+                                        trimmer = SilenceTrimmer(samplerate, data.shape[1], self.trim)
+                                        data = np.concatenate((trimmer.process(data), trimmer.end()))
+                                        self._record_trim(chunk, trimmer.last_removed)
+                                    with self._play_lock:
+                                        if generation != self._generation:
+                                            break  # 解码期间被打断
+                                        sd.play(data, samplerate)
+                                        started = time.perf_counter()
+                                    sequence = getattr(chunk, "sequence", None)
+                                    self._report(sequence, "playback_start", started)
                                     sd.wait()
+                                    if generation == self._generation:
+                                        self._report(sequence, "playback_end", time.perf_counter())
                                 except Exception as e:
                                     log.error(f"音频播放错误: {e}")
+                                finally:
+                                    self._playing = False
                             break  # 跳出内层循环，继续等待新的音频序列
-                        chunks.append(chunk)
+                        chunks.append(payload(chunk))
                     except queue.Empty:
                         continue
-                    
+
         finally:
             sd.stop()  # 保持简单,只停止当前播放
 
-    def add_chunk(self, chunk: bytes):
+    def _open_stream(self):
+        """打开常驻的输出流"""
+        device = self.audio_device['name'] if self.audio_device else None
+        info = sd.query_devices(device, 'output')
+        self.samplerate = int(self.samplerate or info['default_samplerate'])
+        self.channels = self.channels or max(1, min(2, int(info['max_output_channels'])))
+        self.ring = RingBuffer(int(self.buffer_seconds * self.samplerate), self.channels)
+        self.output_stream = sd.OutputStream(
+            samplerate=self.samplerate,
+            channels=self.channels,
+            dtype='float32',
+            device=device,
+            blocksize=self.blocksize,
+            callback=self._callback,
+        )
+        self.output_stream.start()
+
+    def _callback(self, outdata, frames, time_info, status):
+        """PortAudio回调：从环形缓冲取数据，不足时补零"""
+        count = self.ring.read_into(outdata)
+        passed = self.ring.passed()
+        if passed:
+            now = time.perf_counter()
+            self._events.extend((mark, now) for mark in passed)
+        self._counters["frames_played"] += count
+        if count < frames and self._utterance_active:
+            self._counters["underruns"] += 1
+
+    def _process_stream_chunks(self):
+        """增量解码、重采样后写入环形缓冲"""
+        decoder = WavStreamDecoder()
+        resampler = None
+        trimmer = SilenceTrimmer(self.samplerate, self.channels, self.trim) if self.trim is not None else None
+        fallback = []  # 非WAV数据整句解码
+        current = self._generation
+        started = False  # 本句的帧是否已写入环形缓冲并带上开始播放的标记
+        try:
+            while self.is_active or not self.chunk_queue.empty():
+                self._dispatch()
+                try:
+                    generation, chunk = self.chunk_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if generation != self._generation:
+                    continue  # 打断前排队的音频
+                sequence = getattr(chunk, "sequence", None)
+                mark = None if started or sequence is None else (sequence, "playback_start")
+                if generation != current:
+                    # 打断后的第一块，丢弃被打断句子的解码状态
+                    current = generation
+                    started = False
+                    mark = None if sequence is None else (sequence, "playback_start")
+                    fallback = []
+                    decoder.reset()
+                    resampler = None
+                    if trimmer is not None:
+                        trimmer = SilenceTrimmer(self.samplerate, self.channels, self.trim)
+                if is_end(chunk):  # 收到结束标记
+                    if fallback:
+                        try:
+                            data, samplerate = sf.read(io.BytesIO(b"".join(fallback)), dtype='float32', always_2d=True)
+                            resampler = LinearResampler(samplerate, self.samplerate, data.shape[1], self.channels)
+                            if self._write(resampler.process(data), trimmer, generation, mark):
+                                mark = None
+                        except Exception as e:
+                            log.error(f"音频解码错误: {e}")
+                    if trimmer is not None:
+                        self._write(trimmer.end(), generation=generation, mark=mark)
+                        self._record_trim(chunk, trimmer.last_removed)
+                    if sequence is not None:
+                        self._mark(sequence, generation)
+                    started = False
+                    fallback = []
+                    decoder.reset()
+                    resampler = None
+                    self._utterance_active = False
+                    continue
+                if self.first_chunk:
+                    log.info("播放首个音频chunk")
+                    self.first_chunk = False
+                self._utterance_active = True
+                data = payload(chunk)
+                if fallback:
+                    fallback.append(data)
+                    continue
+                if isinstance(chunk, AudioChunk) and chunk.codec not in (None, "wav") and not decoder.started:
+                    # 已知不是WAV的数据（如Edge的mp3）直接整句解码
+                    fallback = [data]
+                    continue
+                try:
+                    frames = decoder.feed(data)
+                except ValueError:
+                    fallback = [decoder.pending_bytes()]
+                    continue
+                if frames is None:
+                    continue
+                if resampler is None:
+                    resampler = LinearResampler(decoder.samplerate, self.samplerate, decoder.channels, self.channels)
+                if self._write(resampler.process(frames), trimmer, generation, mark):
+                    started = True
+        finally:
+            if self.ring:
+                self.ring.close()
+
+    def _write(self, frames: np.ndarray, trimmer: Optional[SilenceTrimmer] = None, generation: Optional[int] = None,
+               mark=None) -> int:
+        """写入环形缓冲，返回写入的帧数，mark标记在写入的第一帧上"""
+        if trimmer is not None:
+            frames = trimmer.process(frames)
+        # 先取缓冲的epoch再检查代数，检查之后发生的打断会清空缓冲并使这次写入中止
+        epoch = self.ring.epoch
+        if generation is not None and generation != self._generation:
+            return 0
+        written = self.ring.write(frames, epoch, mark if len(frames) else None)
+        self._counters["frames_written"] += written
+        self._counters["max_fill"] = max(self._counters["max_fill"], self.ring.fill)
+        return written
+
+    def _mark(self, sequence: int, generation: int):
+        """在本句最后一帧之后打上播放完的标记"""
+        epoch = self.ring.epoch
+        if generation == self._generation:
+            self.ring.mark((sequence, "playback_end"), epoch)
+
+    def set_playback_callback(self, callback: Optional[Callable[[int, str, float], None]]):
+        """设置播放报告回调 callback(序号, "playback_start"或"playback_end", time.perf_counter()时刻)
+
+        整句模式在sd.play和sd.wait返回时报告；流式模式在音频回调读到本句首帧和末帧时记录时刻，由解码线程报告。
+        被打断的句子不报告播放完。
+        """
+        self._on_playback = callback
+
+    def _report(self, sequence: Optional[int], point: str, at: float):
+        if self._on_playback is None or sequence is None:
+            return
+        try:
+            self._on_playback(sequence, point, at)
+        except Exception as e:
+            log.error(f"播放报告回调出错: {e}")
+
+    def _dispatch(self):
+        """派发音频回调记录的播放标记"""
+        while self._events:
+            (sequence, point), at = self._events.popleft()
+            self._report(sequence, point, at)
+
+    def _record_trim(self, chunk, seconds: float):
+        """记录一句裁掉的静音时长"""
+        self.trimmed_seconds += seconds
+        sequence = getattr(chunk, "sequence", None)
+        if sequence is not None:
+            self.trimmed[sequence] = self.trimmed.get(sequence, 0.0) + seconds
+            while len(self.trimmed) > 1024:
+                self.trimmed.popitem(last=False)
+
+    def trimmed_for(self, sequences: Iterable[int]) -> float:
+        """给定序号的句子共裁掉的静音时长（秒）"""
+        return sum(self.trimmed.get(sequence, 0.0) for sequence in sequences)
+
+    def stats(self) -> Dict[str, int]:
+        """流式模式的欠载次数和缓冲填充计数，以及裁掉的静音总时长"""
+        stats = dict(self._counters)
+        stats["fill"] = self.ring.fill if self.ring else 0
+        stats["trimmed_seconds"] = round(self.trimmed_seconds, 3)
+        return stats
+
+    def buffered_seconds(self) -> float:
+        """流式模式下环形缓冲中待播放的时长"""
+        if not self.ring:
+            return 0.0
+        return self.ring.fill / self.samplerate
+
+    def add_chunk(self, chunk: AudioChunk):
         if self.is_active:
-            self.chunk_queue.put(chunk)
+            self.chunk_queue.put((self._generation, chunk))
+
+    async def wait_writable(self, size: int = 0):
+        """等待队列有足够额度放入size字节，解码和播放跟不上时挂起生产者"""
+        await self.chunk_queue.wait_space(size)
+
+    def writable(self, size: int = 0) -> bool:
+        """队列当前能否放入size字节，不等待"""
+        return self.chunk_queue.has_space(size)
+
+    def queue_stats(self) -> Dict[str, float]:
+        return self.chunk_queue.stats()
+
+    def playing(self) -> bool:
+        """是否还有排队、正在解码或尚未播完的音频"""
+        if not self.chunk_queue.empty() or self._playing or self._utterance_active:
+            return True
+        return self.ring is not None and self.ring.fill > 0
+
+    def flush(self) -> float:
+        """打断：丢弃排队的音频和环形缓冲中未播放的音频，停止当前整句播放，返回耗时（秒）"""
+        if not self.is_active:
+            return 0.0
+        start = time.monotonic()
+        with self._play_lock:
+            self._generation += 1
+            self.chunk_queue.clear()
+            if self.ring is not None:
+                self.ring.clear()
+            self._utterance_active = False
+            sd.stop()
+        return time.monotonic() - start
 
     def stop(self):
         if not self.is_active:
             return
         self.is_active = False
-        self.chunk_queue.put(None)
+        self.chunk_queue.put((self._generation, None))
         if self.play_thread and self.play_thread.is_alive():
             self.play_thread.join()
+        if self.output_stream is not None:
+            # 播完环形缓冲中剩余的音频
+            deadline = time.monotonic() + self.buffer_seconds
+            while self.ring.fill and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.output_stream.stop()
+            self._dispatch()
+            self.output_stream.close()
+            self.output_stream = None
         sd.stop()
         log.info("音频设备资源已清理")
         log.info("Python音频播放器已停止")
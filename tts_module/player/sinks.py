@@ -0,0 +1,179 @@
+"""音频输出端
+
+输出端与播放器的接口相同：start/stop/add_chunk，可选flush；
+实现wait_writable(size)和writable(size)的输出端有自己的队列额度，FanOutPlayer据此判断它是否落后。
+MPVPlayer、FFPlayer和服务端的StreamPlayer都可以直接作为输出端。
+"""
+import socket
+import threading
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+from log import log
+from ..audio_chunk import AudioChunk, is_end, payload
+from ..backpressure import BoundedQueue, StageStats
+
+
+def _chunk_size(chunk) -> int:
+    return len(chunk) if chunk is not None else 0
+
+
+class AudioSink(ABC):
+    """在单独线程中写出音频块的输出端基类，子类实现_write，可选实现_end和_close
+
+    add_chunk只把块放入队列，从不阻塞；队列按条数和字节限额，写出跟不上时由调用方决定等待还是丢弃。
+    写出计数由写出线程更新、其他线程读取，用锁保护。
+    """
+    def __init__(self, queue_items: int = 256, queue_bytes: int = 1024 * 1024, name: str = "sink"):
+        """
+        Args:
+            queue_items: 待写出的块数上限，0表示不限
+            queue_bytes: 待写出的字节上限，0表示不限
+            name: 日志和统计中使用的名称
+        """
+        self.name = name
+        self.chunk_queue = BoundedQueue(queue_items, queue_bytes, _chunk_size, StageStats(name))
+        self.is_active = False
+        self.failed = False  # 写出出错后不再写出，只丢弃
+        self.written = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.is_active:
+            return
+        self.is_active = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while (chunk := self.chunk_queue.get()) is not None:
+                if self.failed:
+                    continue
+                try:
+                    if is_end(chunk):
+                        self._end(chunk)
+                    else:
+                        self._write(payload(chunk))
+                        with self._lock:
+                            self.written += len(chunk)
+                except (OSError, ValueError) as e:
+                    with self._lock:
+                        self.failed = True
+                        self.errors += 1
+                    log.error(f"输出端{self.name}写出失败: {str(e)}")
+        finally:
+            try:
+                self._close()
+            except OSError:
+                pass
+
+    @abstractmethod
+    def _write(self, data: memoryview):
+        """写出一块音频数据，出错时抛出OSError或ValueError"""
+        pass
+
+    def _end(self, chunk: AudioChunk):
+        """一句话结束"""
+
+    def _close(self):
+        pass
+
+    def add_chunk(self, chunk: AudioChunk):
+        if self.is_active:
+            self.chunk_queue.put(chunk)
+
+    async def wait_writable(self, size: int = 0):
+        await self.chunk_queue.wait_space(size)
+
+    def writable(self, size: int = 0) -> bool:
+        return self.chunk_queue.has_space(size)
+
+    def queue_stats(self) -> Dict[str, float]:
+        return self.chunk_queue.stats()
+
+    def stats(self) -> Dict:
+        """已写出的字节数和写出错误"""
+        with self._lock:
+            return {"written": self.written, "failed": self.failed, "errors": self.errors}
+
+    def playing(self) -> bool:
+        """是否还有尚未写出的音频"""
+        return not self.chunk_queue.empty()
+
+    def flush(self):
+        """丢弃尚未写出的音频"""
+        self.chunk_queue.clear()
+
+    def stop(self):
+        """写完已排队的音频后停止"""
+        if not self.is_active:
+            return
+        self.is_active = False
+        self.chunk_queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+
+
+class FileSink(AudioSink):
+    """把音频原样写入文件，各句的编码数据首尾相接"""
+    def __init__(self, file: Union[str, BinaryIO], queue_items: int = 0, queue_bytes: int = 0, name: str = "file"):
+        """
+        Args:
+            file: 文件路径或以二进制写模式打开的文件对象，传入文件对象时停止后不关闭
+            queue_items: 待写出的块数上限，0表示不限
+            queue_bytes: 待写出的字节上限，0表示不限
+            name: 日志和统计中使用的名称
+        """
+        super().__init__(queue_items, queue_bytes, name)
+        self.path = file if isinstance(file, str) else None
+        self._file = None if self.path else file
+
+    def start(self):
+        if self.path and self._file is None:
+            self._file = open(self.path, "wb")
+        super().start()
+
+    def _write(self, data: memoryview):
+        self._file.write(data)
+
+    def _close(self):
+        if self.path and self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self._file is not None:
+            self._file.flush()
+
+
+class SocketSink(AudioSink):
+    """把音频写入TCP连接，对端按收到的字节流解码"""
+    def __init__(self, address: Union[Tuple[str, int], socket.socket], queue_items: int = 256,
+                 queue_bytes: int = 1024 * 1024, name: str = "socket", timeout: float = 5.0):
+        """
+        Args:
+            address: (host, port)，或已连接的socket，传入socket时停止后同样关闭
+            queue_items: 待写出的块数上限，0表示不限
+            queue_bytes: 待写出的字节上限，0表示不限
+            name: 日志和统计中使用的名称
+            timeout: 连接和单次发送的超时（秒），超时视为写出失败
+        """
+        super().__init__(queue_items, queue_bytes, name)
+        self.address = None if isinstance(address, socket.socket) else address
+        self.timeout = timeout
+        self._sock = address if self.address is None else None
+
+    def start(self):
+        if self._sock is None:
+            self._sock = socket.create_connection(self.address, timeout=self.timeout)
+        self._sock.settimeout(self.timeout)
+        super().start()
+
+    def _write(self, data: memoryview):
+        self._sock.sendall(data)
+
+    def _close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
@@ -0,0 +1,99 @@
+"""引擎与播放器注册表
+
+名称映射到"模块:属性"形式的导入路径，用到时才导入实现，导入tts_module.tts不会加载
+edge_tts、openai、sounddevice等依赖，也不会初始化PortAudio。
+
+第三方包可以通过入口点注册实现，无需修改本项目：
+
+    [project.entry-points."llm2voice.engines"]
+    mytts = "mypackage.engine:MyEngine"
+
+    [project.entry-points."llm2voice.players"]
+    myplayer = "mypackage.player:MyPlayer"
+
+入口点只在查找内置名称以外的名称或列出全部名称时才扫描。
+"""
+import importlib
+import inspect
+import threading
+from importlib.metadata import entry_points
+from typing import Any, Callable, Dict, List, Union
+
+from log import log
+
+
+class Registry:
+    """名称到延迟导入的实现的映射"""
+    def __init__(self, kind: str, group: str, builtins: Dict[str, str]):
+        """
+        Args:
+            kind: 用于错误信息的类别名称
+            group: 第三方实现的入口点组名
+            builtins: 内置实现的名称到"模块:属性"的映射
+        """
+        self.kind = kind
+        self.group = group
+        self._targets: Dict[str, Union[str, Any]] = dict(builtins)
+        self._loaded: Dict[str, Any] = {}
+        self._scanned = False
+        self._lock = threading.Lock()
+
+    def register(self, name: str, target: Union[str, Callable]):
+        """注册实现，target为"模块:属性"形式的导入路径或已导入的类，同名时覆盖"""
+        with self._lock:
+            self._targets[name] = target
+            self._loaded.pop(name, None)
+
+    def names(self) -> List[str]:
+        """所有可用的名称，包括入口点注册的实现"""
+        self._scan()
+        return sorted(self._targets)
+
+    def load(self, name: str) -> Any:
+        """导入并返回名称对应的实现"""
+        loaded = self._loaded.get(name)
+        if loaded is not None:
+            return loaded
+        if name not in self._targets:
+            self._scan()
+        target = self._targets.get(name)
+        if target is None:
+            raise ValueError(f"未知的{self.kind}: {name}，可用: {', '.join(self.names())}")
+        if isinstance(target, str):
+            module, _, attribute = target.partition(":")
+            target = getattr(importlib.import_module(module), attribute)
+        with self._lock:
+            self._loaded[name] = target
+        return target
+
+    def _scan(self):
+        """读取入口点，内置和手动注册的名称优先"""
+        with self._lock:
+            if self._scanned:
+                return
+            self._scanned = True
+            for entry_point in entry_points(group=self.group):
+                if entry_point.name in self._targets:
+                    log.warning(f"{self.kind}{entry_point.name}已存在，忽略入口点{entry_point.value}")
+                    continue
+                self._targets[entry_point.name] = entry_point.value
+
+
+def construct(factory: Callable, **options) -> Any:
+    """只传入factory接受的参数，不同实现可以支持不同的可选参数"""
+    parameters = inspect.signature(factory).parameters
+    if not any(parameter.kind == inspect.Parameter.VAR_KEYWORD for parameter in parameters.values()):
+        options = {name: value for name, value in options.items() if name in parameters}
+    return factory(**options)
+
+
+engines = Registry("引擎", "llm2voice.engines", {
+    "edge": "tts_module.engine.edge_engine:EdgeEngine",
+    "openai": "tts_module.engine.openai_engine:OpenAIEngine",
+    "tone": "tts_module.engine.tone_engine:ToneEngine",
+})
+
+players = Registry("播放器", "llm2voice.players", {
+    "mpv": "tts_module.player.mpv_player:MPVPlayer",
+    "ffplayer": "tts_module.player.py_player:FFPlayer",
+})
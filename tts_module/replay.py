@@ -0,0 +1,447 @@
+"""轨迹录制与回放
+
+线上遇到的性能问题（LLM的token成批到达、引擎首包偶尔很慢）在本地很难复现。
+TraceRecorder包装LLM和引擎，记录每个token的到达间隔、每个音频块的到达间隔和大小，
+写成紧凑的JSON行轨迹文件（以.gz结尾时压缩），不记录音频内容。
+
+replay()离线读取轨迹，在虚拟时钟上按原样的时间驱动TTS.process_stream：
+事件循环空闲时直接跳到下一个定时器，几十秒的慢轨迹几十毫秒就能跑完，结果与机器快慢无关，
+可以作为性能回归测试的固定输入。
+
+    recorder = TraceRecorder("slow.jsonl.gz")
+    tts = TTS(engine=recorder.engine(EdgeEngine()), scheduler="asyncio")
+    await tts.process_stream(recorder.llm(OpenAILLM()).aresponse(dialogue))
+    ...
+    report = replay(Trace.load("slow.jsonl.gz"), max_workers=3)
+
+回放期间time.monotonic、time.perf_counter和time.time被替换为虚拟时间，
+所有句子在同一个事件循环上运行（asyncio调度），不应同时运行依赖真实时间的其他线程。
+"""
+import asyncio
+import gzip
+import json
+import selectors
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Deque, Dict, IO, Iterator, List, Optional, Tuple
+
+from log import log
+from tts_module.audio_chunk import AudioChunk, as_chunk, is_end
+from tts_module.engine.base_engine import TTSEngine
+from tts_module.tracing import Tracer
+
+TRACE_VERSION = 1
+DEFAULT_BYTES_PER_SECOND = 6000  # 格式未知的音频按Edge的48kbps mp3估算播放时长
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class _Intervals:
+    """按与上一个事件的间隔记录事件，第一个间隔从开始记录算起"""
+    def __init__(self):
+        self.last = time.perf_counter()
+        self.events: List[list] = []
+
+    def add(self, value):
+        now = time.perf_counter()
+        self.events.append([round(now - self.last, 4), value])
+        self.last = now
+
+
+class TraceRecorder:
+    """录制LLM的token和引擎的音频块时间，多个回复和会话可以共享一个录制器"""
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 轨迹文件路径，以.gz结尾时压缩
+        """
+        self._file: Optional[IO[str]] = _open(path, "w")
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._write({"type": "header", "version": TRACE_VERSION, "created": time.time()})
+
+    def _offset(self) -> float:
+        return round(time.perf_counter() - self._origin, 4)
+
+    def _write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+
+    def llm(self, llm) -> "RecordingLLM":
+        return RecordingLLM(llm, self)
+
+    def engine(self, engine: TTSEngine) -> "RecordingEngine":
+        return RecordingEngine(engine, self)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RecordingLLM:
+    """包装OpenAILLM，记录response和aresponse每个token的到达间隔，其余属性原样转发"""
+    def __init__(self, llm, recorder: TraceRecorder):
+        self._llm = llm
+        self._recorder = recorder
+
+    def __getattr__(self, name: str):
+        return getattr(self._llm, name)
+
+    def response(self, dialogue: list) -> Iterator[str]:
+        start = self._recorder._offset()
+        intervals = _Intervals()
+        try:
+            for token in self._llm.response(dialogue):
+                intervals.add(token)
+                yield token
+        finally:
+            self._recorder._write({"type": "llm", "start": start, "tokens": intervals.events})
+
+    async def aresponse(self, dialogue: list) -> AsyncIterator[str]:
+        start = self._recorder._offset()
+        intervals = _Intervals()
+        try:
+            async for token in self._llm.aresponse(dialogue):
+                intervals.add(token)
+                yield token
+        finally:
+            self._recorder._write({"type": "llm", "start": start, "tokens": intervals.events})
+
+
+class RecordingEngine(TTSEngine):
+    """包装引擎，记录每句的音频块到达间隔、大小和格式，以及合成失败"""
+    def __init__(self, engine: TTSEngine, recorder: TraceRecorder):
+        self.engine = engine
+        self._recorder = recorder
+
+    def __getattr__(self, name: str):
+        return getattr(self.engine, name)
+
+    async def prewarm(self):
+        await self.engine.prewarm()
+
+    async def release_loop(self):
+        await self.engine.release_loop()
+
+    def cache_params(self) -> Optional[Dict]:
+        return self.engine.cache_params()
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        start = self._recorder._offset()
+        intervals = _Intervals()
+        audio_format = (None, None, None)
+        error = None
+        try:
+            async for chunk in self.engine.synthesize(text):
+                chunk = as_chunk(chunk)
+                if not chunk:
+                    continue
+                if audio_format[0] is None:
+                    audio_format = (chunk.codec, chunk.sample_rate, chunk.channels)
+                intervals.add(len(chunk))
+                yield chunk
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            codec, sample_rate, channels = audio_format
+            self._recorder._write({"type": "synth", "start": start, "text": text, "codec": codec,
+                                   "sample_rate": sample_rate, "channels": channels,
+                                   "chunks": intervals.events, "error": error})
+
+
+class Trace:
+    """轨迹文件的内容：按开始时间排列的LLM回复和合成记录"""
+    def __init__(self, llm: Optional[List[Dict]] = None, synth: Optional[List[Dict]] = None):
+        self.llm = sorted(llm or [], key=lambda record: record.get("start", 0.0))
+        self.synth = sorted(synth or [], key=lambda record: record.get("start", 0.0))
+
+    @classmethod
+    def load(cls, path: str) -> "Trace":
+        llm, synth = [], []
+        with _open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record["type"] == "header" and record["version"] != TRACE_VERSION:
+                    raise ValueError(f"不支持的轨迹版本: {record['version']}")
+                if record["type"] == "llm":
+                    llm.append(record)
+                elif record["type"] == "synth":
+                    synth.append(record)
+        return cls(llm, synth)
+
+    def save(self, path: str):
+        """写出轨迹文件，可用于保存手工构造或裁剪过的轨迹"""
+        with _open(path, "w") as f:
+            for record in [{"type": "header", "version": TRACE_VERSION}] + self.llm + self.synth:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def duration(self) -> float:
+        """轨迹覆盖的时长（秒），即最后一个事件的时间"""
+        ends = [record.get("start", 0.0) + sum(delay for delay, _ in record.get("tokens", record.get("chunks", [])))
+                for record in self.llm + self.synth]
+        return max(ends, default=0.0)
+
+
+class ReplayLLM:
+    """按轨迹中的间隔产出一个回复的token"""
+    def __init__(self, record: Dict):
+        self.record = record
+
+    async def aresponse(self, dialogue: Optional[list] = None) -> AsyncIterator[str]:
+        for delay, token in self.record["tokens"]:
+            if delay:
+                await asyncio.sleep(delay)
+            yield token
+
+
+class ReplayEngine(TTSEngine):
+    """按轨迹中的间隔和大小产出音频块，内容为静音字节
+
+    按句子文本匹配录制的合成记录，同一文本出现多次时按顺序使用，用完后重复最后一条。
+    轨迹中没有的句子（如分句配置不同）按已录制记录的中位数估算，并计入misses。
+    """
+    def __init__(self, records: List[Dict]):
+        self._records: Dict[str, Deque[Dict]] = defaultdict(deque)
+        for record in records:
+            self._records[record["text"]].append(record)
+        self._estimate_from = [record for record in records if record["chunks"]]
+        self.requests = 0
+        self.misses = 0
+
+    async def synthesize(self, text: str) -> AsyncIterator[AudioChunk]:
+        self.requests += 1
+        queue = self._records.get(text)
+        if queue:
+            record = queue.popleft() if len(queue) > 1 else queue[0]
+        else:
+            record = self._estimate(text)
+        for delay, size in record["chunks"]:
+            if delay:
+                await asyncio.sleep(delay)
+            yield AudioChunk(bytes(size), record["codec"], record["sample_rate"], record["channels"])
+        if record.get("error"):
+            raise RuntimeError(record["error"])
+
+    def _estimate(self, text: str) -> Dict:
+        """没有录制记录的句子，按录制记录的首块延迟、块间隔和每字字节数的中位数估算"""
+        self.misses += 1
+        log.info(f"轨迹中没有句子「{text}」，按中位数估算")
+        samples = self._estimate_from
+        if not samples:
+            return {"chunks": [[0.3, int(len(text) / 4.5 * DEFAULT_BYTES_PER_SECOND)]],
+                    "codec": None, "sample_rate": None, "channels": None}
+        first = statistics.median(record["chunks"][0][0] for record in samples)
+        intervals = [delay for record in samples for delay, _ in record["chunks"][1:]]
+        interval = statistics.median(intervals) if intervals else 0.0
+        chunk_bytes = statistics.median(size for record in samples for _, size in record["chunks"])
+        per_char = statistics.median(sum(size for _, size in record["chunks"]) / max(1, len(record["text"]))
+                                     for record in samples)
+        count = max(1, round(len(text) * per_char / chunk_bytes))
+        size = max(1, int(len(text) * per_char / count))
+        template = samples[0]
+        return {"chunks": [[first if i == 0 else interval, size] for i in range(count)],
+                "codec": template["codec"], "sample_rate": template["sample_rate"],
+                "channels": template["channels"]}
+
+
+class VirtualPlayer:
+    """按音频时长在虚拟时钟上模拟播放的播放器，统计首音延迟、句间空白和句中卡顿
+
+    队列中未播放的音频超过queue_bytes时wait_writable挂起，与真实播放器的背压相同。
+    """
+    def __init__(self, bytes_per_second: Optional[float] = None, queue_bytes: int = 1024 * 1024):
+        """
+        Args:
+            bytes_per_second: 音频的字节率，为空时按块的格式推算（WAV/PCM为16位），未知格式按48kbps
+            queue_bytes: 未播放音频的字节上限
+        """
+        self.bytes_per_second = bytes_per_second
+        self.queue_bytes = queue_bytes
+        self.events: List[Tuple[float, Any]] = []  # (时间, 时长秒数；结束标记为None；清空为"flush")
+        self._end: Optional[float] = None  # 已送入的音频预计播完的时间
+        self._rate = bytes_per_second or DEFAULT_BYTES_PER_SECOND
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def _chunk_rate(self, chunk: AudioChunk) -> float:
+        if self.bytes_per_second:
+            return self.bytes_per_second
+        if chunk.codec in ("wav", "pcm") and chunk.sample_rate:
+            return chunk.sample_rate * (chunk.channels or 1) * 2
+        return DEFAULT_BYTES_PER_SECOND
+
+    def add_chunk(self, chunk: AudioChunk):
+        now = time.perf_counter()
+        if is_end(chunk):
+            self.events.append((now, None))
+            return
+        self._rate = self._chunk_rate(chunk)
+        seconds = len(chunk) / self._rate
+        self.events.append((now, seconds))
+        self._end = max(self._end or now, now) + seconds
+
+    def buffered_seconds(self) -> float:
+        if self._end is None:
+            return 0.0
+        return max(0.0, self._end - time.perf_counter())
+
+    async def wait_writable(self, size: int = 0):
+        while (excess := self.buffered_seconds() * self._rate + size - self.queue_bytes) > 0 \
+                and self.buffered_seconds() > 0:
+            await asyncio.sleep(excess / self._rate)
+
+    def playing(self) -> bool:
+        return self.buffered_seconds() > 0
+
+    def flush(self):
+        now = time.perf_counter()
+        self.events.append((now, "flush"))
+        if self._end is not None:
+            self._end = min(self._end, now)
+
+    def report(self, start: float) -> Dict[str, Any]:
+        """
+        Args:
+            start: 回放开始的时间
+        """
+        clock = None  # 已送入音频的预计播完时间
+        boundary = False
+        ttfa = None
+        gaps: List[float] = []
+        stall = 0.0
+        underruns = 0
+        sentences = 0
+        flushes = 0
+        for at, seconds in self.events:
+            if seconds is None:
+                boundary = True
+                sentences += 1
+                continue
+            if seconds == "flush":
+                flushes += 1
+                if clock is not None:
+                    clock = min(clock, at)
+                continue
+            if clock is None:
+                ttfa = at - start
+                clock = at
+            elif at > clock:
+                if boundary:
+                    gaps.append(at - clock)
+                else:
+                    stall += at - clock
+                    underruns += 1
+                clock = at
+            elif boundary:
+                gaps.append(0.0)
+            boundary = False
+            clock += seconds
+        return {
+            "ttfa_s": round(ttfa, 4) if ttfa is not None else None,
+            "gap_total_s": round(sum(gaps), 4),
+            "gap_max_s": round(max(gaps, default=0.0), 4),
+            "stall_s": round(stall, 4),
+            "underruns": underruns,
+            "sentences": sentences,
+            "flushes": flushes,
+            "playback_end_s": round(clock - start, 4) if clock is not None else None,
+        }
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """没有就绪的I/O时不真正等待，而是把虚拟时钟拨到下一个定时器"""
+    def __init__(self, clock: "VirtualClock"):
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout: Optional[float] = None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # 没有定时器，只能等待其他线程唤醒事件循环
+            return super().select(None)
+        self._clock.advance(timeout)
+        return []
+
+
+class VirtualClock:
+    """虚拟时钟，run()期间替换time模块的时间函数"""
+    def __init__(self):
+        self.now = 0.0
+
+    def advance(self, seconds: float):
+        self.now += max(0.0, seconds)
+
+    def run(self, coroutine):
+        """在虚拟时钟的事件循环上运行协程"""
+        originals = time.monotonic, time.perf_counter, time.time
+        wall = time.time()
+        time.monotonic = time.perf_counter = lambda: self.now
+        time.time = lambda: wall + self.now
+        try:
+            with asyncio.Runner(loop_factory=lambda: asyncio.SelectorEventLoop(_VirtualSelector(self))) as runner:
+                return runner.run(coroutine)
+        finally:
+            time.monotonic, time.perf_counter, time.time = originals
+
+
+async def _replay(trace: Trace, player, tracer: Tracer, preempt: bool, tts_options: Dict) -> Dict:
+    from tts_module.tts import TTS
+    engine = ReplayEngine(trace.synth)
+    tts = TTS(engine=engine, player=player, scheduler="asyncio", tracer=tracer, session_id="replay", **tts_options)
+    await tts.start()
+    begin = time.perf_counter()
+    origin = trace.llm[0].get("start", 0.0) if trace.llm else 0.0
+    replies = []
+    for record in trace.llm:
+        # 按录制时的间隔开始每个回复，前一个回复未结束时与线上一样被打断或排队
+        delay = begin + record.get("start", 0.0) - origin - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        replies.append(asyncio.create_task(tts.process_stream(ReplayLLM(record).aresponse(), preempt)))
+    await asyncio.gather(*replies)
+    await tts.stop()
+    report = player.report(begin) if hasattr(player, "report") else {}
+    report.update({"replies": len(trace.llm), "engine_requests": engine.requests, "engine_misses": engine.misses,
+                   "virtual_s": round(time.perf_counter() - begin, 4)})
+    return report
+
+
+def replay(trace: Trace, player=None, tracer: Optional[Tracer] = None, preempt: bool = True,
+           **tts_options) -> Dict[str, Any]:
+    """在虚拟时钟上回放轨迹，返回播放时间线和各阶段耗时的统计
+
+    Args:
+        trace: 轨迹
+        player: 播放器，为空时使用VirtualPlayer，需在虚拟时钟上计时
+        tracer: 逐句追踪，为空时新建一个，结果中包含各阶段的平均耗时
+        preempt: 后一个回复开始时是否打断前一个回复
+        tts_options: 传给TTS的其他参数，如max_workers、lookahead、segment_policy、coalesce
+    """
+    player = player or VirtualPlayer()
+    tracer = tracer or Tracer()
+    begin = time.perf_counter()
+    report = VirtualClock().run(_replay(trace, player, tracer, preempt, tts_options))
+    report["real_s"] = round(time.perf_counter() - begin, 4)
+    report["statuses"] = dict(tracer.statuses)
+    report["stage_mean_s"] = {stage: round(total / count, 4)
+                              for stage, (_, total, count) in sorted(tracer.stages.snapshot().items()) if count}
+    return report
@@ -0,0 +1,86 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Tuple
+
+
+class SegmentPolicy(ABC):
+    """分句策略的抽象基类，根据播放缓冲深度决定分句长度"""
+    @abstractmethod
+    def limits(self, buffered: float) -> Tuple[int, int]:
+        """
+        Args:
+            buffered: 播放器中尚未播放的音频时长（秒）
+        Returns:
+            Tuple[int, int]: (min_chars, max_chars)，不足min_chars的片段并入下一句，
+            超过max_chars后只在强制分句标点处分句
+        """
+        pass
+
+
+class FixedPolicy(SegmentPolicy):
+    """固定分句长度"""
+    def __init__(self, min_chars: int = 5, max_chars: int = 100):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+
+    def limits(self, buffered: float) -> Tuple[int, int]:
+        return self.min_chars, self.max_chars
+
+
+class AdaptivePolicy(SegmentPolicy):
+    """随播放缓冲增长而加长分句
+
+    没有缓冲音频时在第一个达到first_min_chars的标点处立即分句，尽快出声；
+    缓冲越多，最小句长越接近grown_min_chars，把短分句合并成更少的合成请求。
+    """
+    def __init__(self, first_min_chars: int = 2, min_chars: int = 5, grown_min_chars: int = 40,
+                 max_chars: int = 100, grown_max_chars: int = 200, full_at: float = 6.0):
+        """
+        Args:
+            first_min_chars: 没有缓冲音频时的最小句长
+            min_chars: 刚开始有缓冲时的最小句长
+            grown_min_chars: 缓冲达到full_at秒时的最小句长
+            max_chars: 刚开始有缓冲时的最大句长
+            grown_max_chars: 缓冲达到full_at秒时的最大句长
+            full_at: 句长增长到上限所需的缓冲时长（秒）
+        """
+        self.first_min_chars = first_min_chars
+        self.min_chars = min_chars
+        self.grown_min_chars = grown_min_chars
+        self.max_chars = max_chars
+        self.grown_max_chars = grown_max_chars
+        self.full_at = full_at
+
+    def limits(self, buffered: float) -> Tuple[int, int]:
+        if buffered <= 0:
+            return self.first_min_chars, self.max_chars
+        ratio = min(1.0, buffered / self.full_at)
+        min_chars = self.min_chars + (self.grown_min_chars - self.min_chars) * ratio
+        max_chars = self.max_chars + (self.grown_max_chars - self.max_chars) * ratio
+        return int(min_chars), int(max_chars)
+
+
+class PlaybackClock:
+    """估算已交给播放器但尚未播放完的音频时长
+
+    每句开始送入播放器时按字数估算时长，接在之前音频的预计结束时间之后。
+    """
+    def __init__(self, chars_per_second: float = 4.5):
+        self.chars_per_second = chars_per_second
+        self._end = 0.0
+        self._lock = threading.Lock()
+
+    def add_text(self, text: str):
+        self.add(len(text) / self.chars_per_second)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._end = max(self._end, time.monotonic()) + seconds
+
+    def buffered(self) -> float:
+        return max(0.0, self._end - time.monotonic())
+
+    def reset(self):
+        with self._lock:
+            self._end = 0.0
@@ -1,23 +1,74 @@
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, AsyncGenerator, Generator, Callable, Union
+from typing import List, AsyncGenerator, Generator, Callable, Union, Dict, Awaitable, Optional, Set, Tuple
+from pydantic import BaseModel
 from log import log
+from tts_module.backpressure import Budget, StageStats
+from tts_module.normalize import NormalizeConfig, TextNormalizer
 from tts_module.sentences import sentences_generator
+from tts_module.segment_policy import SegmentPolicy
+from tts_module.tracing import SentenceSpan, Tracer
+from tts_module.utterance import Utterance
 import asyncio
 
 
+class CoalesceConfig(BaseModel):
+    max_chars: int = 150  # 合并后单个请求的字数上限
+    min_buffer: float = 3.0  # 播放缓冲至少领先多少秒时才暂缓派发
+    backlog: int = 1  # 已派发但尚未开始合成的句子数达到该值时视为有积压
+
+
 class SentenceProcessor:
-    def __init__(self, sequence_manager, max_workers: int = 4):
+    def __init__(self, sequence_manager, max_workers: int = 4, scheduler: str = "thread",
+                 policy: SegmentPolicy = None, buffer_depth: Callable[[], float] = None,
+                 tracer: Tracer = None, session: str = "", coalesce: Optional[CoalesceConfig] = None,
+                 max_pending: int = 0, normalize: Optional[NormalizeConfig] = None):
+        """
+        Args:
+            sequence_manager: 序号管理器
+            max_workers: 同时处理的句子数上限
+            scheduler: "thread" 每句一个线程和事件循环；"asyncio" 所有句子作为同一事件循环上的任务
+            policy: 分句策略，为空时使用固定的min_chars=5, max_chars=100
+            buffer_depth: 返回播放缓冲时长（秒）的函数，供分句策略使用
+            tracer: 逐句延迟追踪，为空时不追踪
+            session: 追踪记录中的会话标识
+            coalesce: 请求合并配置，为空时每句单独派发
+            max_pending: 已派发、尚未处理完的句子数上限，达到上限时暂停读取文本，0表示不限
+            normalize: 文本规范化配置，分句前去掉Markdown等不可朗读的内容并展开数字，为空时不处理
+        """
+        if scheduler not in ("thread", "asyncio"):
+            raise ValueError(f"未知的调度方式: {scheduler}")
         self.sequence_manager = sequence_manager
         self.max_workers = max_workers
+        self.scheduler = scheduler
+        self.policy = policy
+        self.buffer_depth = buffer_depth or (lambda: 0.0)
         self.executor = None
-        self.skip = False
         self._running = False
+        self._semaphore: asyncio.Semaphore = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self.tracer = tracer
+        self.session = session
+        self.spans: Dict[int, SentenceSpan] = {}  # 已派发、尚未被回调取走的span
+        self._arrival = None  # 下一句首个字所在文本块的到达时间
+        self._last_chunk = ("", 0.0)  # 最近到达的文本块及其到达时间
+        self.coalesce = coalesce
+        self._waiting: Set[int] = set()  # 已派发、尚未开始合成的句子
+        self._waiting_lock = threading.Lock()
+        self._backlog_changed: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pending = Budget(max_pending, 0, StageStats("dispatch"))
+        self.normalize = normalize
+        self.normalizer: Optional[TextNormalizer] = None  # 最近一个回复的规范化器，用于统计
 
     def start(self):
         """初始化处理器"""
         if not self._running:
-            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            if self.scheduler == "thread":
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._semaphore = asyncio.Semaphore(self.max_workers)
             self._running = True
             log.info("句子处理器已启动")
 
@@ -26,48 +77,261 @@ class SentenceProcessor:
         if self._running and self.executor:
             self.executor.shutdown(wait=True)
             self.executor = None
+        if self._running:
             self._running = False
             log.info("句子处理器已停止")
 
+    async def join(self):
+        """等待asyncio模式下所有句子任务结束"""
+        tasks = list(self._tasks.values())
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
     async def _to_async_generator(self, gen: Generator[str, None, None]) -> AsyncGenerator[str, None]:
-        """将同步生成器转换为异步生成器"""
-        for item in gen:
+        """将同步生成器转换为异步生成器，每次取值在线程中进行以免阻塞事件循环"""
+        end = object()
+        while (item := await asyncio.to_thread(next, gen, end)) is not end:
             yield item
 
-    async def process_sentences(self, text_generator: Union[Generator[str, None, None], AsyncGenerator[str, None]], callback: Callable[[str, int], None] = None) -> None:
-        """处理文本生成器中的句子，生成序号并传递给回调"""
+    async def _timed(self, text_generator: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+        """记录文本块的到达时间，供追踪计算每句首个字的到达时间"""
+        async for text in text_generator:
+            now = time.perf_counter()
+            self._last_chunk = (text, now)
+            if self._arrival is None and text.strip():
+                self._arrival = now
+            yield text
+
+    def _sentence_arrival(self, sentence: str) -> Optional[float]:
+        """分句输出时调用，返回本句首个字所在文本块的到达时间，并推断下一句的到达时间"""
+        if self.tracer is None:
+            return None
+        text, at = self._last_chunk
+        arrival = self._arrival or at
+        # 文本块在本句之后还有内容时，下一句从这个文本块开始
+        self._arrival = at if not text.rstrip().endswith(sentence[-1]) else None
+        return arrival
+
+    def _open_span(self, sentence: str, sequence: int, arrival: Optional[float]) -> SentenceSpan:
+        span = self.tracer.span(self.session, sequence, len(sentence), arrival)
+        self.spans[sequence] = span
+        return span
+
+    async def _single(self, sentences: AsyncGenerator[str, None]) -> AsyncGenerator[Tuple[str, Optional[float]], None]:
+        async for sentence in sentences:
+            yield sentence, self._sentence_arrival(sentence)
+
+    def synthesis_started(self, sequence: int):
+        """句子开始合成或不再需要合成，积压减少，可在任意线程调用"""
+        with self._waiting_lock:
+            if sequence not in self._waiting:
+                return
+            self._waiting.discard(sequence)
+        try:
+            self._loop.call_soon_threadsafe(self._backlog_changed.set)
+        except RuntimeError:
+            pass  # 文本流已处理完，事件循环已关闭
+
+    def _should_hold(self) -> bool:
+        """有积压且播放缓冲充足时暂缓派发，等待与后续句子合并成一个请求"""
+        return (len(self._waiting) >= self.coalesce.backlog
+                and self.buffer_depth() >= self.coalesce.min_buffer)
+
+    async def _coalesced(self, sentences: AsyncGenerator[str, None]) -> AsyncGenerator[Tuple[str, Optional[float]], None]:
+        """合并待派发的句子
+
+        分句结果先进入队列，有积压且播放领先时暂不派发；积压消化、缓冲降到min_buffer以下、
+        合并字数达到max_chars或文本结束时，把队列中连续的句子合并成一句派发。
+        合并后的句子只有一个序号，仍按顺序播放，也随跳过一起取消。
+        """
+        config = self.coalesce
+        self._loop = asyncio.get_running_loop()
+        self._backlog_changed = asyncio.Event()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def read():
+            try:
+                async for sentence in sentences:
+                    queue.put_nowait((sentence, self._sentence_arrival(sentence)))
+            except Exception as e:
+                log.error(f"处理过程出错: {str(e)}")
+            finally:
+                queue.put_nowait(None)
+
+        reader = asyncio.create_task(read())
+        pending: List[str] = []
+        arrival = None
+        length = 0
+        ended = False
+
+        def merged() -> Tuple[str, Optional[float]]:
+            nonlocal arrival, length
+            if len(pending) > 1:
+                log.info(f"合并{len(pending)}句为一个请求，共{length}字")
+            result = ("".join(pending), arrival)
+            pending.clear()
+            arrival, length = None, 0
+            return result
+
+        try:
+            while True:
+                if pending and (ended or length >= config.max_chars or not self._should_hold()):
+                    yield merged()
+                    continue
+                if ended:
+                    break
+                # 等待下一句、积压变化，或播放缓冲降到min_buffer
+                self._backlog_changed.clear()
+                getter = asyncio.ensure_future(queue.get())
+                changed = asyncio.ensure_future(self._backlog_changed.wait())
+                timeout = max(0.0, self.buffer_depth() - config.min_buffer) if pending else None
+                await asyncio.wait({getter, changed}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                item = getter.result()
+                if item is None:
+                    ended = True
+                    continue
+                sentence, at = item
+                if pending and length + len(sentence) > config.max_chars:
+                    yield merged()
+                if not pending:
+                    arrival = at
+                pending.append(sentence)
+                length += len(sentence)
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+            await sentences.aclose()
+
+    async def process_sentences(self, text_generator: Union[Generator[str, None, None], AsyncGenerator[str, None]],
+                                callback: Callable[[str, int, Utterance], None] = None,
+                                utterance: Optional[Utterance] = None) -> None:
+        """处理文本生成器中的句子，生成序号并传递给回调
+
+        thread模式下callback为同步函数，asyncio模式下callback为协程函数，参数为(句子, 序号, 所属回复)。
+        文本在单独的任务中读取并登记到utterance，回复被取消时立即停止读取和分句，
+        已读到的句子不再派发；调用方自身被取消时照常抛出CancelledError。
+        """
         if not self._running:
             raise RuntimeError("句子处理器尚未启动")
+        utterance = utterance or Utterance(0)
+        task = asyncio.create_task(self._process(text_generator, callback, utterance))
+        utterance.add_task(Utterance.TEXT, task)
+        try:
+            await task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling() or not utterance.cancelled:
+                raise
+            log.info(f"回复{utterance.epoch}已被打断，停止分句")
+        finally:
+            utterance.remove_task(Utterance.TEXT)
 
+    async def _process(self, text_generator, callback, utterance: Utterance):
         start_time = time.time()
         if not hasattr(text_generator, '__aiter__'):
             text_generator = self._to_async_generator(text_generator)
+        normalizer = None
+        if self.normalize is not None:
+            normalizer = self.normalizer = TextNormalizer(self.normalize)
+            text_generator = normalizer.normalize(text_generator)
+        if self.tracer is not None:
+            self._arrival = None
+            text_generator = self._timed(text_generator)
 
         try:
-            gen = sentences_generator(
+            sentences = sentences_generator(
                 text_generator,
                 min_chars=5,
                 max_chars=100,
-                quick_first=False
+                quick_first=False,
+                limits=self._limits if self.policy else None
             )
-            async for sentence in gen:
+            if self.coalesce is not None and callback:
+                gen = self._coalesced(sentences)
+            else:
+                gen = self._single(sentences)
+            async for sentence, arrival in gen:
                 sentence_time = time.time() - start_time
+                if callback:
+                    # 积压的句子过多时在这里等待，不再从文本流中读取
+                    await self.pending.acquire()
                 sequence = self.sequence_manager.get_next()
-                log.info(f"第 {sequence} 句「{sentence}」获取延迟: {sentence_time:.3f} 秒")
-                if self.skip:
+                if utterance.cancelled:
+                    # 其他线程在分配序号前后打断了回复，交还这个序号
+                    self.sequence_manager.done(sequence)
+                    if callback:
+                        self.pending.release()
                     await gen.aclose()
                     log.info("processor跳过剩余句子")
-                    self.skip = False
+                    break
+                utterance.sequences.append(sequence)
+                log.info(f"第 {sequence} 句「{sentence}」获取延迟: {sentence_time:.3f} 秒")
+                span = self._open_span(sentence, sequence, arrival) if self.tracer is not None and callback else None
 
                 if callback:
-                    self.executor.submit(self._sync_callback, callback, sentence, sequence)
+                    if span is not None:
+                        span.mark("dispatch")
+                    if self.coalesce is not None:
+                        with self._waiting_lock:
+                            self._waiting.add(sequence)
+                    if self.scheduler == "thread":
+                        self.executor.submit(self._sync_callback, callback, sentence, sequence, utterance)
+                    else:
+                        self._dispatch(callback, sentence, sequence, utterance)
 
         except Exception as e:
             log.error(f"处理过程出错: {str(e)}")
+        if normalizer is not None:
+            log.info(f"文本规范化：输入{normalizer.chars_in}字，送入合成{normalizer.chars_out}字")
 
-    def _sync_callback(self, callback, sentence: str, sequence: int):
+    def _limits(self):
+        return self.policy.limits(self.buffer_depth())
+
+    def _sync_callback(self, callback, sentence: str, sequence: int, utterance: Utterance):
         """修改后的回调包装，传入序号"""
         try:
-            callback(sentence, sequence)
+            callback(sentence, sequence, utterance)
+        except Exception as e:
+            log.error(f"回调执行错误: {str(e)}")
+        finally:
+            self._settle(sequence)
+
+    def _dispatch(self, callback: Callable[[str, int, Utterance], Awaitable[None]], sentence: str, sequence: int,
+                  utterance: Utterance):
+        """在当前事件循环上为句子创建任务，并登记到所属回复"""
+        task = asyncio.create_task(self._async_callback(callback, sentence, sequence, utterance))
+        self._tasks[sequence] = task
+        utterance.add_task(sequence, task)
+
+        def finished(_):
+            # 任务在开始执行前就被取消时协程不会运行，收尾放在完成回调里
+            self._tasks.pop(sequence, None)
+            utterance.remove_task(sequence)
+            self._settle(sequence)
+
+        task.add_done_callback(finished)
+
+    async def _async_callback(self, callback, sentence: str, sequence: int, utterance: Utterance):
+        """asyncio模式的回调包装，受并发上限约束"""
+        try:
+            async with self._semaphore:
+                await callback(sentence, sequence, utterance)
+        except asyncio.CancelledError:
+            log.info(f"句子任务被取消 - 序号{sequence}")
         except Exception as e:
             log.error(f"回调执行错误: {str(e)}")
+
+    def _settle(self, sequence: int):
+        """句子处理结束后的收尾：归还派发额度，减少积压计数，结束未被取走的span"""
+        self.pending.release()
+        self.synthesis_started(sequence)
+        self._discard_span(sequence)
+
+    def _discard_span(self, sequence: int):
+        """回调没有取走span（如等待并发名额时被取消）时按取消结束"""
+        span = self.spans.pop(sequence, None)
+        if span is not None:
+            self.tracer.finish(span, "cancelled")
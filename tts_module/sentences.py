@@ -1,11 +1,27 @@
-async def sentences_generator(text_generator, min_chars=5, max_chars=10, quick_first=False):
-    """优化的句子分割生成器"""
-    punctuations = set(",.?，。？！!;；:：")  # 分句的标点符号
-    hard_break = set(".。!！?？")  # 强制分句的标点符号
-    buffer = []
+import re
+
+PUNCTUATIONS = ",.?，。？！!;；:："  # 分句的标点符号
+HARD_BREAK = frozenset(".。!！?？")  # 强制分句的标点符号
+_BOUNDARY = re.compile(f"[{re.escape(PUNCTUATIONS)}]")
+
+
+async def sentences_generator(text_generator, min_chars=5, max_chars=10, quick_first=False, limits=None):
+    """优化的句子分割生成器
+
+    每个文本块用预编译的正则整体扫描分句标点，缓冲区只保存文本片段并记录长度，
+    只有真正输出句子时才拼接一次，总耗时与文本长度成线性关系。
+
+    limits 为返回 (min_chars, max_chars) 的可调用对象时，每个标点处重新取值，
+    此时不足最小长度的片段并入下一句而不是丢弃，结尾剩余文本总会输出。
+    """
+    pieces = []  # 当前句子的文本片段
+    length = 0  # 片段总长度
+    leading = 0  # 句首空白字符数，出现非空白字符前持续累计
+    has_content = False
     is_first = True
+    search = _BOUNDARY.search
 
-    async def yield_sentence(text):
+    def yield_sentence(text):
         nonlocal is_first
         if not text:
             return None
@@ -15,24 +31,47 @@ async def sentences_generator(text_generator, min_chars=5, max_chars=10, quick_f
         return text if len(text) >= min_chars else None
 
     async for text_chunk in text_generator:
-        for char in text_chunk:
-            buffer.append(char)
-            
-            # 当遇到标点符号时尝试分句
-            if char in punctuations:
-                current_text = ''.join(buffer).strip()
-                
-                # 如果长度超过最大限制且不是硬分割标点，继续累积
-                if len(current_text) > max_chars and char not in hard_break:
-                    continue
-                    
-                # 遇到分句标点或达到长度限制，输出句子
-                if current_text and (result := await yield_sentence(current_text)):
-                    yield result
-                buffer.clear()
+        pos = 0
+        while match := search(text_chunk, pos):
+            end = match.end()
+            piece = text_chunk[pos:end]
+            pos = end
+            pieces.append(piece)
+            length += len(piece)
+            if not has_content:
+                stripped = piece.lstrip()
+                leading += len(piece) - len(stripped)
+                has_content = True  # 标点本身不是空白字符
+
+            if limits is not None:
+                min_chars, max_chars = limits()
+
+            # 标点不是空白字符，去掉首尾空白后的长度即总长度减去句首空白
+            # 如果长度超过最大限制且不是硬分割标点，继续累积
+            if length - leading > max_chars and match.group() not in HARD_BREAK:
+                continue
+            if limits is not None and length - leading < min_chars:
+                continue
+
+            # 遇到分句标点或达到长度限制，输出句子
+            if result := yield_sentence("".join(pieces).strip()):
+                yield result
+            pieces.clear()
+            length = leading = 0
+            has_content = False
+
+        if pos < len(text_chunk):
+            piece = text_chunk[pos:] if pos else text_chunk
+            pieces.append(piece)
+            length += len(piece)
+            if not has_content:
+                stripped = piece.lstrip()
+                leading += len(piece) - len(stripped)
+                has_content = bool(stripped)
 
     # 处理剩余文本
-    final_text = ''.join(buffer).strip()
-    if final_text and (result := await yield_sentence(final_text)):
+    final_text = "".join(pieces).strip()
+    if final_text and limits is not None:
+        yield final_text
+    elif final_text and (result := yield_sentence(final_text)):
         yield result
-
@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set
+from log import log
+
+
+class _Waiter:
+    __slots__ = ("check", "loop", "future", "result")
+
+    def __init__(self, check: Callable[[], Optional[bool]], loop: asyncio.AbstractEventLoop):
+        self.check = check
+        self.loop = loop
+        self.future = loop.create_future()
+        self.result = None
+
+
+class SequenceManager:
+    """句子序号分配与按序播放的重排缓冲
+
+    每个句子播放前调用 wait_turn 等待前一句结束，播放后调用 done 交出播放权。
+    前一句调用 done 时直接唤醒下一句的等待者，不需要轮询。
+    等待者可以属于不同线程的事件循环，唤醒通过 call_soon_threadsafe 完成。
+
+    预合成：wait_window 允许距离队首不超过 lookahead 的句子提前合成，
+    reserve/release 记录这些句子缓冲的音频字节数，总量超过 buffer_bytes 时
+    非队首句子的合成会暂停，队首句子不受限制以免死锁。
+    """
+    def __init__(self, buffer_bytes: int = 4 * 1024 * 1024, history: int = 1000):
+        self._sequence = 1
+        self._head = 1
+        self._finished: Set[int] = set()
+        self._waiters: List[_Waiter] = []
+        self._advanced_at: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.buffer_bytes = buffer_bytes
+        self._buffered = 0
+        self.handoff_latencies = deque(maxlen=history)
+
+    def get_next(self) -> int:
+        with self._lock:
+            seq = self._sequence
+            self._sequence += 1
+            log.info(f"当前序号: {seq}，下一个序号: {self._sequence}，当前队列序号{self._head}")
+            return seq
+
+    @property
+    def head(self) -> int:
+        """当前允许播放的序号"""
+        return self._head
+
+    @property
+    def buffered(self) -> int:
+        """预合成缓冲中的音频字节数"""
+        return self._buffered
+
+    def is_current(self, sequence: int) -> bool:
+        return self._head == sequence
+
+    async def wait_window(self, sequence: int, lookahead: int) -> bool:
+        """等待该序号进入预合成窗口，返回False表示该序号已被跳过"""
+        def check():
+            if sequence < self._head:
+                return False
+            if sequence < self._head + lookahead:
+                return True
+            return None
+        return await self._wait(check)
+
+    async def wait_turn(self, sequence: int) -> bool:
+        """等待轮到该序号播放，返回False表示该序号已被跳过"""
+        def check():
+            if sequence < self._head:
+                return False
+            if sequence == self._head:
+                return True
+            return None
+        waited = []
+        result = await self._wait(check, waited)
+        advanced_at = self._advanced_at.pop(sequence, None)
+        if result and waited and advanced_at is not None:
+            self.handoff_latencies.append(time.perf_counter() - advanced_at)
+        return result
+
+    async def reserve(self, sequence: int, size: int) -> bool:
+        """为该序号缓冲size字节音频，超出上限时等待，返回False表示该序号已被跳过"""
+        def check():
+            if sequence < self._head:
+                return False
+            if sequence == self._head or self._buffered == 0 or self._buffered + size <= self.buffer_bytes:
+                self._buffered += size
+                return True
+            return None
+        return await self._wait(check, on_abandon=lambda: self.release(size))
+
+    def release(self, size: int):
+        """释放已播放或丢弃的缓冲字节"""
+        with self._lock:
+            self._buffered -= size
+            self._notify()
+
+    def done(self, sequence: int):
+        """标记该序号结束（播放完成、失败或取消），必要时把播放权交给下一句"""
+        with self._lock:
+            if sequence < self._head:
+                return
+            self._finished.add(sequence)
+            if sequence != self._head:
+                return
+            while self._head in self._finished:
+                self._finished.discard(self._head)
+                self._head += 1
+            self._advanced_at[self._head] = time.perf_counter()
+            self._notify()
+
+    def skip(self):
+        """跳过所有已分配的序号，唤醒等待者并告知其已过期"""
+        with self._lock:
+            self._head = self._sequence
+            self._finished.clear()
+            self._advanced_at.clear()
+            self._notify()
+            log.info("队列清空")
+
+    def handoff_stats(self) -> Dict[str, float]:
+        """句间交接延迟统计（毫秒）"""
+        samples = list(self.handoff_latencies)
+        if not samples:
+            return {"count": 0, "mean_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": len(samples),
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "max_ms": max(samples) * 1000,
+        }
+
+    async def _wait(self, check: Callable[[], Optional[bool]], waited: list = None,
+                    on_abandon: Callable[[], None] = None) -> bool:
+        """等待check返回非None结果；check在持锁状态下执行"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            result = check()
+            if result is not None:
+                return result
+            waiter = _Waiter(check, loop)
+            self._waiters.append(waiter)
+        if waited is not None:
+            waited.append(True)
+        try:
+            return await waiter.future
+        except BaseException:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    waiter = None
+            # check已成功但等待者被取消，撤销check的副作用
+            if waiter is not None and waiter.result and on_abandon:
+                on_abandon()
+            raise
+
+    def _notify(self):
+        """重新检查所有等待者，调用方需持有锁"""
+        remaining = []
+        for waiter in self._waiters:
+            result = waiter.check()
+            if result is None:
+                remaining.append(waiter)
+                continue
+            waiter.result = result
+            try:
+                waiter.loop.call_soon_threadsafe(_resolve, waiter.future, result)
+            except RuntimeError:
+                # 等待者所在的事件循环已关闭
+                pass
+        self._waiters = remaining
+
+
+def _resolve(future: asyncio.Future, result: bool):
+    if not future.done():
+        future.set_result(result)
@@ -0,0 +1,444 @@
+"""多会话TTS流式服务
+
+每个会话拥有独立的TTS管线（序号、预合成窗口、取消），所有会话共享同一个引擎实例，
+因此也共享引擎的连接池和合成缓存。
+
+HTTP接口：
+    POST   /sessions/{id}/speak  请求体为流式UTF-8文本，响应为按序流式返回的音频
+    POST   /sessions/{id}/chat   请求体为 {"messages": [...]}，由服务端调用LLM后合成
+    POST   /sessions/{id}/skip   打断会话当前的回复
+    DELETE /sessions/{id}        关闭会话
+    GET    /sessions/{id}/ws     WebSocket，见 TTSServer._websocket
+    GET    /stats                会话数、各阶段积压与缓存统计
+    GET    /metrics              Prometheus格式的逐句延迟直方图
+
+运行: python -m tts_module.server --engine edge --port 8080
+"""
+import argparse
+import asyncio
+import codecs
+import json
+import time
+from typing import AsyncIterator, Dict, Optional
+
+from aiohttp import web
+from pydantic import BaseModel
+
+from log import log
+from tts_module.audio_chunk import AudioChunk
+from tts_module.backpressure import BackpressureConfig, Budget, StageStats
+from tts_module.engine.base_engine import TTSEngine
+from tts_module.engine.cache_engine import CacheConfig, CachedEngine
+from tts_module.normalize import NormalizeConfig
+from tts_module.registry import engines
+from tts_module.segment_policy import SegmentPolicy
+from tts_module.tracing import Tracer
+from tts_module.tts import TTS
+
+CONTENT_TYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "pcm": "audio/L16",
+}
+
+
+class ServerConfig(BaseModel):
+    host: str = "127.0.0.1"
+    port: int = 8080
+    max_sessions: int = 100  # 同时存在的会话数上限
+    session_workers: int = 3  # 每个会话同时合成的句子数上限
+    lookahead: int = 3  # 每个会话的预合成窗口
+    lookahead_bytes: int = 4 * 1024 * 1024  # 每个会话预合成缓冲的字节上限
+    idle_timeout: float = 300.0  # 会话空闲多久后关闭（秒）
+    backpressure: BackpressureConfig = BackpressureConfig()  # 每个会话各阶段队列的额度
+    normalize: Optional[NormalizeConfig] = NormalizeConfig()  # 合成前的文本规范化，为空时不处理
+
+
+class StreamPlayer:
+    """不播放音频，而是把音频块放入队列，由服务端转发给客户端
+
+    TTS使用asyncio调度，add_chunk总在事件循环线程中调用。
+    客户端读取慢时队列达到额度，wait_writable挂起合成，积压不会无限增长。
+    """
+    def __init__(self, max_items: int = 0, max_bytes: int = 0):
+        """
+        Args:
+            max_items: 尚未发送的块数上限，0表示不限
+            max_bytes: 尚未发送的字节上限，0表示不限
+        """
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.budget = Budget(max_items, max_bytes, StageStats("player"))
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def add_chunk(self, chunk: AudioChunk):
+        self.budget.take(len(chunk))
+        self.queue.put_nowait(chunk)
+
+    async def get(self) -> Optional[AudioChunk]:
+        """取出下一个待发送的音频块，回复结束时为None"""
+        chunk = await self.queue.get()
+        if chunk is not None:
+            self.budget.release(len(chunk))
+        return chunk
+
+    async def wait_writable(self, size: int = 0):
+        await self.budget.wait(size)
+
+    def writable(self, size: int = 0) -> bool:
+        return self.budget.has_space(size)
+
+    def queue_stats(self) -> Dict[str, float]:
+        return self.budget.stats.snapshot()
+
+    def playing(self) -> bool:
+        """是否还有尚未发送的音频"""
+        return not self.queue.empty()
+
+    def flush(self):
+        """丢弃尚未发送的音频"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.budget.clear()
+
+
+class Session:
+    """一个客户端会话，同一时刻只处理一个回复"""
+    def __init__(self, session_id: str, engine: TTSEngine, config: ServerConfig,
+                 segment_policy: Optional[SegmentPolicy] = None, tracer: Optional[Tracer] = None):
+        self.session_id = session_id
+        self.player = StreamPlayer(config.backpressure.player_items, config.backpressure.player_bytes)
+        self.tts = TTS(max_workers=config.session_workers, engine=engine, player=self.player,
+                       scheduler="asyncio", lookahead=config.lookahead,
+                       lookahead_bytes=config.lookahead_bytes, segment_policy=segment_policy,
+                       tracer=tracer, session_id=session_id, backpressure=config.backpressure,
+                       normalize=config.normalize)
+        self.last_active = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.tts.start()
+
+    async def close(self):
+        self.skip()
+        async with self._lock:
+            await self.tts.stop()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    async def speak(self, text_generator: AsyncIterator[str]) -> AsyncIterator[AudioChunk]:
+        """合成一个回复，按序产出音频块（含每句的结束标记）
+
+        调用方中途停止迭代时，剩余句子的合成会被取消。
+        """
+        async with self._lock:
+            self.last_active = time.monotonic()
+            self.player.flush()
+
+            async def run():
+                try:
+                    await self.tts.process_stream(text_generator)
+                    await self.tts.sentence_processor.join()
+                finally:
+                    self.player.queue.put_nowait(None)  # 回复结束
+
+            self._task = asyncio.create_task(run())
+            try:
+                while (chunk := await self.player.get()) is not None:
+                    self.last_active = time.monotonic()
+                    yield chunk
+            finally:
+                if not self._task.done():
+                    self.tts.skip_remaining()
+                    self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+                self._task = None
+                self.last_active = time.monotonic()
+
+    def skip(self):
+        """打断当前回复"""
+        if self._task is not None and not self._task.done():
+            self.tts.skip_remaining()
+            self._task.cancel()
+            log.info(f"会话{self.session_id}的回复已打断")
+
+
+class TTSServer:
+    def __init__(self, engine: TTSEngine, config: Optional[ServerConfig] = None, llm=None,
+                 cache: Optional[CacheConfig] = None, segment_policy: Optional[SegmentPolicy] = None,
+                 tracer: Optional[Tracer] = None):
+        """
+        Args:
+            engine: 所有会话共享的引擎实例
+            config: 服务配置
+            llm: OpenAILLM实例，/chat接口使用，为空时该接口不可用
+            cache: 合成结果缓存配置，缓存在所有会话间共享
+            segment_policy: 分句策略，所有会话共用
+            tracer: 逐句延迟追踪，所有会话共用，为空时新建一个只汇总直方图的Tracer
+        """
+        self.config = config or ServerConfig()
+        self.engine = CachedEngine(engine, cache) if cache is not None else engine
+        self.llm = llm
+        self.segment_policy = segment_policy
+        self.tracer = tracer or Tracer()
+        self.sessions: Dict[str, Session] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self._reaper: Optional[asyncio.Task] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.post("/sessions/{session_id}/speak", self._speak),
+            web.post("/sessions/{session_id}/chat", self._chat),
+            web.post("/sessions/{session_id}/skip", self._skip),
+            web.delete("/sessions/{session_id}", self._close),
+            web.get("/sessions/{session_id}/ws", self._websocket),
+            web.get("/stats", self._stats),
+            web.get("/metrics", self._metrics),
+        ])
+        return app
+
+    async def start(self) -> int:
+        """启动服务，返回实际监听的端口（配置端口为0时由系统分配）"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.config.host, self.config.port)
+        await site.start()
+        self._reaper = asyncio.create_task(self._reap_idle())
+        port = self._runner.addresses[0][1]
+        log.info(f"TTS服务已启动: http://{self.config.host}:{port}")
+        return port
+
+    async def stop(self):
+        if self._reaper:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+        for session_id in list(self.sessions):
+            await self.close_session(session_id)
+        if self._runner:
+            await self._runner.cleanup()
+        log.info("TTS服务已停止")
+
+    async def get_session(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            if len(self.sessions) >= self.config.max_sessions:
+                raise web.HTTPServiceUnavailable(text="会话数已达上限")
+            session = Session(session_id, self.engine, self.config, self.segment_policy, self.tracer)
+            await session.start()
+            self.sessions[session_id] = session
+        return session
+
+    async def close_session(self, session_id: str):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            await session.close()
+
+    async def _reap_idle(self):
+        """定期关闭空闲超时的会话"""
+        while True:
+            await asyncio.sleep(min(self.config.idle_timeout, 30.0))
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if not session.busy and now - session.last_active > self.config.idle_timeout:
+                    log.info(f"会话{session_id}空闲超时，关闭")
+                    await self.close_session(session_id)
+
+    async def _stream_audio(self, request: web.Request, session: Session,
+                            text_generator: AsyncIterator[str]) -> web.StreamResponse:
+        """把一个回复的音频以chunked响应返回，收到首个音频块后才发送响应头以确定格式"""
+        response = None
+        async for chunk in session.speak(text_generator):
+            if chunk.end:
+                continue
+            if response is None:
+                response = web.StreamResponse(headers={
+                    "Content-Type": CONTENT_TYPES.get(chunk.codec, "application/octet-stream"),
+                    "X-Session-Id": session.session_id,
+                })
+                await response.prepare(request)
+            await response.write(chunk.data)
+        if response is None:
+            return web.Response(status=204)
+        await response.write_eof()
+        return response
+
+    async def _speak(self, request: web.Request) -> web.StreamResponse:
+        session = await self.get_session(request.match_info["session_id"])
+        return await self._stream_audio(request, session, _request_text(request))
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        if self.llm is None:
+            raise web.HTTPNotImplemented(text="服务端未配置LLM")
+        body = await request.json()
+        session = await self.get_session(request.match_info["session_id"])
+        return await self._stream_audio(request, session, self.llm.aresponse(body["messages"]))
+
+    async def _skip(self, request: web.Request) -> web.Response:
+        session = self.sessions.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound()
+        session.skip()
+        return web.json_response({"skipped": True})
+
+    async def _close(self, request: web.Request) -> web.Response:
+        await self.close_session(request.match_info["session_id"])
+        return web.json_response({"closed": True})
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        stats = {
+            "sessions": len(self.sessions),
+            "busy_sessions": sum(session.busy for session in self.sessions.values()),
+        }
+        # 各会话各阶段的积压与阻塞汇总
+        backpressure: Dict[str, Dict[str, float]] = {}
+        for session in self.sessions.values():
+            for stage, values in session.tts.backpressure_stats().items():
+                total = backpressure.setdefault(stage, {})
+                for key in ("items", "bytes", "blocked", "blocked_seconds"):
+                    total[key] = total.get(key, 0) + values[key]
+        stats["backpressure"] = backpressure
+        if isinstance(self.engine, CachedEngine):
+            stats["cache"] = self.engine.stats()
+        return web.json_response(stats)
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.tracer.render(), content_type="text/plain",
+                            headers={"X-Prometheus-Version": "0.0.4"})
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        """WebSocket会话
+
+        客户端发送JSON文本消息：
+            {"type": "text", "text": "..."}   追加回复文本，没有进行中的回复时开始新回复
+            {"type": "end"}                   当前回复的文本结束
+            {"type": "chat", "messages": [...]}  由服务端调用LLM生成回复
+            {"type": "skip"}                  打断当前回复
+        服务端发送二进制音频帧，以及JSON消息：
+            {"type": "sentence_end", "sequence": n}  一句播放数据结束
+            {"type": "utterance_end"}                一个回复结束
+        """
+        session = await self.get_session(request.match_info["session_id"])
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        texts: Optional[asyncio.Queue] = None
+        sender: Optional[asyncio.Task] = None
+
+        async def send(text_generator, previous: Optional[asyncio.Task]):
+            if previous is not None:
+                # 同一会话的回复按顺序处理
+                await asyncio.gather(previous, return_exceptions=True)
+            async for chunk in session.speak(text_generator):
+                if chunk.end:
+                    await ws.send_json({"type": "sentence_end", "sequence": chunk.sequence})
+                else:
+                    await ws.send_bytes(chunk.data)
+            await ws.send_json({"type": "utterance_end"})
+
+        async def queued_text(queue: asyncio.Queue):
+            while (text := await queue.get()) is not None:
+                yield text
+
+        try:
+            async for message in ws:
+                if message.type != web.WSMsgType.TEXT:
+                    continue
+                data = json.loads(message.data)
+                kind = data.get("type")
+                if kind == "text":
+                    if texts is None:
+                        texts = asyncio.Queue()
+                        sender = asyncio.create_task(send(queued_text(texts), sender))
+                    texts.put_nowait(data.get("text", ""))
+                elif kind == "end" and texts is not None:
+                    texts.put_nowait(None)
+                    texts = None
+                elif kind == "chat" and self.llm is not None:
+                    if texts is not None:
+                        texts.put_nowait(None)
+                        texts = None
+                    sender = asyncio.create_task(send(self.llm.aresponse(data["messages"]), sender))
+                elif kind == "skip":
+                    session.skip()
+                    if texts is not None:
+                        texts.put_nowait(None)
+                        texts = None
+        finally:
+            if texts is not None:
+                texts.put_nowait(None)
+            if sender is not None:
+                if ws.closed:
+                    sender.cancel()
+                await asyncio.gather(sender, return_exceptions=True)
+        return ws
+
+
+async def _request_text(request: web.Request) -> AsyncIterator[str]:
+    """按到达顺序增量解码请求体"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    async for data in request.content.iter_any():
+        if text := decoder.decode(data):
+            yield text
+    if text := decoder.decode(b"", final=True):
+        yield text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", default="edge",
+                        help=f"引擎名称: {', '.join(engines.names())}，tone为本地确定性合成器，用于离线测试")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="CPU密集的本地引擎在多少个工作进程中合成，0表示在主进程中合成")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-sessions", type=int, default=100)
+    parser.add_argument("--session-workers", type=int, default=3)
+    parser.add_argument("--cache", action="store_true", help="在会话间共享合成缓存")
+    parser.add_argument("--llm", action="store_true", help="启用/chat接口")
+    parser.add_argument("--trace", help="逐句追踪记录的JSON行文件")
+    args = parser.parse_args()
+
+    engine_class = engines.load(args.engine)
+    if args.processes:
+        from tts_module.engine.process_engine import ProcessEngine, ProcessPoolConfig
+        engine = ProcessEngine(engine_class, ProcessPoolConfig(workers=args.processes))
+    else:
+        # 所有会话共享服务的事件循环
+        engine = engine_class.create("asyncio")
+    llm = None
+    if args.llm:
+        from llm import OpenAILLM
+        llm = OpenAILLM()
+    config = ServerConfig(host=args.host, port=args.port, max_sessions=args.max_sessions,
+                          session_workers=args.session_workers)
+    server = TTSServer(engine, config, llm=llm, cache=CacheConfig() if args.cache else None,
+                       tracer=Tracer(args.trace))
+
+    async def serve():
+        await server.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+            server.tracer.close()
+            if hasattr(engine, "aclose"):
+                await engine.aclose()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""逐句延迟追踪
+
+每句一个SentenceSpan，记录文本到达、分句输出、派发、开始合成、首个音频块、
+开始送入播放器、全部送入播放器、开始播放、播放完和取消的时间点，按会话和序号关联。
+送入播放器的时间点在交给播放器队列时记录；开始播放和播放完由支持set_playback_callback的播放器报告，
+包含播放器排队、解码和设备缓冲的延迟，播放器不报告时为None。
+句子结束后由Tracer汇总成Prometheus格式的直方图，并可逐行写出JSON。
+
+时间点取time.perf_counter()，只在句子结束时做一次汇总，开销为每句几微秒。
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, IO, List, Optional, Sequence, Tuple
+
+# 各阶段耗时直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (阶段名, 起点, 终点)
+STAGES = (
+    ("segment", "text_arrival", "emit"),  # 首个字到达到分句输出
+    ("dispatch", "emit", "dispatch"),  # 分句输出到派发
+    ("queue", "dispatch", "synth_start"),  # 等待并发名额和预合成窗口
+    ("first_chunk", "synth_start", "first_chunk"),  # 引擎首包延迟
+    ("wait_turn", "first_chunk", "handoff_start"),  # 合成好后等待前一句送完
+    ("handoff", "handoff_start", "handoff_end"),  # 本句音频送入播放器的时长
+    ("player_delay", "handoff_start", "playback_start"),  # 播放器排队、解码到开始播放
+    ("playback", "playback_start", "playback_end"),  # 实际播放的时长
+    ("text_to_handoff", "text_arrival", "handoff_start"),  # 首个字到达到首个音频块送入播放器
+    ("text_to_audio", "text_arrival", "playback_start"),  # 首个字到达到开始播放
+)
+POINTS = ("text_arrival", "emit", "dispatch", "synth_start", "first_chunk",
+          "handoff_start", "handoff_end", "playback_start", "playback_end", "cancel")
+
+
+class SentenceSpan:
+    """一句话在管线中的时间线，未经过的时间点为None"""
+    __slots__ = ("session", "sequence", "chars", "status", "bytes") + POINTS
+
+    def __init__(self, session: str, sequence: int, chars: int,
+                 text_arrival: Optional[float] = None, emit: Optional[float] = None):
+        self.session = session
+        self.sequence = sequence
+        self.chars = chars
+        self.status = "pending"
+        self.bytes = 0
+        self.text_arrival = text_arrival
+        self.emit = emit
+        self.dispatch = None
+        self.synth_start = None
+        self.first_chunk = None
+        self.handoff_start = None
+        self.handoff_end = None
+        self.playback_start = None
+        self.playback_end = None
+        self.cancel = None
+
+    def mark(self, point: str, at: Optional[float] = None):
+        """记录时间点，已记录过的不覆盖
+
+        Args:
+            at: time.perf_counter()时刻，为空时取当前时刻
+        """
+        if getattr(self, point) is None:
+            setattr(self, point, time.perf_counter() if at is None else at)
+
+    def stages(self) -> List[Tuple[str, float]]:
+        """已完整经过的阶段及其耗时（秒）"""
+        result = []
+        for name, start, end in STAGES:
+            start, end = getattr(self, start), getattr(self, end)
+            if start is not None and end is not None:
+                result.append((name, end - start))
+        return result
+
+    def to_dict(self, wall_offset: float = 0.0) -> Dict:
+        """
+        Args:
+            wall_offset: 加到时间点上换算成Unix时间的偏移
+        """
+        record = {"session": self.session, "sequence": self.sequence, "chars": self.chars,
+                  "status": self.status, "bytes": self.bytes}
+        for point in POINTS:
+            value = getattr(self, point)
+            record[point] = round(value + wall_offset, 6) if value is not None else None
+        return record
+
+
+class Histogram:
+    """累计桶直方图，按标签值分组"""
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[str, List] = {}  # 标签值 -> [各桶计数, 总和, 总数]
+
+    def observe(self, label: str, value: float):
+        series = self._series.get(label)
+        if series is None:
+            series = self._series[label] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def snapshot(self) -> Dict[str, Tuple[List[int], float, int]]:
+        """各标签值的累计桶计数、总和与总数"""
+        result = {}
+        for label, (counts, total, count) in self._series.items():
+            cumulative, running = [], 0
+            for n in counts:
+                running += n
+                cumulative.append(running)
+            result[label] = (cumulative, total, count)
+        return result
+
+
+class Tracer:
+    """收集结束的句子，汇总直方图并导出
+
+    多个TTS实例（如服务端的所有会话）可以共享一个Tracer，各自以session区分。
+    """
+    def __init__(self, jsonl: Optional[str] = None, buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 prefix: str = "tts_sentence"):
+        """
+        Args:
+            jsonl: 逐句写出JSON行的文件路径，为空时不写文件
+            buckets: 直方图的桶上限（秒）
+            prefix: 指标名前缀
+        """
+        self.prefix = prefix
+        self.stages = Histogram(buckets)
+        self.statuses: Dict[str, int] = {}
+        self.chars = 0
+        self.bytes = 0
+        self._file: Optional[IO[str]] = open(jsonl, "a", encoding="utf-8", buffering=1) if jsonl else None
+        self._wall_offset = time.time() - time.perf_counter()
+        self._lock = threading.Lock()
+
+    def span(self, session: str, sequence: int, chars: int,
+             text_arrival: Optional[float] = None) -> SentenceSpan:
+        """在分句输出时创建span"""
+        emit = time.perf_counter()
+        return SentenceSpan(session, sequence, chars, text_arrival or emit, emit)
+
+    def finish(self, span: SentenceSpan, status: str):
+        """
+        Args:
+            status: played（播放器报告播完）、handed_off（全部送入播放器，播放器没有报告播完）、
+                cancelled（被取消）、expired（轮到前已过期）或failed（没有音频）
+        """
+        span.status = status
+        if status not in ("played", "handed_off"):
+            span.mark("cancel")
+        stages = span.stages()
+        line = json.dumps(span.to_dict(self._wall_offset), ensure_ascii=False) if self._file else None
+        with self._lock:
+            for name, seconds in stages:
+                self.stages.observe(name, seconds)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.chars += span.chars
+            self.bytes += span.bytes
+            if line is not None:
+                self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def render(self) -> str:
+        """Prometheus文本格式的指标"""
+        with self._lock:
+            snapshot = self.stages.snapshot()
+            statuses = dict(self.statuses)
+            chars, audio_bytes = self.chars, self.bytes
+        name = f"{self.prefix}_stage_seconds"
+        lines = [f"# HELP {name} 句子在各管线阶段的耗时",
+                 f"# TYPE {name} histogram"]
+        for stage, (cumulative, total, count) in sorted(snapshot.items()):
+            for bound, n in zip(self.stages.buckets, cumulative):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {n}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        lines += [f"# HELP {self.prefix}s_total 结束的句子数",
+                  f"# TYPE {self.prefix}s_total counter"]
+        for status, count in sorted(statuses.items()):
+            lines.append(f'{self.prefix}s_total{{status="{status}"}} {count}')
+        lines += [f"# TYPE {self.prefix}_chars_total counter",
+                  f"{self.prefix}_chars_total {chars}",
+                  f"# TYPE {self.prefix}_audio_bytes_total counter",
+                  f"{self.prefix}_audio_bytes_total {audio_bytes}"]
+        return "\n".join(lines) + "\n"
+
+
+class PlaybackTracker:
+    """把播放器报告的开始播放、播放完时间点记到对应句子的span上，按AudioChunk.sequence关联
+
+    播放器通过set_playback_callback在自己的线程中报告。句子全部送入播放器后等到播放器报告播完再结束span，
+    报告可能早于送完（短句）；播放器被清空或停止后不会再有报告，由drop结束等待中的span。
+    """
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans: Dict[int, SentenceSpan] = {}  # 开始处理、尚未结束的span
+        self._waiting: Dict[int, SentenceSpan] = {}  # 已全部送入播放器、等待播完报告的span
+        self._dropped = 0  # 序号小于该值的句子在播放器清空前已登记，不会再有播完报告
+        self._lock = threading.Lock()
+
+    def track(self, span: SentenceSpan):
+        """句子开始处理时登记，之后播放器的报告才会记到该span上"""
+        with self._lock:
+            self._spans[span.sequence] = span
+
+    def finish(self, span: SentenceSpan, status: str):
+        """句子处理结束，全部送入播放器且尚未播完时等待播放器报告"""
+        with self._lock:
+            dropped = span.sequence < self._dropped
+            if status == "handed_off" and span.playback_end is None and span.sequence in self._spans and not dropped:
+                self._waiting[span.sequence] = span
+                return
+            self._spans.pop(span.sequence, None)
+        if status == "handed_off" and span.playback_end is not None:
+            status = "played"
+        elif status == "handed_off" and dropped:
+            status = "cancelled"  # 送完时播放器已被清空
+        self.tracer.finish(span, status)
+
+    def report(self, sequence: int, point: str, at: float):
+        """播放器回调，point为playback_start或playback_end，at为time.perf_counter()时刻"""
+        with self._lock:
+            span = self._spans.get(sequence)
+            if span is None:
+                return
+            span.mark(point, at)
+            if point != "playback_end" or self._waiting.pop(sequence, None) is None:
+                return
+            del self._spans[sequence]
+        self.tracer.finish(span, "played")
+
+    def drop(self, status: str):
+        """播放器被清空或停止，结束所有等待播完报告的span"""
+        with self._lock:
+            spans = list(self._waiting.values())
+            for span in spans:
+                del self._spans[span.sequence]
+            self._waiting.clear()
+            self._dropped = max(self._spans, default=self._dropped - 1) + 1
+        for span in spans:
+            self.tracer.finish(span, status)
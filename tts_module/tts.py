@@ -1,31 +1,92 @@
 import asyncio
 import threading
-from typing import AsyncGenerator, Optional, Dict
-from tts_module.engine.edge_engine import EdgeEngine
-from tts_module.engine.openai_engine import OpenAIEngine
-from tts_module.player.mpv_player import MPVPlayer
-from tts_module.player.py_player import FFPlayer
-from tts_module.sentence_processor import SentenceProcessor
+from typing import TYPE_CHECKING, AsyncGenerator, Dict, Optional, Union
+from tts_module.audio_chunk import AudioChunk, as_chunk
+from tts_module.backpressure import BackpressureConfig, Budget, StageStats
+from tts_module.engine.base_engine import TTSEngine
+from tts_module.engine.cache_engine import CacheConfig, CachedEngine
+from tts_module.normalize import NormalizeConfig
+from tts_module.registry import construct, engines, players
+from tts_module.sentence_processor import CoalesceConfig, SentenceProcessor
+from tts_module.sequence_manager import SequenceManager
+from tts_module.segment_policy import SegmentPolicy, PlaybackClock
+from tts_module.tracing import PlaybackTracker, Tracer
+from tts_module.utterance import Utterance
 from log import log
-import queue
+
+if TYPE_CHECKING:
+    from tts_module.player.pcm_stream import TrimConfig  # 导入numpy，只在用到裁剪时由播放器导入
 
 class TTS:
-    def __init__(self, max_workers: int = 5, audio_device = None,engine: str = "12",stream: bool = True):
-        self.sequence_manager = SequenceManager()
-        if engine == "edge":
-            self.engine = EdgeEngine()
+    def __init__(self, max_workers: int = 5, audio_device = None,engine: Union[str, TTSEngine] = "openai",stream: bool = True,
+                 scheduler: str = "thread", player = None, lookahead: int = 3,
+                 lookahead_bytes: int = 4 * 1024 * 1024, cache: Optional[CacheConfig] = None,
+                 segment_policy: Optional[SegmentPolicy] = None, tracer: Optional[Tracer] = None,
+                 session_id: str = "", coalesce: Optional[CoalesceConfig] = None,
+                 backpressure: Optional[BackpressureConfig] = None, normalize: Optional[NormalizeConfig] = None,
+                 trim: Optional["TrimConfig"] = None):
+        """
+        Args:
+            max_workers: 同时处理的句子数上限
+            audio_device: 音频输出设备
+            engine: 引擎名称或TTSEngine实例，名称见tts_module.registry.engines，用到时才导入
+            stream: 未指定播放器时，为True使用流式的mpv播放器，为False使用FFPlayer
+            scheduler: "thread" 每句一个线程和事件循环；"asyncio" 所有句子共享调用方的事件循环
+            player: 播放器名称或自定义播放器实例，实例需实现start/stop/add_chunk，add_chunk接收AudioChunk；
+                名称见tts_module.registry.players
+            lookahead: 预合成窗口，当前句播放时最多提前合成的句子数（含当前句）
+            lookahead_bytes: 预合成缓冲的音频字节上限
+            cache: 合成结果缓存配置，为空时不缓存
+            segment_policy: 分句策略，如AdaptivePolicy根据播放缓冲调整句长
+            tracer: 逐句延迟追踪，为空时不追踪
+            session_id: 追踪记录中的会话标识
+            coalesce: 请求合并配置，有积压且播放领先时把待派发的句子合并成一个请求，
+                适用于单次请求固定开销大的OpenAI兼容自建服务，为空时不合并
+            backpressure: 各阶段队列的条数与字节额度，为空时使用默认额度；
+                下游跟不上时上游挂起，直至暂停读取LLM文本，内存占用保持有界
+            normalize: 文本规范化配置，分句前去掉Markdown、代码块、网址和emoji，展开数字、日期和单位，
+                为空时文本原样合成
+            trim: 句首句尾静音裁剪配置，作用于FFPlayer解码后的PCM，缩短句间空白，为空时不裁剪
+        """
+        self.backpressure = backpressure or BackpressureConfig()
+        self.sequence_manager = SequenceManager(buffer_bytes=lookahead_bytes)
+        self.lookahead = max(1, lookahead)
+        if isinstance(engine, TTSEngine):
+            self.engine = engine
         else:
-            self.engine = OpenAIEngine()
-            stream = False
-        if stream:
-            self.player = MPVPlayer(audio_device=audio_device)
+            engine_class = engines.load(engine)
+            self.engine = engine_class.create(scheduler)
+            stream = stream and engine_class.streaming
+        if cache is not None:
+            self.engine = CachedEngine(self.engine, cache)
+        if player is None or isinstance(player, str):
+            # 各播放器只接收其构造函数支持的参数，如裁剪只有FFPlayer支持
+            self.player = construct(players.load(player or ("mpv" if stream else "ffplayer")),
+                                    audio_device=audio_device, queue_items=self.backpressure.player_items,
+                                    queue_bytes=self.backpressure.player_bytes, trim=trim)
         else:
-            self.player = FFPlayer(audio_device=audio_device)
+            self.player = player
         self.max_workers = max_workers
-        self.sentence_processor = SentenceProcessor(self.sequence_manager, self.max_workers)
-        self._tasks: Dict[int, asyncio.Task] = {}
-        self._loops: Dict[int, asyncio.AbstractEventLoop] = {}
-        self._tasks_lock = threading.Lock()
+        self.scheduler = scheduler
+        self.playback_clock = PlaybackClock()
+        self.sentence_processor = SentenceProcessor(self.sequence_manager, self.max_workers, scheduler,
+                                                    segment_policy, self.playback_clock.buffered,
+                                                    tracer, session_id, coalesce,
+                                                    self.backpressure.pending_sentences, normalize)
+        self._sentence_stats = StageStats("sentence")  # 所有句子的合成结果队列
+        self.tracer = tracer
+        # 播放器能报告实际播放的时间点时，span等到播完再结束
+        self._playback: Optional[PlaybackTracker] = None
+        set_playback_callback = getattr(self.player, "set_playback_callback", None)
+        if tracer is not None and set_playback_callback:
+            self._playback = PlaybackTracker(tracer)
+            set_playback_callback(self._playback.report)
+        self._prewarm_task: Optional[asyncio.Task] = None
+        self._epoch = 0
+        self.utterance: Optional[Utterance] = None  # 最近一次process_stream对应的回复
+        self._utterance_lock = threading.Lock()
+        # 送入播放器与打断互斥，打断并清空播放器之后旧回复不会再送入音频
+        self._emit_lock = threading.Lock()
 
     async def start(self):
         """启动TTS服务"""
@@ -34,132 +95,251 @@ class TTS:
 
     async def stop(self):
         """停止TTS服务"""
+        if self.scheduler == "asyncio":
+            await self.sentence_processor.join()
         self.sentence_processor.stop()
         self.player.stop()
+        if self._playback is not None:
+            self._playback.drop("handed_off")
+
+    def backpressure_stats(self) -> Dict[str, Dict[str, float]]:
+        """各阶段的当前深度、峰值和生产者阻塞统计"""
+        stats = {
+            "dispatch": self.sentence_processor.pending.stats.snapshot(),
+            "sentence": self._sentence_stats.snapshot(),
+        }
+        queue_stats = getattr(self.player, "queue_stats", None)
+        if queue_stats:
+            stats["player"] = queue_stats()
+        return stats
+
+    def trimmed_seconds(self, utterance: Optional[Utterance] = None) -> float:
+        """回复中已播放的句子共裁掉的静音时长（秒），默认为最近一个回复；播放器不裁剪时为0"""
+        utterance = utterance or self.utterance
+        trimmed_for = getattr(self.player, "trimmed_for", None)
+        if utterance is None or trimmed_for is None:
+            return 0.0
+        return trimmed_for(utterance.sequences)
 
     def skip_remaining(self):
-        """跳过剩余句子"""
-        self.sentence_processor.skip = True
-        self.sequence_manager.skip()
-        
-        # 取消所有正在进行的任务
-        with self._tasks_lock:
-            for sequence, loop in self._loops.items():
-                if sequence in self._tasks and not self._tasks[sequence].done():
-                    loop.call_soon_threadsafe(self._tasks[sequence].cancel)
-        self.sentence_processor.skip = False # 重置跳过标志
-
-    async def process_stream(self, text_generator: AsyncGenerator[str, None]):
-        """处理文本流"""
-        await self.sentence_processor.process_sentences(text_generator, self._process_sentence)
-
-    def _process_sentence(self, sentence: str, sequence: int):
+        """打断当前回复，跳过剩余句子，可在任意线程调用"""
+        utterance = self.utterance
+        if utterance is not None:
+            self._cancel(utterance)
+
+    def _cancel(self, utterance: Utterance):
+        """取消回复：停止读取文本，取消进行中的合成和等待中的句子，丢弃播放器中已排队的音频
+
+        回复按序播放，打断某个回复时它之前的回复必然已经播放完或已被取消，
+        因此跳过所有已分配的序号即可。回复的任务都已结束、播放器也没有在播放时不清空播放器，
+        避免每个新回复都让播放器停止并重建输出（如mpv切换进程）。
+        """
+        with self._emit_lock:
+            idle = utterance.active == 0 and self._player_idle()
+            cancelled = utterance.cancel()
+            self.sequence_manager.skip()
+            self.playback_clock.reset()
+            # 丢弃播放器中已排队和已缓冲的音频
+            flush = getattr(self.player, "flush", None)
+            if flush and not idle:
+                flush()
+        if self._playback is not None and not idle:
+            self._playback.drop("cancelled")
+        log.info(f"回复{utterance.epoch}已取消，取消任务{cancelled}个{'，播放器空闲' if idle else ''}")
+
+    def _player_idle(self) -> bool:
+        """播放器没有排队或正在播放的音频，播放器不提供playing时视为正在播放"""
+        playing = getattr(self.player, "playing", None)
+        return playing is not None and not playing()
+
+    def _begin(self, preempt: bool) -> Utterance:
+        """开始新回复，preempt为True时先取消上一个回复"""
+        with self._utterance_lock:
+            previous = self.utterance
+            self._epoch += 1
+            utterance = self.utterance = Utterance(self._epoch)
+        if preempt and previous is not None:
+            self._cancel(previous)
+        return utterance
+
+    async def process_stream(self, text_generator: AsyncGenerator[str, None], preempt: bool = True):
+        """处理文本流，每次调用是一个新回复
+
+        Args:
+            text_generator: 文本流
+            preempt: 为True时新回复立即打断上一个回复（合成、等待中的句子和播放器中排队的音频）；
+                为False时新回复排在上一个回复之后播放，调用方需保证上一个回复的文本流已结束
+        """
+        utterance = self._begin(preempt)
+        if self.scheduler == "asyncio":
+            callback = self._process_sentence_async
+            # 等待首句文本的同时建立合成连接
+            self._prewarm_task = asyncio.create_task(self.engine.prewarm())
+        else:
+            callback = self._process_sentence
+        await self.sentence_processor.process_sentences(text_generator, callback, utterance)
+
+    async def _process_sentence_async(self, sentence: str, sequence: int, utterance: Utterance):
+        """asyncio模式下处理单个句子，运行在共享事件循环上"""
+        try:
+            await self._process_audio2(sentence, sequence, utterance)
+        except asyncio.CancelledError:
+            log.info(f"句子处理被取消 - 序号{sequence}")
+            raise
+        except Exception as e:
+            log.error(f"处理失败: {str(e)}")
+
+    def _process_sentence(self, sentence: str, sequence: int, utterance: Utterance):
         """处理单个句子的音频生成和播放"""
+        if utterance.cancelled:
+            log.info(f"音频序号{sequence}所属回复已取消")
+            return
         try:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             try:
-                with self._tasks_lock:
-                    self._loops[sequence] = loop
-                
-                coro = self._process_audio2(sentence, sequence)
-                task = loop.create_task(coro)
-                
-                with self._tasks_lock:
-                    self._tasks[sequence] = task
-                
+                task = loop.create_task(self._process_audio2(sentence, sequence, utterance))
+                utterance.add_task(sequence, task, loop)
                 loop.run_until_complete(task)
             except asyncio.CancelledError:
                 log.info(f"句子处理被取消 - 序号{sequence}")
             finally:
-                with self._tasks_lock:
-                    self._tasks.pop(sequence, None)
-                    self._loops.pop(sequence, None)
+                utterance.remove_task(sequence)
+                try:
+                    # 关闭引擎绑定在本句事件循环上的连接，否则事件循环关闭后连接泄漏
+                    loop.run_until_complete(self.engine.release_loop())
+                except Exception as e:
+                    log.error(f"释放引擎连接失败: {str(e)}")
                 loop.close()
         except Exception as e:
             log.error(f"处理失败: {str(e)}")
 
-    async def _process_audio2(self, sentence: str, sequence: int):
-        """异步音频处理函数 - 支持流式和非流式播放"""
+    async def _process_audio2(self, sentence: str, sequence: int, utterance: Utterance):
+        """异步音频处理函数 - 支持流式和非流式播放
+
+        进入预合成窗口后立即开始合成，音频先缓冲在本句的队列中，
+        轮到本句播放时再把缓冲的数据交给播放器。本句队列和播放器队列满时合成暂停。
+        """
+        buffered = 0
+        chunk_queue = asyncio.Queue()
+        budget = Budget(self.backpressure.sentence_items, self.backpressure.sentence_bytes, self._sentence_stats)
+        wait_writable = getattr(self.player, "wait_writable", None)
+        producer_task = None
+        span = self.sentence_processor.spans.pop(sequence, None)
+        if span is not None and self._playback is not None:
+            self._playback.track(span)
+        status = "failed"
         try:
-            chunk_queue = asyncio.Queue()
-            
             async def producer():
                 """异步生成音频数据"""
+                nonlocal buffered
                 try:
+                    if span is not None:
+                        span.mark("synth_start")
                     async for chunk in self.engine.synthesize(sentence):
+                        chunk = as_chunk(chunk)
                         if chunk:
-                            await chunk_queue.put(chunk)
-                    # 放入结束标记
-                    await chunk_queue.put(None)
+                            if span is not None:
+                                span.mark("first_chunk")
+                            chunk.sequence = sequence
+                            if not await self.sequence_manager.reserve(sequence, len(chunk)):
+                                break
+                            buffered += len(chunk)
+                            await budget.acquire(len(chunk))
+                            chunk_queue.put_nowait(chunk)
                 except asyncio.CancelledError:
                     log.info(f"音频生成被取消 - 序号{sequence}")
                     raise
+                finally:
+                    # 放入结束标记，生成失败时消费者也能结束
+                    chunk_queue.put_nowait(None)
 
             async def consumer():
                 """异步消费音频数据"""
+                nonlocal buffered
                 try:
                     while True:
                         chunk = await chunk_queue.get()
                         if chunk is None:  # 结束标记
-                            self.player.add_chunk(None)  # 添加这行，发送结束标记到播放器
+                            # 发送结束标记到播放器，回复已取消时本句没有送完
+                            if self._emit_end(utterance, sequence) and span is not None:
+                                span.mark("handoff_end")
                             break
-                        if self.sequence_manager.quene.empty():
-                            self.player.add_chunk(None)  # 添加这行，发送结束标记到播放器
-                            log.info(f"当前正在播放的序号{sequence}，被终止！！！！！当前队列无序号")
+                        buffered -= len(chunk)
+                        self.sequence_manager.release(len(chunk))
+                        budget.release(len(chunk))
+                        if wait_writable:
+                            await wait_writable(len(chunk))
+                        if not self._emit(utterance, chunk):
+                            self._emit_end(utterance, sequence)  # 发送结束标记到播放器
+                            log.info(f"当前正在播放的序号{sequence}，被终止！！！！！当前队列序号{self.sequence_manager.head}")
                             return
-                        if self.sequence_manager.quene.queue[0] == sequence:
-                            self.player.add_chunk(chunk)
+                        if span is not None:
+                            span.mark("handoff_start")
+                            span.bytes += len(chunk)
                 except asyncio.CancelledError:
-                    self.player.add_chunk(None)  # 添加这行，发送结束标记到播放器
+                    self._emit_end(utterance, sequence)  # 发送结束标记到播放器
                     log.info(f"音频播放被取消 - 序号{sequence}")
                     raise
 
-            while not self.sequence_manager.quene.empty():
-                current_seq = self.sequence_manager.quene.queue[0]
-                if current_seq > sequence:
-                    log.info(f"音频序号{sequence}已过期,当前队列序号{current_seq}")
-
-                    return
-                if current_seq == sequence:
-                    # 创建生产者和消费者任务
-                    producer_task = asyncio.create_task(producer())
-                    consumer_task = asyncio.create_task(consumer())
-                    # 等待任务完成
-                    await asyncio.gather(producer_task, consumer_task)
-                    if self.sequence_manager.quene.empty():
-                        return
-                    self.sequence_manager.quene.get()
-                    if not self.sequence_manager.quene.empty():
-                        log.info(f"句子「{sentence}」(序号{sequence})播放完成，当前队列序号{self.sequence_manager.quene.queue[0]}")
-                    else:
-                        log.info(f"句子「{sentence}」(序号{sequence})播放完成，当前队列无序号")
-                    return
-                await asyncio.sleep(0.1)
-            log.info(f"音频序号{sequence}已过期,当前队列无序号")
+            # 进入预合成窗口后即开始合成
+            if not await self.sequence_manager.wait_window(sequence, self.lookahead):
+                log.info(f"音频序号{sequence}已过期,当前队列序号{self.sequence_manager.head}")
+                status = "expired"
+                return
+            self.sentence_processor.synthesis_started(sequence)
+            producer_task = asyncio.create_task(producer())
+
+            # 等待前一句播放结束，由前一句的done直接唤醒
+            if not await self.sequence_manager.wait_turn(sequence):
+                log.info(f"音频序号{sequence}已过期,当前队列序号{self.sequence_manager.head}")
+                status = "expired"
+                return
+
+            self.playback_clock.add_text(sentence)
+            await consumer()
+            if span is not None:
+                # 消费者中途发现已不是当前句时没有结束时间点
+                status = "cancelled" if span.handoff_end is None else "handed_off" if span.bytes else "failed"
+            log.info(f"句子「{sentence}」(序号{sequence})播放完成")
 
         except asyncio.CancelledError:
+            status = "cancelled"
             log.info(f"音频处理被取消 - 序号{sequence}")
             raise
         except Exception as e:
             log.error(f"音频处理失败 - 序号{sequence}: {str(e)}")
             raise
+        finally:
+            if producer_task is not None:
+                if not producer_task.done():
+                    producer_task.cancel()
+                result, = await asyncio.gather(producer_task, return_exceptions=True)
+                if isinstance(result, Exception):
+                    log.error(f"音频生成失败 - 序号{sequence}: {str(result)}")
+            # 归还未播放的缓冲字节
+            if buffered:
+                self.sequence_manager.release(buffered)
+            budget.clear()
+            self.sequence_manager.done(sequence)
+            if span is not None:
+                (self._playback or self.tracer).finish(span, status)
+
+    def _emit(self, utterance: Utterance, chunk: AudioChunk) -> bool:
+        """把音频块送入播放器，所属回复已取消或已不是当前句时丢弃并返回False"""
+        with self._emit_lock:
+            if utterance.cancelled or not self.sequence_manager.is_current(chunk.sequence):
+                return False
+            self.player.add_chunk(chunk)
+            return True
+
+    def _emit_end(self, utterance: Utterance, sequence: int) -> bool:
+        """发送句子结束标记，所属回复已取消时不发送并返回False
 
-class SequenceManager:
-    def __init__(self):
-        self._sequence = 1
-        self.quene = queue.Queue()
-        self._lock = threading.Lock()
-    
-    def get_next(self):
-        with self._lock:
-            seq = self._sequence
-            self.quene.put(seq)
-            self._sequence += 1
-            log.info(f"当前序号: {seq}，下一个序号: {self._sequence}，当前队列序号{self.quene.queue[0]}")
-            return seq
-          
-    def skip(self):
-        with self._lock:
-            self.quene.queue.clear()
-            log.info("队列清空")
\ No newline at end of file
+        取消时播放器已被清空，此时再送入结束标记会让播放器把打断前收集的半句音频当作新的一句播放。
+        """
+        with self._emit_lock:
+            if utterance.cancelled:
+                return False
+            self.player.add_chunk(AudioChunk.end_of(sequence))
+            return True
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class Utterance:
+    """一次process_stream调用对应的回复及其取消作用域
+
+    epoch随每次回复递增。回复的文本读取任务和每句的处理任务都登记在这里，
+    这些任务可能分属不同线程的事件循环（thread调度每句一个事件循环），
+    cancel只取消本回复的任务，通过call_soon_threadsafe投递到各自的事件循环。
+    """
+    TEXT = -1  # 文本读取任务的登记键
+
+    def __init__(self, epoch: int):
+        self.epoch = epoch
+        self.cancelled = False
+        self.cancelled_at: Optional[float] = None
+        self._tasks: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Task]] = {}
+        self.sequences: List[int] = []  # 本回复派发的句子序号
+        self._lock = threading.Lock()
+
+    def add_task(self, key: int, task: asyncio.Task, loop: Optional[asyncio.AbstractEventLoop] = None) -> bool:
+        """登记任务，回复已取消时立即取消该任务并返回False
+
+        Args:
+            key: 句子序号，文本读取任务为Utterance.TEXT
+            task: 要登记的任务
+            loop: 任务所在的事件循环，默认为当前事件循环
+        """
+        loop = loop or asyncio.get_running_loop()
+        with self._lock:
+            if not self.cancelled:
+                self._tasks[key] = (loop, task)
+                return True
+        loop.call_soon_threadsafe(task.cancel)
+        return False
+
+    def remove_task(self, key: int):
+        with self._lock:
+            self._tasks.pop(key, None)
+
+    @property
+    def active(self) -> int:
+        """尚未结束的任务数"""
+        return len(self._tasks)
+
+    def cancel(self) -> int:
+        """取消本回复所有登记的任务，返回取消的任务数"""
+        with self._lock:
+            if not self.cancelled:
+                self.cancelled = True
+                self.cancelled_at = time.perf_counter()
+            tasks = list(self._tasks.values())
+        count = 0
+        for loop, task in tasks:
+            if task.done():
+                continue
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+                count += 1
+            except RuntimeError:
+                pass  # 任务所在的事件循环已关闭
+        return count